@@ -0,0 +1,156 @@
+import base64
+import hashlib
+import logging
+import mimetypes
+import os
+import threading
+from io import BytesIO
+from pathlib import Path
+from types import MappingProxyType
+from typing import Mapping, Optional
+from PIL import Image
+
+# Asset registry configuration - override through environment variables
+ASSET_OPTIMIZE = os.getenv("ASSET_OPTIMIZE", "false").lower() == "true"
+ASSET_MAX_WIDTH = int(os.getenv("ASSET_MAX_WIDTH", "600"))
+ASSET_RELOAD_INTERVAL = float(os.getenv("ASSET_RELOAD_INTERVAL", "2"))
+
+BASE_DIR = Path(__file__).parent / "public"
+ASSET_DIRS = ["logo", "signature"]
+
+logger = logging.getLogger(__name__)
+
+
+def _optimize_png(data: bytes) -> bytes:
+    """Downsample an image to ASSET_MAX_WIDTH and re-encode it as optimized PNG"""
+    with Image.open(BytesIO(data)) as img:
+        if img.width > ASSET_MAX_WIDTH:
+            height = round(img.height * ASSET_MAX_WIDTH / img.width)
+            img = img.resize((ASSET_MAX_WIDTH, height), Image.LANCZOS)
+        buffer = BytesIO()
+        img.save(buffer, format="PNG", optimize=True)
+    optimized = buffer.getvalue()
+    return optimized if len(optimized) < len(data) else data
+
+
+def _data_uri(path: Path) -> str:
+    """Read a file and encode it as a base64 data URI"""
+    data = path.read_bytes()
+    mime_type = mimetypes.guess_type(path.name)[0] or "application/octet-stream"
+    if ASSET_OPTIMIZE and mime_type == "image/png":
+        data = _optimize_png(data)
+    return f"data:{mime_type};base64,{base64.b64encode(data).decode()}"
+
+
+class AssetRegistry:
+    """Branding assets loaded and base64-encoded once, reloaded when files change"""
+
+    def __init__(self, base_dir: Path, asset_dirs: list[str]):
+        self.base_dir = base_dir
+        self.asset_dirs = asset_dirs
+        self._uris: Mapping[str, str] = MappingProxyType({})
+        self._mtimes: dict[str, int] = {}
+        self._version = ""
+        self._image_ids: frozenset[str] = frozenset()
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._watcher: Optional[threading.Thread] = None
+
+    @property
+    def uris(self) -> Mapping[str, str]:
+        """Read-only mapping of 'dir/filename' to data URI"""
+        if not self._version:
+            self.load()
+        return self._uris
+
+    @property
+    def version(self) -> str:
+        """Content hash of the loaded assets, changes whenever any asset changes"""
+        if not self._version:
+            self.load()
+        return self._version
+
+    @property
+    def image_ids(self) -> frozenset[str]:
+        """WeasyPrint image ids (md5 of the data URI) of every asset"""
+        if not self._version:
+            self.load()
+        return self._image_ids
+
+    def data_uri(self, name: str) -> str:
+        """Get the data URI of an asset such as 'logo/just_logo.png'"""
+        return self.uris[name]
+
+    def load(self):
+        """Load and encode every asset file"""
+        with self._lock:
+            uris = {}
+            mtimes = {}
+            for path in self._asset_files():
+                name = path.relative_to(self.base_dir).as_posix()
+                uris[name] = _data_uri(path)
+                mtimes[name] = path.stat().st_mtime_ns
+            digest = hashlib.sha256()
+            for name in sorted(uris):
+                digest.update(name.encode())
+                digest.update(uris[name].encode())
+            # Swap in the new mapping in one step so readers never see a partial load
+            self._uris = MappingProxyType(uris)
+            self._mtimes = mtimes
+            self._image_ids = frozenset(
+                hashlib.md5(uri.encode(), usedforsecurity=False).hexdigest() for uri in uris.values()
+            )
+            self._version = digest.hexdigest()[:16]
+
+    def reload_if_changed(self) -> bool:
+        """Reload the assets if any file was added, removed or modified"""
+        current = {
+            path.relative_to(self.base_dir).as_posix(): path.stat().st_mtime_ns
+            for path in self._asset_files()
+        }
+        if current == self._mtimes:
+            return False
+        self.load()
+        return True
+
+    def start_watching(self):
+        """Poll the asset directories in a background thread and hot-reload changes"""
+        if self._watcher is not None:
+            return
+        self._stop.clear()
+        self._watcher = threading.Thread(target=self._watch, name="asset-watcher", daemon=True)
+        self._watcher.start()
+
+    def stop_watching(self):
+        """Stop the background watcher"""
+        if self._watcher is None:
+            return
+        self._stop.set()
+        self._watcher.join()
+        self._watcher = None
+
+    def _watch(self):
+        while not self._stop.wait(ASSET_RELOAD_INTERVAL):
+            try:
+                if self.reload_if_changed():
+                    logger.info("Reloaded branding assets (version %s)", self._version)
+            except OSError as exc:
+                # A file may be mid-write; try again on the next tick
+                logger.warning("Asset reload failed: %s", exc)
+
+    def _asset_files(self) -> list[Path]:
+        files = []
+        for asset_dir in self.asset_dirs:
+            directory = self.base_dir / asset_dir
+            if directory.is_dir():
+                files.extend(path for path in sorted(directory.iterdir()) if path.is_file())
+        return files
+
+
+assets = AssetRegistry(BASE_DIR, ASSET_DIRS)
+
+
+def init_assets():
+    """Load branding assets and start watching them for changes"""
+    assets.load()
+    assets.start_watching()
@@ -1,12 +1,17 @@
+import os
+import time
 from datetime import datetime, timedelta
 from typing import Optional
-from jose import JWTError, jwt
-from passlib.context import CryptContext
 from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
-from sqlmodel import Session, select
-from models import User
-from db import get_session
+from sqlalchemy.orm import make_transient_to_detached
+from sqlmodel import select
+from sqlmodel.ext.asyncio.session import AsyncSession
+from models import TokenRevocation, User
+from db import get_async_session
+from cache import TTLCache
+from tokens import TokenError, decode_token, encode_token
+from hashing import pwd_context, hash_password, verify_and_update_password
 
 # Secret key for JWT - in production, use environment variable
 SECRET_KEY = "your-secret-key-change-this-in-production"
@@ -15,17 +20,38 @@ ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 30
 REFRESH_TOKEN_EXPIRE_DAYS = 7
 
-pwd_context = CryptContext(schemes=["argon2"], deprecated="auto")
+# Authenticated-user cache - override through environment variables
+USER_CACHE_TTL = float(os.getenv("USER_CACHE_TTL", "60"))
+USER_CACHE_SIZE = int(os.getenv("USER_CACHE_SIZE", "10000"))
+
+# Accounts allowed to use administrative endpoints (comma-separated emails); empty disables them
+ADMIN_EMAILS = {email.strip().lower() for email in os.getenv("ADMIN_EMAILS", "").split(",") if email.strip()}
+
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/api/auth/login")
 
+# Token subject (email) -> detached User snapshot
+user_cache = TTLCache(USER_CACHE_SIZE, USER_CACHE_TTL)
+
+# Subject (email) -> unix time in milliseconds of "log out everywhere"; tokens issued up to it are rejected.
+# The tokenrevocation table holds the same times for other processes and restarts; entries only need
+# to outlive the access tokens - refresh tokens are also revoked in the database.
+REVOCATION_CACHE_SIZE = int(os.getenv("REVOCATION_CACHE_SIZE", "100000"))
+_revoked_subjects = TTLCache(REVOCATION_CACHE_SIZE, ACCESS_TOKEN_EXPIRE_MINUTES * 60)
+
 def verify_password(plain_password: str, hashed_password: str) -> bool:
-    """Verify a password against its hash"""
+    """Verify a password against its hash (blocking - use verify_and_update_password in routes)"""
     return pwd_context.verify(plain_password, hashed_password)
 
 def get_password_hash(password: str) -> str:
-    """Hash a password"""
+    """Hash a password (blocking - use hash_password in routes)"""
     return pwd_context.hash(password)
 
+def _issued_at() -> dict:
+    """iat must stay whole seconds (python-jose rejects fractions); iat_ms lets revocation
+    tell apart tokens issued in the same second as a logout"""
+    now_ms = time.time_ns() // 1_000_000
+    return {"iat": now_ms // 1000, "iat_ms": now_ms}
+
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     """Create a JWT access token"""
     to_encode = data.copy()
@@ -33,8 +59,8 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
         expire = datetime.utcnow() + expires_delta
     else:
         expire = datetime.utcnow() + timedelta(minutes=15)
-    to_encode.update({"exp": expire, "type": "access"})
-    encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
+    to_encode.update({"exp": expire, **_issued_at(), "type": "access"})
+    encoded_jwt = encode_token(to_encode, SECRET_KEY, ALGORITHM)
     return encoded_jwt
 
 def create_refresh_token(data: dict, expires_delta: Optional[timedelta] = None):
@@ -44,25 +70,56 @@ def create_refresh_token(data: dict, expires_delta: Optional[timedelta] = None):
         expire = datetime.utcnow() + expires_delta
     else:
         expire = datetime.utcnow() + timedelta(days=REFRESH_TOKEN_EXPIRE_DAYS)
-    to_encode.update({"exp": expire, "type": "refresh"})
-    encoded_jwt = jwt.encode(to_encode, REFRESH_SECRET_KEY, algorithm=ALGORITHM)
+    to_encode.update({"exp": expire, **_issued_at(), "type": "refresh"})
+    encoded_jwt = encode_token(to_encode, REFRESH_SECRET_KEY, ALGORITHM)
     return encoded_jwt
 
-def verify_refresh_token(token: str) -> Optional[str]:
-    """Verify refresh token and return email"""
+def decode_refresh_token(token: str) -> Optional[dict]:
+    """Verify a refresh token's signature and expiry and return its claims"""
     try:
-        payload = jwt.decode(token, REFRESH_SECRET_KEY, algorithms=[ALGORITHM])
-        email: str = payload.get("sub")
-        token_type: str = payload.get("type")
-        if email is None or token_type != "refresh":
-            return None
-        return email
-    except JWTError:
+        payload = decode_token(token, REFRESH_SECRET_KEY, ALGORITHM)
+    except TokenError:
+        return None
+    if payload.get("sub") is None or payload.get("type") != "refresh":
         return None
+    return payload
+
+def verify_refresh_token(token: str) -> Optional[str]:
+    """Verify refresh token and return email"""
+    payload = decode_refresh_token(token)
+    return payload["sub"] if payload else None
+
+def revoke_access_tokens(email: str) -> int:
+    """Reject every access token issued to a subject until now; returns the revocation time in ms"""
+    revoked_at = time.time_ns() // 1_000_000
+    _revoked_subjects.set(email, revoked_at)
+    return revoked_at
 
-def get_current_user(
+def remember_revocation(email: str, revoked_at: int):
+    """Record a revocation read from the database unless a later one is already known"""
+    if revoked_at > (_revoked_subjects.get(email) or 0):
+        _revoked_subjects.set(email, revoked_at)
+
+async def load_revocation(session: AsyncSession, email: str):
+    """Pick up a "log out everywhere" recorded by another process"""
+    statement = select(TokenRevocation.revoked_at_ms).where(TokenRevocation.subject == email)
+    revoked_at = (await session.exec(statement)).first()
+    if revoked_at is not None:
+        remember_revocation(email, revoked_at)
+
+def access_tokens_revoked(email: Optional[str], issued_at: Optional[int], issued_at_ms: Optional[int] = None) -> bool:
+    """Whether a token was issued no later than its subject's last "log out everywhere" """
+    revoked_at = _revoked_subjects.get(email) if email else None
+    if revoked_at is None:
+        return False
+    if issued_at_ms is not None:
+        return issued_at_ms <= revoked_at
+    # Tokens without iat_ms only know the second; one from the logout's own second counts as revoked
+    return issued_at is None or issued_at <= revoked_at // 1000
+
+async def get_current_user(
     token: str = Depends(oauth2_scheme),
-    session: Session = Depends(get_session)
+    session: AsyncSession = Depends(get_async_session)
 ) -> User:
     """Get current authenticated user from JWT token"""
     credentials_exception = HTTPException(
@@ -71,21 +128,55 @@ def get_current_user(
         headers={"WWW-Authenticate": "Bearer"},
     )
     try:
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+        payload = decode_token(token, SECRET_KEY, ALGORITHM)
         email: str = payload.get("sub")
         if email is None:
             raise credentials_exception
-    except JWTError:
+    except TokenError:
         raise credentials_exception
     
+    if access_tokens_revoked(email, payload.get("iat"), payload.get("iat_ms")):
+        raise credentials_exception
+    
+    # Attach the cached snapshot to this session without touching the database
+    cached_user = user_cache.get(email)
+    if cached_user is not None:
+        return await session.merge(cached_user, load=False)
+    
     statement = select(User).where(User.email == email)
-    user = session.exec(statement).first()
+    user = (await session.exec(statement)).first()
     if user is None:
         raise credentials_exception
+    # Another worker, or this one before a restart, may have logged the subject out
+    await load_revocation(session, email)
+    if access_tokens_revoked(email, payload.get("iat"), payload.get("iat_ms")):
+        raise credentials_exception
+    user_cache.set(email, _snapshot(user))
     return user
 
-def get_current_active_user(
+def _snapshot(user: User) -> User:
+    """Detached copy of a user row that is safe to share between sessions"""
+    snapshot = User(**user.model_dump())
+    make_transient_to_detached(snapshot)
+    return snapshot
+
+def invalidate_user(email: str):
+    """Forget a cached user after their row changed or was deleted"""
+    user_cache.invalidate(email)
+
+async def get_current_active_user(
     current_user: User = Depends(get_current_user)
 ) -> User:
     """Get current active user"""
     return current_user
+
+async def get_current_admin(
+    current_user: User = Depends(get_current_active_user)
+) -> User:
+    """Get current user, requiring them to be listed in ADMIN_EMAILS"""
+    if current_user.email.lower() not in ADMIN_EMAILS:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Administrator access required"
+        )
+    return current_user
@@ -0,0 +1,65 @@
+"""
+Per-call cost of token creation and of resolving the current user from a
+token, with the user cache cold and warm, on a throwaway seeded database.
+
+Run from backend_v1:  uv run python -m benchmarks.bench_auth
+"""
+import asyncio
+import os
+import tempfile
+import time
+
+_tmp = tempfile.TemporaryDirectory()
+os.environ["DATABASE_URL"] = f"sqlite:///{_tmp.name}/bench.db"
+
+from sqlmodel.ext.asyncio.session import AsyncSession
+from auth import create_access_token, get_current_user, user_cache
+from db import async_engine, init_db, seed_data
+from benchmarks.stats import format_summary, summarize
+
+ROUNDS = 5000
+EMAIL = "john.doe@example.com"
+
+
+def _measure(call, rounds: int = ROUNDS) -> tuple[list[float], float]:
+    samples = []
+    started = time.perf_counter()
+    for _ in range(rounds):
+        begin = time.perf_counter()
+        call()
+        samples.append(time.perf_counter() - begin)
+    return samples, time.perf_counter() - started
+
+
+async def _measure_async(call, rounds: int = ROUNDS) -> tuple[list[float], float]:
+    samples = []
+    started = time.perf_counter()
+    for _ in range(rounds):
+        begin = time.perf_counter()
+        await call()
+        samples.append(time.perf_counter() - begin)
+    return samples, time.perf_counter() - started
+
+
+async def _current_user_benchmarks(token: str):
+    async def resolve(clear_cache: bool):
+        if clear_cache:
+            user_cache.clear()
+        async with AsyncSession(async_engine, expire_on_commit=False) as session:
+            await get_current_user(token, session)
+
+    for name, clear_cache in [("get_current_user (cold)", True), ("get_current_user (cached)", False)]:
+        await resolve(clear_cache)
+        print(format_summary(name, summarize(*await _measure_async(lambda: resolve(clear_cache))), "us"))
+
+
+def main():
+    init_db()
+    seed_data()
+
+    print(format_summary("create_access_token", summarize(*_measure(lambda: create_access_token({"sub": EMAIL}))), "us"))
+    asyncio.run(_current_user_benchmarks(create_access_token({"sub": EMAIL})))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,47 @@
+"""
+Stress the transaction ID generator: many threads minting at once must never
+produce a duplicate, and IDs from each thread must be strictly increasing.
+
+Run from backend_v1:  uv run python -m benchmarks.bench_ids
+"""
+import time
+from concurrent.futures import ThreadPoolExecutor
+from multiprocessing import get_context
+from ids import IdGenerator, id_generator, new_transaction_id
+
+THREADS = 16
+PER_THREAD = 50_000
+PROCESSES = 4
+
+
+def _mint(count: int) -> list[str]:
+    return [new_transaction_id() for _ in range(count)]
+
+
+def _mint_on_node(node: int) -> list[int]:
+    generator = IdGenerator(node)
+    return [generator.next_id() for _ in range(PER_THREAD)]
+
+
+def main():
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=THREADS) as pool:
+        batches = list(pool.map(_mint, [PER_THREAD] * THREADS))
+    seconds = time.perf_counter() - started
+
+    minted = [tid for batch in batches for tid in batch]
+    assert len(set(minted)) == len(minted), "duplicate IDs across threads"
+    for batch in batches:
+        assert all(a < b for a, b in zip(batch, batch[1:])), "IDs not increasing within a thread"
+    print(f"threads: {len(minted)} IDs from {THREADS} threads in {seconds:.2f}s "
+          f"({len(minted) / seconds:,.0f} IDs/s), all unique, node {id_generator.node}")
+
+    with get_context("spawn").Pool(PROCESSES) as pool:
+        batches = pool.map(_mint_on_node, range(PROCESSES))
+    minted = [value for batch in batches for value in batch]
+    assert len(set(minted)) == len(minted), "duplicate IDs across processes"
+    print(f"processes: {len(minted)} IDs from {PROCESSES} nodes, all unique")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,111 @@
+"""
+Bulk academic record import vs row-by-row ORM adds, on a throwaway SQLite
+database. The default imports 2,000 students x 50 courses = 100k enrollment
+rows from a catalog of 400 courses.
+
+Run from backend_v1:  uv run python -m benchmarks.bench_import --students 2000 --courses 50
+"""
+import argparse
+import os
+import random
+import tempfile
+import time
+from datetime import datetime
+
+_tmp = tempfile.TemporaryDirectory()
+os.environ["DATABASE_URL"] = f"sqlite:///{_tmp.name}/bench.db"
+
+from sqlalchemy import delete, insert
+from sqlmodel import Session, select
+from catalog import import_records
+from db import engine, init_db
+from models import AcademicRecord, Course, Enrollment, User
+
+CATALOG_SIZE = 400
+
+
+def seed_users(students: int):
+    now = datetime.now()
+    with engine.begin() as conn:
+        conn.execute(insert(User.__table__), [
+            {"name": f"Student {i}", "email": f"student{i}@example.com", "password": "x", "created_at": now, "updated_at": now}
+            for i in range(students)
+        ])
+
+
+def make_records(students: int, courses: int) -> list[dict]:
+    catalog = [
+        {"code": f"CSE {1000 + i}", "title": f"Course {i}", "credit": random.choice([1.5, 3, 4]), "type": random.choice(["Theory", "Lab"])}
+        for i in range(CATALOG_SIZE)
+    ]
+    return [
+        {
+            "email": f"student{i}@example.com",
+            "student_id": f"{190000 + i}",
+            "reg_no": f"{2019000000 + i}",
+            "session": "2019-2020",
+            "cgpa": round(random.uniform(2.5, 4.0), 2),
+            "graduation_year": 2024,
+            "courses": random.sample(catalog, courses),
+        }
+        for i in range(students)
+    ]
+
+
+def reset():
+    with engine.begin() as conn:
+        for table in [Enrollment.__table__, Course.__table__, AcademicRecord.__table__]:
+            conn.execute(delete(table))
+
+
+def orm_import(records: list[dict]) -> int:
+    """The naive path: one ORM add and flush per row"""
+    rows = 0
+    with Session(engine) as session:
+        users = {user.email: user.id for user in session.exec(select(User))}
+        course_ids: dict[str, int] = {}
+        for raw in records:
+            record = AcademicRecord(
+                user_id=users[raw["email"]], student_id=raw["student_id"], reg_no=raw["reg_no"],
+                session=raw["session"], cgpa=raw["cgpa"], graduation_year=raw["graduation_year"],
+            )
+            session.add(record)
+            session.flush()
+            for position, course in enumerate(raw["courses"]):
+                if course["code"] not in course_ids:
+                    row = Course(**course)
+                    session.add(row)
+                    session.flush()
+                    course_ids[course["code"]] = row.id
+                session.add(Enrollment(academic_record_id=record.id, course_id=course_ids[course["code"]], position=position))
+                session.flush()
+                rows += 1
+        session.commit()
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--students", type=int, default=2000)
+    parser.add_argument("--courses", type=int, default=50, help="courses per student")
+    parser.add_argument("--orm-students", type=int, default=200, help="students for the row-by-row baseline")
+    args = parser.parse_args()
+
+    init_db()
+    seed_users(args.students)
+    records = make_records(args.students, args.courses)
+
+    started = time.perf_counter()
+    report = import_records(engine, records)
+    seconds = time.perf_counter() - started
+    print(f"bulk import     {report.enrollments:>8,} enrollments  {seconds:7.2f}s  {report.enrollments / seconds:>10,.0f} rows/s")
+
+    reset()
+    started = time.perf_counter()
+    rows = orm_import(records[:args.orm_students])
+    seconds = time.perf_counter() - started
+    print(f"row-by-row ORM  {rows:>8,} enrollments  {seconds:7.2f}s  {rows / seconds:>10,.0f} rows/s")
+
+
+if __name__ == "__main__":
+    main()
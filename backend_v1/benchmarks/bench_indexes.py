@@ -0,0 +1,87 @@
+"""
+Lookup latency on the hot columns with and without the migration 2 indexes.
+
+Run from backend_v1:  uv run python -m benchmarks.bench_indexes --rows 1000000
+"""
+import argparse
+import random
+import tempfile
+import time
+from datetime import datetime
+from pathlib import Path
+from sqlalchemy import insert
+from sqlmodel import Session, create_engine, select
+from models import User, Document, Transaction
+from migrations import _create_base_tables, _add_lookup_indexes
+
+BATCH_SIZE = 50_000
+
+
+def seed(engine, rows: int):
+    now = datetime.now()
+    with engine.begin() as conn:
+        conn.execute(insert(Document.__table__), [{"id": 1, "title": "Certificate", "qr_code": "", "user_id": 1, "created_at": now, "updated_at": now}])
+        for start in range(0, rows, BATCH_SIZE):
+            ids = range(start + 1, min(start + BATCH_SIZE, rows) + 1)
+            conn.execute(insert(User.__table__), [
+                {"id": i, "name": f"Student {i}", "email": f"student{i}@example.com", "password": "x", "created_at": now, "updated_at": now}
+                for i in ids
+            ])
+            conn.execute(insert(Transaction.__table__), [
+                {"transaction_id": f"TXN{i:019d}", "status": "completed", "amount": 500.0, "user_id": i, "document_id": 1, "created_at": now, "updated_at": now}
+                for i in ids
+            ])
+
+
+def drop_indexes(engine):
+    with engine.begin() as conn:
+        for table in [User.__table__, Document.__table__, Transaction.__table__]:
+            for index in table.indexes:
+                index.drop(conn, checkfirst=True)
+
+
+def time_lookups(engine, rows: int, samples: int) -> dict[str, float]:
+    """Average milliseconds per lookup for each hot query"""
+    picks = [random.randint(1, rows) for _ in range(samples)]
+    queries = {
+        "user.email": lambda i: select(User).where(User.email == f"student{i}@example.com"),
+        "transaction.transaction_id": lambda i: select(Transaction).where(Transaction.transaction_id == f"TXN{i:019d}"),
+        "transaction.user_id": lambda i: select(Transaction).where(Transaction.user_id == i),
+    }
+    results = {}
+    with Session(engine) as session:
+        for name, query in queries.items():
+            start = time.perf_counter()
+            for i in picks:
+                session.exec(query(i)).first()
+            results[name] = (time.perf_counter() - start) / samples * 1000
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--samples", type=int, default=20)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        engine = create_engine(f"sqlite:///{Path(tmp) / 'bench.db'}")
+        with engine.begin() as conn:
+            _create_base_tables(conn)
+        drop_indexes(engine)
+
+        start = time.perf_counter()
+        seed(engine, args.rows)
+        print(f"seeded {args.rows} users and transactions in {time.perf_counter() - start:.1f}s")
+
+        before = time_lookups(engine, args.rows, args.samples)
+        with engine.begin() as conn:
+            _add_lookup_indexes(conn)
+        after = time_lookups(engine, args.rows, args.samples * 50)
+
+        for name in before:
+            print(f"{name:28} no index {before[name]:9.3f} ms   indexed {after[name]:7.3f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,75 @@
+"""
+Bulk student onboarding vs one register-style call per student, on a
+throwaway SQLite database.
+
+Run from backend_v1:  uv run python -m benchmarks.bench_onboarding --students 1000
+"""
+import argparse
+import asyncio
+import os
+import tempfile
+import time
+
+_tmp = tempfile.TemporaryDirectory()
+os.environ["DATABASE_URL"] = f"sqlite:///{_tmp.name}/bench.db"
+
+from sqlmodel import select
+from sqlmodel.ext.asyncio.session import AsyncSession
+from db import async_engine, init_db
+from hashing import BULK_HASH_WORKERS, hash_password
+from models import User
+from onboarding import onboard_students
+
+
+def make_students(count: int, prefix: str) -> list[dict]:
+    return [
+        {
+            "name": f"Student {i}",
+            "email": f"{prefix}{i}@example.com",
+            "password": f"password-{i}",
+            "academic_record": {
+                "student_id": f"{200000 + i}",
+                "reg_no": f"{2020000000 + i}",
+                "session": "2020-2021",
+                "cgpa": 3.5,
+                "courses": [{"code": f"CSE {1000 + c}", "title": f"Course {c}", "credit": 3, "type": "Theory"} for c in range(40)],
+            },
+        }
+        for i in range(count)
+    ]
+
+
+async def register_serially(students: list[dict]):
+    """What onboarding through /api/auth/register costs: lookup, hash and commit per student"""
+    for student in students:
+        async with AsyncSession(async_engine) as session:
+            await session.exec(select(User).where(User.email == student["email"]))
+            session.add(User(name=student["name"], email=student["email"], password=await hash_password(student["password"])))
+            await session.commit()
+
+
+async def main_async(args):
+    started = time.perf_counter()
+    report = await onboard_students(make_students(args.students, "bulk"))
+    bulk = time.perf_counter() - started
+    print(f"bulk onboarding {report.created:>6} students {bulk:8.2f}s  {report.created / bulk:8.1f}/s  ({BULK_HASH_WORKERS} hash threads, {report.enrollments} enrollments)")
+
+    started = time.perf_counter()
+    await register_serially(make_students(args.serial_students, "serial"))
+    serial = time.perf_counter() - started
+    print(f"serial register {args.serial_students:>6} students {serial:8.2f}s  {args.serial_students / serial:8.1f}/s")
+    print(f"5,000-student intake: bulk ~{5000 / (report.created / bulk):.0f}s, serial ~{5000 / (args.serial_students / serial):.0f}s")
+    await async_engine.dispose()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--students", type=int, default=1000)
+    parser.add_argument("--serial-students", type=int, default=100, help="students for the one-at-a-time baseline")
+    args = parser.parse_args()
+    init_db()
+    asyncio.run(main_async(args))
+
+
+if __name__ == "__main__":
+    main()
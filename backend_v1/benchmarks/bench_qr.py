@@ -0,0 +1,27 @@
+"""
+Compare the per-document cost of PNG and SVG QR codes.
+
+Run from backend_v1:  uv run python -m benchmarks.bench_qr
+"""
+import timeit
+from qr import qr_png, qr_svg, qr_for_transactions, verification_url
+
+ROUNDS = 200
+
+
+def main():
+    urls = [verification_url(f"TXN2026012810{i:05d}") for i in range(ROUNDS)]
+
+    for name, encoder in [("png", qr_png), ("svg", qr_svg)]:
+        seconds = timeit.timeit(lambda: [encoder(url) for url in urls], number=1)
+        size = len(encoder(urls[0]))
+        print(f"{name}: {seconds / ROUNDS * 1000:.3f} ms/document, {size} bytes data URI")
+
+    transaction_ids = [f"TXN2026012810{i:05d}" for i in range(ROUNDS)]
+    qr_for_transactions(transaction_ids)
+    seconds = timeit.timeit(lambda: qr_for_transactions(transaction_ids), number=10)
+    print(f"cached: {seconds / (10 * ROUNDS) * 1_000_000:.3f} us/document")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,70 @@
+"""
+Compare per-document PDF render time with and without the worker-wide static
+image layer (RENDER_STATIC_CACHE), after checking that both produce the same
+PDFs. Exits with status 1 if they differ.
+
+Run from backend_v1:  uv run python -m benchmarks.bench_render
+"""
+import sys
+import time
+import render
+from assets import assets
+from router.documents import CertificateRequest, _certificate_context
+from templating import render_html, stylesheet_for
+
+ROUNDS = 50
+TEMPLATE = "certificate.html"
+
+
+def _documents() -> list[str]:
+    documents = []
+    for i in range(ROUNDS):
+        cert = CertificateRequest(
+            transaction_id=f"TXN2026012810{i:05d}",
+            student_name=f"Student {i}",
+            student_id=f"{200000 + i}",
+            reg_no=f"{10000 + i}",
+            session="2019-2020",
+            department="Computer Science and Engineering",
+        )
+        documents.append(render_html(TEMPLATE, _certificate_context(cert)))
+    return documents
+
+
+def check_equivalence(documents: list[str], stylesheet: str, static_assets) -> bool:
+    """Render each document with and without the static layer and compare the PDFs"""
+    mismatches = 0
+    # Twice with the cache, so the second pass is served from the warm static layer
+    for layer_pass in range(2):
+        for i, html in enumerate(documents):
+            plain = render._render(html, ".", stylesheet, None)
+            cached = render._render(html, ".", stylesheet, static_assets)
+            if render._normalized(plain) != render._normalized(cached):
+                mismatches += 1
+                print(f"document {i} (pass {layer_pass + 1}): cached render differs from uncached render")
+    return mismatches == 0
+
+
+def main():
+    render._init_worker()
+    documents = _documents()
+    stylesheet = stylesheet_for(TEMPLATE)
+    static_assets = (assets.version, assets.image_ids)
+
+    if not render._static_cache_supported:
+        print("static image cache unsupported by this WeasyPrint; renders fall back to the plain cache")
+    if not check_equivalence(documents[:5], stylesheet, static_assets):
+        sys.exit(1)
+    print("cached and uncached renders are identical")
+
+    for name, layer in [("no static cache", None), ("static cache", static_assets)]:
+        # First document of each run populates the cache; time the steady state
+        render._render(documents[0], ".", stylesheet, layer)
+        started = time.perf_counter()
+        sizes = [len(render._render(html, ".", stylesheet, layer)) for html in documents]
+        seconds = time.perf_counter() - started
+        print(f"{name}: {seconds / ROUNDS * 1000:.1f} ms/document, {sum(sizes) // ROUNDS} bytes avg")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,42 @@
+"""
+Per-request token cost: python-jose vs the stdlib HMAC codec, and decoding
+through the verified-token cache.
+
+Run from backend_v1:  uv run python -m benchmarks.bench_tokens
+"""
+import time
+from datetime import datetime, timedelta, timezone
+import tokens
+from tokens import HmacCodec, JoseCodec, decode_token
+from benchmarks.stats import format_summary, summarize
+
+ROUNDS = 20_000
+KEY = "benchmark-secret"
+ALGORITHM = "HS256"
+
+
+def _measure(call) -> tuple[list[float], float]:
+    samples = []
+    started = time.perf_counter()
+    for _ in range(ROUNDS):
+        begin = time.perf_counter()
+        call()
+        samples.append(time.perf_counter() - begin)
+    return samples, time.perf_counter() - started
+
+
+def main():
+    claims = {"sub": "john.doe@example.com", "type": "access",
+              "exp": datetime.now(timezone.utc).replace(tzinfo=None) + timedelta(minutes=30)}
+
+    for name, codec in [("jose", JoseCodec(ALGORITHM)), ("hmac", HmacCodec(ALGORITHM))]:
+        token = codec.encode(claims, KEY)
+        print(format_summary(f"{name} encode", summarize(*_measure(lambda: codec.encode(claims, KEY))), "us"))
+        print(format_summary(f"{name} decode", summarize(*_measure(lambda: codec.decode(token, KEY))), "us"))
+
+    token = HmacCodec(ALGORITHM).encode(claims, KEY)
+    print(format_summary(f"{tokens.TOKEN_CODEC} decode (cached)", summarize(*_measure(lambda: decode_token(token, KEY, ALGORITHM))), "us"))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,102 @@
+"""
+In-process ASGI load generator: drives login, verify-ref and
+generate-certificate against the app on a throwaway seeded SQLite database
+and reports throughput and p50/p95/p99 latency per scenario.
+
+Run from backend_v1:  uv run python -m benchmarks.load_api --concurrency 32 --requests 2000
+"""
+import argparse
+import asyncio
+import os
+import tempfile
+import time
+from collections import Counter
+from typing import Awaitable, Callable
+
+_tmp = tempfile.TemporaryDirectory()
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{_tmp.name}/load.db")
+os.environ.setdefault("PDF_CACHE_DIR", f"{_tmp.name}/pdf")
+# Load tests hammer verify-ref from one address; don't let the rate limiter skew them
+os.environ.setdefault("VERIFY_RATE_LIMIT", "1000000")
+os.environ.setdefault("VERIFY_RATE_BURST", "1000000")
+
+import httpx
+from main import app
+from benchmarks.stats import format_summary, summarize
+
+EMAIL = "john.doe@example.com"
+PASSWORD = "password123"
+TRANSACTION_ID = "TXN202601281000001"
+
+Scenario = Callable[[httpx.AsyncClient, int], Awaitable[httpx.Response]]
+
+
+def _scenarios(headers: dict, cached: bool) -> dict[str, Scenario]:
+    async def login(client: httpx.AsyncClient, i: int) -> httpx.Response:
+        return await client.post("/api/auth/login", json={"email": EMAIL, "password": PASSWORD})
+
+    async def verify_ref(client: httpx.AsyncClient, i: int) -> httpx.Response:
+        return await client.post("/api/documents/verify-ref", json={"ref_no": TRANSACTION_ID})
+
+    async def generate_certificate(client: httpx.AsyncClient, i: int) -> httpx.Response:
+        # A distinct name per request defeats the PDF cache so every request renders
+        name = "Load Test Student" if cached else f"Load Test Student {i}"
+        return await client.post("/api/documents/generate-certificate", headers=headers, json={
+            "transaction_id": TRANSACTION_ID,
+            "student_name": name,
+            "student_id": "200101",
+            "reg_no": "10101",
+            "session": "2019-2020",
+        })
+
+    return {
+        "login": login,
+        "verify-ref": verify_ref,
+        "generate-certificate": generate_certificate,
+    }
+
+
+async def _run(client: httpx.AsyncClient, scenario: Scenario, requests: int, concurrency: int):
+    samples: list[float] = []
+    statuses: Counter = Counter()
+    counter = iter(range(requests))
+
+    async def worker():
+        for i in counter:
+            begin = time.perf_counter()
+            try:
+                response = await scenario(client, i)
+                statuses[response.status_code] += 1
+            except Exception as exc:
+                statuses[type(exc).__name__] += 1
+                continue
+            samples.append(time.perf_counter() - begin)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return samples, time.perf_counter() - started, statuses
+
+
+async def main_async(args):
+    transport = httpx.ASGITransport(app=app)
+    async with app.router.lifespan_context(app):
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=120) as client:
+            response = await client.post("/api/auth/login", json={"email": EMAIL, "password": PASSWORD})
+            headers = {"Authorization": f"Bearer {response.json()['access_token']}"}
+            scenarios = _scenarios(headers, args.cached)
+            for name in args.scenario or list(scenarios):
+                samples, seconds, statuses = await _run(client, scenarios[name], args.requests, args.concurrency)
+                print(f"{format_summary(name, summarize(samples, seconds))}  status {dict(statuses)}")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--requests", type=int, default=500, help="requests per scenario")
+    parser.add_argument("--scenario", action="append", choices=["login", "verify-ref", "generate-certificate"])
+    parser.add_argument("--cached", action="store_true", help="repeat one certificate payload (PDF cache hits)")
+    asyncio.run(main_async(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
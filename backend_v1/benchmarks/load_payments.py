@@ -0,0 +1,77 @@
+"""
+Concurrency check for the payment endpoints against a throwaway database:
+
+- 100 concurrent verifications of one pending transaction must complete it
+  exactly once, with every other call reporting it as already verified.
+- 100 concurrent payment creations sharing one Idempotency-Key must create a
+  single transaction; every successful response names that same transaction.
+
+Run from backend_v1:  uv run python -m benchmarks.load_payments
+"""
+import os
+import tempfile
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from threading import Barrier
+
+CONCURRENCY = 100
+
+_tmp = tempfile.TemporaryDirectory()
+os.environ["DATABASE_URL"] = f"sqlite:///{_tmp.name}/load.db"
+
+from fastapi.testclient import TestClient
+from sqlmodel import Session, func, select
+from main import app
+from db import engine
+from models import Transaction
+
+
+def _concurrently(call) -> list:
+    barrier = Barrier(CONCURRENCY)
+
+    def run(_):
+        barrier.wait()
+        return call()
+
+    with ThreadPoolExecutor(max_workers=CONCURRENCY) as pool:
+        return list(pool.map(run, range(CONCURRENCY)))
+
+
+def main():
+    with TestClient(app) as client:
+        response = client.post("/api/auth/login", json={"email": "john.doe@example.com", "password": "password123"})
+        headers = {"Authorization": f"Bearer {response.json()['access_token']}"}
+        payment = {"user_id": 1, "document_id": 1, "amount": 500.0}
+
+        transaction_id = client.post("/api/payments/payment", headers=headers, json=payment).json()["transaction_id"]
+        started = time.perf_counter()
+        responses = _concurrently(lambda: client.post(
+            "/api/payments/verify-payment", headers=headers, json={"transaction_id": transaction_id}
+        ))
+        seconds = time.perf_counter() - started
+        outcomes = Counter((r.status_code, r.json().get("message")) for r in responses)
+        print(f"verify x{CONCURRENCY} in {seconds:.2f}s: {dict(outcomes)}")
+        assert outcomes[(200, "Payment verified successfully")] == 1
+        assert outcomes[(200, "Payment already verified")] == CONCURRENCY - 1
+
+        with Session(engine) as session:
+            before = session.exec(select(func.count()).select_from(Transaction)).one()
+        started = time.perf_counter()
+        responses = _concurrently(lambda: client.post(
+            "/api/payments/payment", headers={**headers, "Idempotency-Key": "load-test-1"}, json=payment
+        ))
+        seconds = time.perf_counter() - started
+        with Session(engine) as session:
+            after = session.exec(select(func.count()).select_from(Transaction)).one()
+        created = {r.json()["transaction_id"] for r in responses if r.status_code == 201}
+        statuses = Counter(r.status_code for r in responses)
+        print(f"payment x{CONCURRENCY} with one Idempotency-Key in {seconds:.2f}s: "
+              f"{dict(statuses)}, {after - before} transaction(s) created")
+        assert after - before == 1
+        assert len(created) == 1
+        assert set(statuses) <= {201, 409}
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,77 @@
+"""
+Refresh-token load test: concurrent clients each log in once and then walk a
+rotation chain through /api/auth/refresh, on a throwaway seeded SQLite
+database. Reports refresh throughput and p50/p95/p99 latency, then checks
+that replaying a consumed token revokes its family.
+
+Run from backend_v1:  uv run python -m benchmarks.load_refresh --clients 32 --refreshes 50
+"""
+import argparse
+import asyncio
+import os
+import tempfile
+import time
+from collections import Counter
+
+_tmp = tempfile.TemporaryDirectory()
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{_tmp.name}/load.db")
+os.environ.setdefault("PDF_CACHE_DIR", f"{_tmp.name}/pdf")
+
+import httpx
+from main import app
+from benchmarks.stats import format_summary, summarize
+
+EMAIL = "john.doe@example.com"
+PASSWORD = "password123"
+
+
+async def _login(client: httpx.AsyncClient) -> str:
+    response = await client.post("/api/auth/login", json={"email": EMAIL, "password": PASSWORD})
+    response.raise_for_status()
+    return response.json()["refresh_token"]
+
+
+async def _chain(client: httpx.AsyncClient, refreshes: int, samples: list[float], statuses: Counter):
+    token = await _login(client)
+    for _ in range(refreshes):
+        begin = time.perf_counter()
+        response = await client.post("/api/auth/refresh", json={"refresh_token": token})
+        statuses[response.status_code] += 1
+        if response.status_code != 200:
+            return
+        samples.append(time.perf_counter() - begin)
+        token = response.json()["refresh_token"]
+
+
+async def _check_reuse(client: httpx.AsyncClient) -> bool:
+    stolen = await _login(client)
+    rotated = (await client.post("/api/auth/refresh", json={"refresh_token": stolen})).json()["refresh_token"]
+    replay = await client.post("/api/auth/refresh", json={"refresh_token": stolen})
+    after = await client.post("/api/auth/refresh", json={"refresh_token": rotated})
+    return replay.status_code == 401 and after.status_code == 401
+
+
+async def main_async(args):
+    transport = httpx.ASGITransport(app=app)
+    async with app.router.lifespan_context(app):
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=120) as client:
+            samples: list[float] = []
+            statuses: Counter = Counter()
+            started = time.perf_counter()
+            await asyncio.gather(*(
+                _chain(client, args.refreshes, samples, statuses) for _ in range(args.clients)
+            ))
+            seconds = time.perf_counter() - started
+            print(f"{format_summary('refresh', summarize(samples, seconds))}  status {dict(statuses)}")
+            print(f"reuse detection: {'ok' if await _check_reuse(client) else 'FAILED'}")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--clients", type=int, default=16, help="concurrent refresh chains")
+    parser.add_argument("--refreshes", type=int, default=50, help="rotations per chain")
+    asyncio.run(main_async(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
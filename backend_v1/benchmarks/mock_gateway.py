@@ -0,0 +1,95 @@
+"""
+Mock payment gateway: fire a storm of signed callbacks (with redeliveries) at
+the webhook endpoint of an app running on a throwaway database and check that
+every payment ends up completed using a handful of batched commits.
+
+Run from backend_v1:  uv run python -m benchmarks.mock_gateway --payments 5000
+"""
+import argparse
+import json
+import os
+import random
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+_tmp = tempfile.TemporaryDirectory()
+os.environ["DATABASE_URL"] = f"sqlite:///{_tmp.name}/gateway.db"
+
+from fastapi.testclient import TestClient
+from sqlalchemy import event, insert
+from sqlmodel import Session, func, select
+from main import app
+from db import async_engine, engine
+from models import Transaction
+from webhooks import sign_payload, webhook_stats
+
+DUPLICATE_RATE = 0.2
+
+
+def _seed(payments: int) -> list[str]:
+    now = datetime.now()
+    transaction_ids = [f"TXNMOCK{i:012d}" for i in range(payments)]
+    with engine.begin() as conn:
+        conn.execute(insert(Transaction.__table__), [
+            {"transaction_id": tid, "status": "pending", "amount": 500.0, "user_id": 1, "document_id": 1,
+             "created_at": now, "updated_at": now}
+            for tid in transaction_ids
+        ])
+    return transaction_ids
+
+
+def _callback(client: TestClient, event_id: str, transaction_id: str) -> int:
+    body = json.dumps({"event_id": event_id, "transaction_id": transaction_id, "status": "succeeded"}).encode()
+    response = client.post(
+        "/api/webhooks/payment-gateway",
+        content=body,
+        headers={"Content-Type": "application/json", "X-Signature": sign_payload(body, int(time.time()))},
+    )
+    return response.status_code
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--payments", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=64)
+    args = parser.parse_args()
+
+    commits = 0
+
+    def count_commit(_conn):
+        nonlocal commits
+        commits += 1
+
+    with TestClient(app) as client:
+        transaction_ids = _seed(args.payments)
+        deliveries = [(f"evt_{tid}", tid) for tid in transaction_ids]
+        deliveries += random.sample(deliveries, int(len(deliveries) * DUPLICATE_RATE))
+        random.shuffle(deliveries)
+
+        event.listen(async_engine.sync_engine, "commit", count_commit)
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+            statuses = list(pool.map(lambda d: _callback(client, *d), deliveries))
+        seconds = time.perf_counter() - started
+
+        bad = client.post("/api/webhooks/payment-gateway", content=b"{}", headers={"X-Signature": "t=0,v1=00"})
+        assert bad.status_code == 401
+
+    # Leaving the client runs shutdown, which flushes whatever is still buffered
+    event.remove(async_engine.sync_engine, "commit", count_commit)
+    with Session(engine) as session:
+        completed = session.exec(
+            select(func.count()).select_from(Transaction)
+            .where(Transaction.transaction_id.in_(transaction_ids), Transaction.status == "completed")
+        ).one()
+
+    print(f"{len(deliveries)} callbacks ({len(deliveries) - args.payments} redeliveries) in {seconds:.2f}s "
+          f"({len(deliveries) / seconds:,.0f}/s), statuses {sorted(set(statuses))}")
+    print(f"{completed}/{args.payments} payments completed with {commits} commits; stats {webhook_stats()}")
+    assert completed == args.payments
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,35 @@
+"""
+Latency summaries shared by the benchmark scripts.
+"""
+import statistics
+
+
+def percentile(sorted_samples: list[float], pct: float) -> float:
+    """Nearest-rank percentile of already sorted samples"""
+    if not sorted_samples:
+        return 0.0
+    rank = max(1, round(pct / 100 * len(sorted_samples)))
+    return sorted_samples[min(rank, len(sorted_samples)) - 1]
+
+
+def summarize(samples: list[float], seconds: float) -> dict:
+    """Throughput and latency percentiles for samples (in seconds) collected over a run"""
+    ordered = sorted(samples)
+    return {
+        "count": len(ordered),
+        "throughput": len(ordered) / seconds if seconds else 0.0,
+        "mean": statistics.fmean(ordered) if ordered else 0.0,
+        "p50": percentile(ordered, 50),
+        "p95": percentile(ordered, 95),
+        "p99": percentile(ordered, 99),
+    }
+
+
+def format_summary(name: str, summary: dict, unit: str = "ms") -> str:
+    """One report line: name, throughput and p50/p95/p99"""
+    scale = {"ms": 1000, "us": 1_000_000}[unit]
+    return (
+        f"{name:<28} {summary['count']:>7} ops {summary['throughput']:>10,.1f}/s  "
+        f"p50 {summary['p50'] * scale:8.3f}{unit}  p95 {summary['p95'] * scale:8.3f}{unit}  "
+        f"p99 {summary['p99'] * scale:8.3f}{unit}"
+    )
@@ -0,0 +1,284 @@
+"""
+Course catalog: per-student course lists for certificates, and the bulk
+importer for a department's academic records.
+
+Import files list students by email (the User must already exist) with their
+AcademicRecord fields and courses:
+
+- JSON: a list of records, each with a "courses" list of {code, title, credit, type}
+- CSV: one row per enrollment, the record columns repeated on every row of a
+  student plus course_code, course_title, course_credit and course_type
+
+The whole file is imported in one transaction with executemany inserts:
+catalog courses are created or updated by code, records are created or
+replaced, and each student's enrollments are rewritten. Records that fail
+validation are reported and skipped.
+
+Run from backend_v1:  uv run python -m catalog records.csv [--department "..."]
+"""
+import argparse
+import csv
+import json
+import os
+from collections.abc import Iterable, Iterator
+from dataclasses import dataclass, field
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Optional
+from sqlalchemy import bindparam, delete, insert, select, update
+from sqlalchemy.engine import Connection, Engine
+from sqlmodel.ext.asyncio.session import AsyncSession
+from models import AcademicRecord, Course, Enrollment, User
+
+# Course import configuration - override through environment variables
+IMPORT_CHUNK_SIZE = int(os.getenv("IMPORT_CHUNK_SIZE", "500"))
+
+DEFAULT_DEPARTMENT = "Computer Science and Engineering"
+
+# AcademicRecord columns an import may set -> converter; None marks a required column
+RECORD_FIELDS = {
+    "student_id": (str, None),
+    "reg_no": (str, None),
+    "session": (str, None),
+    "cgpa": (float, None),
+    "department": (str, DEFAULT_DEPARTMENT),
+    "father_name": (str, ""),
+    "mother_name": (str, ""),
+    "degree_years": (int, 4),
+    "degree_months": (int, 0),
+    "degree_type": (str, "Bachelor(Engg.)"),
+    "graduation_year": (int, 2025),
+}
+
+
+@dataclass
+class ImportReport:
+    records: int = 0
+    courses_created: int = 0
+    courses_updated: int = 0
+    enrollments: int = 0
+    errors: list[str] = field(default_factory=list)
+
+
+def _chunks(items: list, size: int = IMPORT_CHUNK_SIZE) -> Iterator[list]:
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+def _credit(value: float) -> float | int:
+    """Whole credits print as 3, not 3.0"""
+    return int(value) if float(value).is_integer() else value
+
+
+async def load_courses(session: AsyncSession, record_ids: Iterable[int]) -> dict[int, list[dict]]:
+    """Catalog courses of each academic record, in certificate order"""
+    record_ids = set(record_ids)
+    if not record_ids:
+        return {}
+    statement = (
+        select(Enrollment.academic_record_id, Course.code, Course.title, Course.credit, Course.type)
+        .join(Course, Course.id == Enrollment.course_id)
+        .where(Enrollment.academic_record_id.in_(record_ids))
+        .order_by(Enrollment.academic_record_id, Enrollment.position)
+    )
+    courses: dict[int, list[dict]] = {}
+    for record_id, code, title, credit, course_type in await session.exec(statement):
+        courses.setdefault(record_id, []).append(
+            {"code": code, "title": title, "credit": _credit(credit), "type": course_type}
+        )
+    return courses
+
+
+def _parse_course(raw: dict, department: str) -> dict:
+    code = str(raw.get("code") or "").strip()
+    if not code:
+        raise ValueError("course without a code")
+    try:
+        credit = float(raw.get("credit") or 0)
+    except (TypeError, ValueError):
+        raise ValueError(f"invalid credit for {code}: {raw.get('credit')!r}") from None
+    return {
+        "code": code,
+        "title": str(raw.get("title") or "").strip(),
+        "credit": credit,
+        "type": str(raw.get("type") or "Theory").strip(),
+        "department": department,
+    }
+
+
+def parse_record(raw: dict, department: Optional[str] = None) -> dict:
+    """Validate one input record into AcademicRecord values plus its courses"""
+    email = str(raw.get("email") or "").strip()
+    if not email:
+        raise ValueError("missing email")
+    values: dict[str, Any] = {}
+    for name, (convert, default) in RECORD_FIELDS.items():
+        value = raw.get(name)
+        if value is None or value == "":
+            if default is None:
+                raise ValueError(f"missing {name}")
+            value = department if name == "department" and department else default
+        try:
+            values[name] = convert(value)
+        except (TypeError, ValueError):
+            raise ValueError(f"invalid {name}: {value!r}") from None
+
+    courses: dict[str, dict] = {}
+    for course in raw.get("courses") or []:
+        parsed = _parse_course(course, values["department"])
+        courses.setdefault(parsed["code"], parsed)
+    return {"email": email, "values": values, "courses": list(courses.values())}
+
+
+def read_json(path: Path) -> list[dict]:
+    """Records from a JSON list"""
+    data = json.loads(path.read_text())
+    if not isinstance(data, list):
+        raise ValueError("expected a JSON list of records")
+    return data
+
+
+def read_csv(path: Path) -> list[dict]:
+    """Records from a CSV with one row per enrollment, grouped by email"""
+    records: dict[str, dict] = {}
+    with path.open(newline="") as file:
+        for row in csv.DictReader(file):
+            email = (row.get("email") or "").strip()
+            record = records.setdefault(email, {**row, "courses": []})
+            if row.get("course_code"):
+                record["courses"].append({
+                    "code": row["course_code"],
+                    "title": row.get("course_title"),
+                    "credit": row.get("course_credit"),
+                    "type": row.get("course_type"),
+                })
+    return list(records.values())
+
+
+def _sync_catalog(conn, courses: dict[str, dict], report: ImportReport) -> dict[str, int]:
+    """Insert new courses and update changed ones; return code -> course ID"""
+    table = Course.__table__
+    existing: dict[str, tuple] = {}
+    for chunk in _chunks(list(courses)):
+        for row in conn.execute(select(table.c.id, table.c.code, table.c.title, table.c.credit, table.c.type).where(table.c.code.in_(chunk))):
+            existing[row.code] = row
+
+    new = [course for code, course in courses.items() if code not in existing]
+    changed = [
+        {"_id": existing[code].id, "title": course["title"], "credit": course["credit"], "type": course["type"]}
+        for code, course in courses.items()
+        if code in existing and (existing[code].title, existing[code].credit, existing[code].type) != (course["title"], course["credit"], course["type"])
+    ]
+    if new:
+        conn.execute(insert(table), new)
+    if changed:
+        conn.execute(
+            update(table).where(table.c.id == bindparam("_id"))
+            .values(title=bindparam("title"), credit=bindparam("credit"), type=bindparam("type")),
+            changed,
+        )
+    report.courses_created += len(new)
+    report.courses_updated += len(changed)
+
+    course_ids = {code: row.id for code, row in existing.items()}
+    if new:
+        for chunk in _chunks([course["code"] for course in new]):
+            course_ids.update(conn.execute(select(table.c.code, table.c.id).where(table.c.code.in_(chunk))).all())
+    return course_ids
+
+
+def import_records(engine: Engine, raw_records: list[dict], department: Optional[str] = None) -> ImportReport:
+    """Import academic records and their courses in a single transaction"""
+    report = ImportReport()
+    parsed: dict[str, dict] = {}
+    for number, raw in enumerate(raw_records, start=1):
+        try:
+            record = parse_record(raw, department)
+        except ValueError as exc:
+            report.errors.append(f"{str(raw.get('email') or '').strip() or f'record {number}'}: {exc}")
+            continue
+        parsed[record["email"]] = record
+
+    with engine.begin() as conn:
+        write_records(conn, parsed, report)
+    return report
+
+
+def write_records(conn: Connection, parsed: dict[str, dict], report: ImportReport):
+    """Write parsed records (by email) of existing users; the caller owns the transaction"""
+    users, records, enrollments = User.__table__, AcademicRecord.__table__, Enrollment.__table__
+    user_ids: dict[str, int] = {}
+    for chunk in _chunks(list(parsed)):
+        user_ids.update(conn.execute(select(users.c.email, users.c.id).where(users.c.email.in_(chunk))).all())
+    for email in parsed.keys() - user_ids.keys():
+        report.errors.append(f"{email}: no such user")
+    parsed = {email: record for email, record in parsed.items() if email in user_ids}
+    if not parsed:
+        return
+
+    catalog: dict[str, dict] = {}
+    for record in parsed.values():
+        for course in record["courses"]:
+            catalog.setdefault(course["code"], course)
+    course_ids = _sync_catalog(conn, catalog, report) if catalog else {}
+
+    # Create missing academic records, replace existing ones
+    record_ids: dict[int, int] = {}
+    for chunk in _chunks(list(user_ids.values())):
+        record_ids.update(conn.execute(select(records.c.user_id, records.c.id).where(records.c.user_id.in_(chunk))).all())
+    now = datetime.now()
+    new, changed = [], []
+    for email, record in parsed.items():
+        user_id = user_ids[email]
+        values = {**record["values"], "courses": [], "updated_at": now}
+        if user_id in record_ids:
+            changed.append({**values, "_id": record_ids[user_id]})
+        else:
+            new.append({**values, "user_id": user_id, "created_at": now})
+    if new:
+        conn.execute(insert(records), new)
+        for chunk in _chunks([row["user_id"] for row in new]):
+            record_ids.update(conn.execute(select(records.c.user_id, records.c.id).where(records.c.user_id.in_(chunk))).all())
+    if changed:
+        conn.execute(
+            update(records).where(records.c.id == bindparam("_id"))
+            .values({name: bindparam(name) for name in [*RECORD_FIELDS, "courses", "updated_at"]}),
+            changed,
+        )
+
+    # Rewrite every imported student's enrollments
+    imported = [record_ids[user_ids[email]] for email in parsed]
+    for chunk in _chunks(imported):
+        conn.execute(delete(enrollments).where(enrollments.c.academic_record_id.in_(chunk)))
+    rows = [
+        {"academic_record_id": record_ids[user_ids[email]], "course_id": course_ids[course["code"]], "position": position}
+        for email, record in parsed.items()
+        for position, course in enumerate(record["courses"])
+    ]
+    if rows:
+        conn.execute(insert(enrollments), rows)
+
+    report.records += len(parsed)
+    report.enrollments += len(rows)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Bulk import academic records and courses")
+    parser.add_argument("path", type=Path, help="CSV or JSON file")
+    parser.add_argument("--department", help="department for records that don't name one")
+    args = parser.parse_args()
+
+    from db import engine, init_db
+    init_db()
+    raw_records = read_json(args.path) if args.path.suffix.lower() == ".json" else read_csv(args.path)
+    report = import_records(engine, raw_records, args.department)
+    print(
+        f"Imported {report.records} records, {report.enrollments} enrollments "
+        f"({report.courses_created} courses created, {report.courses_updated} updated)"
+    )
+    for error in report.errors:
+        print(f"  skipped {error}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,23 +1,90 @@
-from sqlmodel import SQLModel, create_engine, Session, select
+import os
+from sqlalchemy import event
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import create_async_engine
+from sqlmodel import create_engine, Session, select
+from sqlmodel.ext.asyncio.session import AsyncSession
 from models import User, AcademicRecord, Document, Transaction
-from datetime import datetime
+from migrations import run_migrations
+from metrics import instrument_engine
 
-DATABASE_URL = "sqlite:///./test.db"
-engine = create_engine(DATABASE_URL, echo=False)
+# Database configuration - override through environment variables
+DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///./test.db")
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "10"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "20"))
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "30"))
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "1800"))
+SQLITE_BUSY_TIMEOUT_MS = int(os.getenv("SQLITE_BUSY_TIMEOUT_MS", "5000"))
+
+# Async drivers used for the async engine when the URL doesn't name one
+ASYNC_DRIVERS = {
+    "sqlite": "sqlite+aiosqlite",
+    "postgresql": "postgresql+asyncpg",
+    "mysql": "mysql+aiomysql",
+}
+
+
+def _async_url(url: str) -> str:
+    """Derive the async driver URL from the configured database URL"""
+    parsed = make_url(url)
+    if "+" in parsed.drivername:
+        return url
+    return parsed.set(drivername=ASYNC_DRIVERS.get(parsed.drivername, parsed.drivername)).render_as_string(hide_password=False)
+
+
+def _engine_options(url: str) -> dict:
+    """Connection pool settings; in-memory SQLite uses a single static connection"""
+    parsed = make_url(url)
+    if parsed.get_backend_name() == "sqlite" and parsed.database in (None, "", ":memory:"):
+        return {}
+    return {
+        "pool_size": DB_POOL_SIZE,
+        "max_overflow": DB_MAX_OVERFLOW,
+        "pool_timeout": DB_POOL_TIMEOUT,
+        "pool_recycle": DB_POOL_RECYCLE,
+        "pool_pre_ping": True,
+    }
+
+
+def _configure_sqlite(sync_engine):
+    """Tune every new SQLite connection for concurrent readers and a single writer"""
+    @event.listens_for(sync_engine, "connect")
+    def set_sqlite_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        cursor.execute("PRAGMA journal_mode=WAL")
+        cursor.execute(f"PRAGMA busy_timeout={SQLITE_BUSY_TIMEOUT_MS}")
+        cursor.execute("PRAGMA synchronous=NORMAL")
+        cursor.close()
+
+
+engine = create_engine(DATABASE_URL, echo=False, **_engine_options(DATABASE_URL))
+async_engine = create_async_engine(_async_url(DATABASE_URL), echo=False, **_engine_options(DATABASE_URL))
+
+if engine.dialect.name == "sqlite":
+    _configure_sqlite(engine)
+    _configure_sqlite(async_engine.sync_engine)
+
+# Per-request query counts for /metrics
+instrument_engine(engine)
+instrument_engine(async_engine.sync_engine)
 
 def init_db():
-    """Initialize database tables"""
-    SQLModel.metadata.create_all(engine)
+    """Bring the database schema up to date"""
+    run_migrations(engine)
 
 def get_session():
-    """Dependency to get database session"""
+    """Dependency to get a synchronous database session (scripts and startup tasks)"""
     with Session(engine) as session:
         yield session
 
+async def get_async_session():
+    """Dependency to get an async database session"""
+    async with AsyncSession(async_engine, expire_on_commit=False) as session:
+        yield session
+
 def seed_data():
     """Seed initial data for testing"""
-    from passlib.context import CryptContext
-    pwd_context = CryptContext(schemes=["argon2"], deprecated="auto")
+    from hashing import pwd_context
     
     with Session(engine) as session:
         # Check if data already exists
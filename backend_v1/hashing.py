@@ -0,0 +1,125 @@
+import asyncio
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Optional, TypeVar
+from fastapi import HTTPException, status
+from passlib.context import CryptContext
+from metrics import METRICS_ENABLED, PASSWORD_HASH_SECONDS
+
+# Password hashing configuration - override through environment variables
+HASH_WORKERS = int(os.getenv("HASH_WORKERS", min(4, os.cpu_count() or 1)))
+HASH_MAX_QUEUE = int(os.getenv("HASH_MAX_QUEUE", HASH_WORKERS * 16))
+BULK_HASH_WORKERS = int(os.getenv("BULK_HASH_WORKERS", os.cpu_count() or 1))
+
+# Argon2 cost parameters; changing them makes existing hashes get upgraded on next login
+ARGON2_PARAMS = {
+    f"argon2__{name}": int(os.environ[env])
+    for name, env in [
+        ("time_cost", "ARGON2_TIME_COST"),
+        ("memory_cost", "ARGON2_MEMORY_COST"),
+        ("parallelism", "ARGON2_PARALLELISM"),
+    ]
+    if os.getenv(env)
+}
+
+pwd_context = CryptContext(schemes=["argon2"], deprecated="auto", **ARGON2_PARAMS)
+
+T = TypeVar("T")
+
+# Argon2 releases the GIL, so a thread pool runs hashes in parallel across cores
+_executor = ThreadPoolExecutor(max_workers=HASH_WORKERS, thread_name_prefix="argon2")
+_running = asyncio.Semaphore(HASH_WORKERS)
+_waiting = 0
+_bulk_executor: Optional[ThreadPoolExecutor] = None
+
+_stats_lock = threading.Lock()
+_stats = {
+    "jobs": 0,
+    "rejected": 0,
+    "queue_seconds_total": 0.0,
+    "queue_seconds_max": 0.0,
+    "hash_seconds_total": 0.0,
+}
+
+
+def _record(queue_seconds: float, hash_seconds: float):
+    if METRICS_ENABLED:
+        PASSWORD_HASH_SECONDS.observe(queue_seconds, "queue")
+        PASSWORD_HASH_SECONDS.observe(hash_seconds, "hash")
+    with _stats_lock:
+        _stats["jobs"] += 1
+        _stats["queue_seconds_total"] += queue_seconds
+        _stats["queue_seconds_max"] = max(_stats["queue_seconds_max"], queue_seconds)
+        _stats["hash_seconds_total"] += hash_seconds
+
+
+async def _run(fn: Callable[..., T], *args) -> T:
+    """Run a hashing function on the executor, queueing at most HASH_MAX_QUEUE calls"""
+    global _waiting
+    if _waiting >= HASH_MAX_QUEUE:
+        with _stats_lock:
+            _stats["rejected"] += 1
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Too many login attempts in progress. Please try again shortly.",
+            headers={"Retry-After": "1"},
+        )
+
+    queued_at = time.perf_counter()
+    _waiting += 1
+    try:
+        await _running.acquire()
+    finally:
+        _waiting -= 1
+
+    started_at = time.perf_counter()
+    try:
+        return await asyncio.get_running_loop().run_in_executor(_executor, fn, *args)
+    finally:
+        _running.release()
+        _record(started_at - queued_at, time.perf_counter() - started_at)
+
+
+async def hash_password(password: str) -> str:
+    """Hash a password without blocking the event loop"""
+    return await _run(pwd_context.hash, password)
+
+
+async def verify_and_update_password(plain_password: str, hashed_password: str) -> tuple[bool, Optional[str]]:
+    """Verify a password; also returns a new hash when the stored one uses outdated parameters"""
+    return await _run(pwd_context.verify_and_update, plain_password, hashed_password)
+
+
+def _bulk_hash(password: str, queued_at: float) -> str:
+    started_at = time.perf_counter()
+    hashed = pwd_context.hash(password)
+    _record(started_at - queued_at, time.perf_counter() - started_at)
+    return hashed
+
+
+async def hash_passwords(passwords: list[str]) -> list[str]:
+    """Hash many passwords in parallel on every core (bulk onboarding)
+
+    Uses its own pool, bypassing HASH_MAX_QUEUE, so an intake isn't rejected as a login flood.
+    """
+    global _bulk_executor
+    if _bulk_executor is None:
+        _bulk_executor = ThreadPoolExecutor(max_workers=BULK_HASH_WORKERS, thread_name_prefix="argon2-bulk")
+    loop = asyncio.get_running_loop()
+    queued_at = time.perf_counter()
+    return await asyncio.gather(*(
+        loop.run_in_executor(_bulk_executor, _bulk_hash, password, queued_at) for password in passwords
+    ))
+
+
+def hash_stats() -> dict:
+    """Queue-time and hash-time metrics for the hashing pool"""
+    with _stats_lock:
+        stats = dict(_stats)
+    jobs = stats["jobs"] or 1
+    stats["queue_seconds_avg"] = stats["queue_seconds_total"] / jobs
+    stats["hash_seconds_avg"] = stats["hash_seconds_total"] / jobs
+    stats["waiting"] = _waiting
+    return stats
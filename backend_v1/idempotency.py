@@ -0,0 +1,127 @@
+import hashlib
+import json
+import os
+from datetime import datetime, timedelta
+from typing import Awaitable, Callable, Optional
+from fastapi import HTTPException, status
+from fastapi.responses import JSONResponse
+from sqlalchemy.exc import IntegrityError
+from sqlmodel import SQLModel, delete
+from sqlmodel.ext.asyncio.session import AsyncSession
+from models import IdempotencyKey
+
+# Idempotency configuration - override through environment variables
+IDEMPOTENCY_TTL_HOURS = float(os.getenv("IDEMPOTENCY_TTL_HOURS", "24"))
+IDEMPOTENCY_LOCK_SECONDS = float(os.getenv("IDEMPOTENCY_LOCK_SECONDS", "60"))
+
+Handler = Callable[[], Awaitable[dict]]
+
+
+def _fingerprint(payload: SQLModel) -> str:
+    """Hash of a request body, to detect a key reused for a different request"""
+    encoded = json.dumps(payload.model_dump(mode="json"), sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(encoded.encode()).hexdigest()
+
+
+def _expired(record: IdempotencyKey) -> bool:
+    """Completed keys live for IDEMPOTENCY_TTL_HOURS; in-progress ones left behind by a crash
+    stop blocking retries after IDEMPOTENCY_LOCK_SECONDS"""
+    if record.status_code is None:
+        lifetime = timedelta(seconds=IDEMPOTENCY_LOCK_SECONDS)
+    else:
+        lifetime = timedelta(hours=IDEMPOTENCY_TTL_HOURS)
+    return record.created_at < datetime.now() - lifetime
+
+
+async def _claim(session: AsyncSession, key: str, user_id: int, endpoint: str, request_hash: str) -> Optional[IdempotencyKey]:
+    """Insert the key as in progress; returns the existing row if the key is already taken"""
+    identity = {"key": key, "user_id": user_id, "endpoint": endpoint}
+    for _ in range(2):
+        session.add(IdempotencyKey(**identity, request_hash=request_hash))
+        try:
+            await session.commit()
+            return None
+        except IntegrityError:
+            await session.rollback()
+
+        existing = await session.get(IdempotencyKey, identity)
+        if existing is None:
+            # Released between our insert and the lookup; try again
+            continue
+        if not _expired(existing):
+            return existing
+        # Forget the stale key and claim it afresh
+        await session.delete(existing)
+        await session.commit()
+    raise HTTPException(
+        status_code=status.HTTP_409_CONFLICT,
+        detail="A request with this Idempotency-Key is still being processed",
+        headers={"Retry-After": "1"},
+    )
+
+
+async def _release(session: AsyncSession, key: str, user_id: int, endpoint: str):
+    """Drop an in-progress key so the client can retry after a failure"""
+    await session.exec(delete(IdempotencyKey).where(
+        IdempotencyKey.key == key,
+        IdempotencyKey.user_id == user_id,
+        IdempotencyKey.endpoint == endpoint,
+        IdempotencyKey.status_code.is_(None),
+    ))
+    await session.commit()
+
+
+async def run_idempotent(
+    session: AsyncSession,
+    key: Optional[str],
+    user_id: int,
+    endpoint: str,
+    payload: SQLModel,
+    handler: Handler,
+    status_code: int = status.HTTP_200_OK
+) -> dict | JSONResponse:
+    """Run a write endpoint at most once per Idempotency-Key
+
+    handler stages its changes on session without committing and returns the
+    response body; the changes and the stored response are committed together.
+    A repeated request with the same key gets the stored response back, a
+    concurrent one gets 409 and a different request reusing the key gets 422.
+    Without a key the handler simply runs and is committed.
+    """
+    if not key:
+        body = await handler()
+        await session.commit()
+        return body
+
+    request_hash = _fingerprint(payload)
+    existing = await _claim(session, key, user_id, endpoint, request_hash)
+    if existing is not None:
+        if existing.request_hash != request_hash:
+            raise HTTPException(
+                status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+                detail="Idempotency-Key was already used for a different request"
+            )
+        if existing.status_code is None:
+            raise HTTPException(
+                status_code=status.HTTP_409_CONFLICT,
+                detail="A request with this Idempotency-Key is still being processed",
+                headers={"Retry-After": "1"},
+            )
+        return JSONResponse(
+            status_code=existing.status_code,
+            content=existing.response,
+            headers={"Idempotent-Replayed": "true"}
+        )
+
+    try:
+        body = await handler()
+        stored = await session.get(IdempotencyKey, {"key": key, "user_id": user_id, "endpoint": endpoint})
+        stored.status_code = status_code
+        stored.response = body
+        session.add(stored)
+        await session.commit()
+    except Exception:
+        await session.rollback()
+        await _release(session, key, user_id, endpoint)
+        raise
+    return body
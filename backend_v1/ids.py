@@ -0,0 +1,92 @@
+"""
+Time-ordered unique ID generator (Snowflake layout).
+
+An ID is a 64-bit integer: 41 bits of milliseconds since ID_EPOCH, 10 bits of
+node ID and a 12-bit per-millisecond sequence, so each process can mint 4096
+IDs per millisecond without touching the database. IDs from one process are
+strictly increasing; IDs from different processes are unique as long as their
+node IDs differ. Node IDs are not coordinated between processes, so two of
+them can share one; the unique index on transaction IDs catches the resulting
+duplicate and the payment route mints a new ID.
+"""
+import hashlib
+import os
+import socket
+import threading
+import time
+from datetime import datetime, timezone
+from typing import Optional
+
+NODE_BITS = 10
+SEQUENCE_BITS = 12
+MAX_NODE = (1 << NODE_BITS) - 1
+MAX_SEQUENCE = (1 << SEQUENCE_BITS) - 1
+
+# 2024-01-01 UTC; 41 bits of milliseconds last until 2093
+ID_EPOCH_MS = int(datetime(2024, 1, 1, tzinfo=timezone.utc).timestamp() * 1000)
+
+# Pins the node of a process started with it. Every worker started from the same
+# environment (uvicorn --workers, forked children) would share it, so only set it
+# when each host or container runs a single worker; otherwise leave it unset.
+NODE_ID = os.getenv("NODE_ID")
+
+
+def _default_node() -> int:
+    """Node ID derived from host name and process ID
+
+    The process ID is added rather than hashed, so workers on one host only share
+    a node when their PIDs are a multiple of 1024 apart.
+    """
+    host = int.from_bytes(hashlib.blake2b(socket.gethostname().encode(), digest_size=4).digest(), "big")
+    return (host + os.getpid()) & MAX_NODE
+
+
+class IdGenerator:
+    """Thread-safe generator of monotonic 64-bit IDs"""
+
+    def __init__(self, node: Optional[int] = None):
+        self.node = _default_node() if node is None else node
+        if not 0 <= self.node <= MAX_NODE:
+            raise ValueError(f"node must be between 0 and {MAX_NODE}")
+        self._last_ms = -1
+        self._sequence = 0
+        self._lock = threading.Lock()
+
+    def next_id(self) -> int:
+        """Mint the next ID"""
+        with self._lock:
+            now = self._now_ms()
+            # Never go back in time, even if the wall clock does
+            if now <= self._last_ms:
+                now = self._last_ms
+                self._sequence = (self._sequence + 1) & MAX_SEQUENCE
+                if self._sequence == 0:
+                    # Sequence exhausted for this millisecond; borrow the next one
+                    now += 1
+                    while self._now_ms() < now:
+                        time.sleep(0.0001)
+            else:
+                self._sequence = 0
+            self._last_ms = now
+            return (now << (NODE_BITS + SEQUENCE_BITS)) | (self.node << SEQUENCE_BITS) | self._sequence
+
+    @staticmethod
+    def _now_ms() -> int:
+        return time.time_ns() // 1_000_000 - ID_EPOCH_MS
+
+
+id_generator = IdGenerator(int(NODE_ID) if NODE_ID else None)
+
+
+def _reseed_after_fork():
+    # A forked worker must not share its parent's node ID and sequence, even a pinned one
+    global id_generator
+    id_generator = IdGenerator()
+
+
+os.register_at_fork(after_in_child=_reseed_after_fork)
+
+
+def new_transaction_id() -> str:
+    """Sortable transaction ID: "TXN" followed by a zero-padded 20-digit ID"""
+    return f"TXN{id_generator.next_id():020d}"
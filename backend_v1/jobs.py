@@ -0,0 +1,245 @@
+import asyncio
+import logging
+import os
+import socket
+from concurrent.futures.process import BrokenProcessPool
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Awaitable, Callable, Optional
+from uuid import uuid4
+from fastapi import HTTPException, status
+from sqlmodel import delete, or_, select, update
+from sqlmodel.ext.asyncio.session import AsyncSession
+from db import async_engine
+from models import RenderJob
+from render import RENDER_WORKERS
+
+# Job queue configuration - override through environment variables
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", RENDER_WORKERS))
+JOB_RESULTS_DIR = Path(os.getenv("JOB_RESULTS_DIR", ".cache/jobs"))
+JOB_RETENTION_HOURS = float(os.getenv("JOB_RETENTION_HOURS", "24"))
+JOB_HEARTBEAT_SECONDS = float(os.getenv("JOB_HEARTBEAT_SECONDS", "10"))
+JOB_STALE_SECONDS = float(os.getenv("JOB_STALE_SECONDS", "60"))
+JOB_PURGE_SECONDS = float(os.getenv("JOB_PURGE_SECONDS", "3600"))
+JOB_MAX_ATTEMPTS = int(os.getenv("JOB_MAX_ATTEMPTS", "3"))
+JOB_RETRY_SECONDS = float(os.getenv("JOB_RETRY_SECONDS", "5"))
+
+# Render failures that may succeed on another try: a busy queue, a timeout or a restarted pool
+_TRANSIENT_STATUS = {status.HTTP_503_SERVICE_UNAVAILABLE, status.HTTP_504_GATEWAY_TIMEOUT}
+
+JobHandler = Callable[[RenderJob], Awaitable[bytes]]
+
+logger = logging.getLogger(__name__)
+
+# Identifies this process as the owner of the jobs it claims
+WORKER_ID = f"{socket.gethostname()}:{os.getpid()}:{uuid4().hex[:8]}"
+
+_handlers: dict[str, JobHandler] = {}
+_queue: Optional[asyncio.Queue] = None
+# IDs waiting in _queue, so periodic rescans don't queue a job twice
+_enqueued: set[str] = set()
+_workers: list[asyncio.Task] = []
+_maintenance: Optional[asyncio.Task] = None
+
+
+def register_handler(kind: str, handler: JobHandler):
+    """Register the coroutine that renders jobs of a given kind"""
+    _handlers[kind] = handler
+
+
+async def create_job(session: AsyncSession, kind: str, payload: dict, base_url: str, user_id: int) -> RenderJob:
+    """Persist a new job and hand it to the worker pool"""
+    job = RenderJob(kind=kind, payload=payload, base_url=base_url, user_id=user_id)
+    session.add(job)
+    await session.commit()
+    await session.refresh(job)
+    # Without running workers here the job stays queued for whichever process scans for it next
+    _enqueue(job.id)
+    return job
+
+
+def _enqueue(job_id: str):
+    if _queue is not None and job_id not in _enqueued:
+        _enqueued.add(job_id)
+        _queue.put_nowait(job_id)
+
+
+async def _set_status(job_id: str, status: str, **fields) -> bool:
+    """Update a job this process owns; False if another process has since taken it over"""
+    async with AsyncSession(async_engine) as session:
+        result = await session.exec(
+            update(RenderJob)
+            .where(RenderJob.id == job_id, RenderJob.owner == WORKER_ID)
+            .values(status=status, updated_at=datetime.now(), **fields)
+        )
+        await session.commit()
+        return result.rowcount == 1
+
+
+async def _claim(job_id: str) -> Optional[RenderJob]:
+    """Mark a queued job as running under this process; None if another process got it first"""
+    now = datetime.now()
+    async with AsyncSession(async_engine, expire_on_commit=False) as session:
+        # Conditional update: every process may have the job queued, only one wins it
+        result = await session.exec(
+            update(RenderJob)
+            .where(RenderJob.id == job_id, RenderJob.status == "queued")
+            .values(status="running", owner=WORKER_ID, heartbeat_at=now, updated_at=now)
+        )
+        await session.commit()
+        if result.rowcount != 1:
+            return None
+        return await session.get(RenderJob, job_id)
+
+
+async def _run_job(job_id: str):
+    """Render a single job and store its result on disk"""
+    job = await _claim(job_id)
+    if job is None:
+        return
+
+    try:
+        pdf_bytes = await _handlers[job.kind](job)
+        result_path = JOB_RESULTS_DIR / f"{job.id}.pdf"
+        await asyncio.to_thread(_write_result, result_path, pdf_bytes)
+        if not await _set_status(job_id, "completed", result_path=str(result_path), error=None):
+            # Presumed dead and requeued meanwhile; the new owner writes its own result
+            logger.warning("Render job %s was taken over before it finished", job_id)
+    except HTTPException as exc:
+        if exc.status_code in _TRANSIENT_STATUS:
+            await _retry_or_fail(job, str(exc.detail))
+        else:
+            await _set_status(job_id, "failed", error=str(exc.detail))
+    except BrokenProcessPool as exc:
+        await _retry_or_fail(job, f"{type(exc).__name__}: {exc}")
+    except Exception as exc:
+        await _set_status(job_id, "failed", error=f"{type(exc).__name__}: {exc}")
+
+
+async def _retry_or_fail(job: RenderJob, error: str):
+    """Requeue a job after a transient failure, or fail it once it has used up JOB_MAX_ATTEMPTS"""
+    attempts = job.attempts + 1
+    if attempts >= JOB_MAX_ATTEMPTS:
+        await _set_status(job.id, "failed", error=error, attempts=attempts)
+        return
+    logger.warning("Render job %s failed (attempt %d of %d), retrying: %s", job.id, attempts, JOB_MAX_ATTEMPTS, error)
+    if await _set_status(job.id, "queued", owner=None, error=error, attempts=attempts):
+        # Back off before picking it up again; other processes find it on their next rescan
+        asyncio.get_running_loop().call_later(JOB_RETRY_SECONDS * attempts, _enqueue, job.id)
+
+
+def _write_result(path: Path, pdf_bytes: bytes):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_bytes(pdf_bytes)
+
+
+async def _worker():
+    while True:
+        job_id = await _queue.get()
+        _enqueued.discard(job_id)
+        try:
+            await _run_job(job_id)
+        except Exception:
+            logger.exception("Render job %s crashed", job_id)
+        finally:
+            _queue.task_done()
+
+
+async def _heartbeat():
+    """Tell other processes that this one is still working on its running jobs"""
+    async with AsyncSession(async_engine) as session:
+        await session.exec(
+            update(RenderJob)
+            .where(RenderJob.owner == WORKER_ID, RenderJob.status == "running")
+            .values(heartbeat_at=datetime.now())
+        )
+        await session.commit()
+
+
+async def _requeue_stale() -> list[str]:
+    """Requeue jobs whose owner stopped heartbeating (crashed or killed) and queued jobs"""
+    cutoff = datetime.now() - timedelta(seconds=JOB_STALE_SECONDS)
+    stale = (RenderJob.status == "running") & or_(RenderJob.heartbeat_at.is_(None), RenderJob.heartbeat_at < cutoff)
+    async with AsyncSession(async_engine) as session:
+        await session.exec(update(RenderJob).where(stale).values(status="queued", owner=None, updated_at=datetime.now()))
+        await session.commit()
+        # Every process may queue the same job; _claim lets exactly one of them run it
+        queued = await session.exec(
+            select(RenderJob.id).where(RenderJob.status == "queued").order_by(RenderJob.created_at)
+        )
+        return list(queued.all())
+
+
+async def _purge_expired() -> int:
+    """Delete finished jobs (and their PDFs) older than JOB_RETENTION_HOURS"""
+    cutoff = datetime.now() - timedelta(hours=JOB_RETENTION_HOURS)
+    async with AsyncSession(async_engine) as session:
+        expired = (await session.exec(
+            select(RenderJob.id, RenderJob.result_path)
+            .where(RenderJob.status.in_(["completed", "failed"]))
+            .where(RenderJob.updated_at < cutoff)
+        )).all()
+        if not expired:
+            return 0
+        # Other processes purge too; a bulk delete doesn't mind rows that are already gone
+        await session.exec(delete(RenderJob).where(RenderJob.id.in_([job_id for job_id, _ in expired])))
+        await session.commit()
+    await asyncio.to_thread(_unlink_results, [path for _, path in expired if path])
+    return len(expired)
+
+
+def _unlink_results(paths: list[str]):
+    for path in paths:
+        Path(path).unlink(missing_ok=True)
+
+
+async def _run_maintenance():
+    """Heartbeat, pick up jobs abandoned by dead processes and purge expired ones"""
+    last_purge = 0.0
+    loop = asyncio.get_running_loop()
+    while True:
+        await asyncio.sleep(JOB_HEARTBEAT_SECONDS)
+        try:
+            await _heartbeat()
+            for job_id in await _requeue_stale():
+                _enqueue(job_id)
+            if loop.time() - last_purge >= JOB_PURGE_SECONDS:
+                last_purge = loop.time()
+                await _purge_expired()
+        except Exception:
+            logger.exception("Render job maintenance failed")
+
+
+async def start_workers():
+    """Start the job workers and pick up queued jobs and ones abandoned by a previous run"""
+    global _queue, _maintenance
+    if _queue is not None:
+        return
+    _queue = asyncio.Queue()
+    await _purge_expired()
+    for job_id in await _requeue_stale():
+        _enqueue(job_id)
+    for _ in range(JOB_WORKERS):
+        _workers.append(asyncio.create_task(_worker()))
+    _maintenance = asyncio.create_task(_run_maintenance())
+
+
+async def stop_workers():
+    """Stop the job workers and hand this process's running jobs back to the queue"""
+    global _queue, _maintenance
+    tasks = [*_workers, *([_maintenance] if _maintenance else [])]
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
+    _workers.clear()
+    _maintenance = None
+    _queue = None
+    _enqueued.clear()
+    # Interrupted jobs start over; another process (or the next startup) can claim them right away
+    async with AsyncSession(async_engine) as session:
+        await session.exec(
+            update(RenderJob)
+            .where(RenderJob.owner == WORKER_ID, RenderJob.status == "running")
+            .values(status="queued", owner=None, updated_at=datetime.now())
+        )
+        await session.commit()
@@ -1,7 +1,19 @@
-from fastapi import FastAPI
+from fastapi import FastAPI, HTTPException, status
+from fastapi.responses import PlainTextResponse
 from fastapi.middleware.cors import CORSMiddleware
 from db import init_db, seed_data
-from router import payments, documents, auth, users
+from router import payments, documents, auth, users, webhooks
+from render import start_engine, stop_engine
+from assets import init_assets, assets
+from jobs import start_workers, stop_workers
+from templating import preload_templates
+from webhooks import start_pipeline, stop_pipeline, webhook_stats
+from metrics import METRICS_ENABLED, MetricsMiddleware, register_gauges, render_metrics
+from auth import user_cache
+from verification import verification_cache
+from hashing import hash_stats
+from tokens import token_cache_stats
+from refresh_tokens import init_refresh_store, revocation_stats
 
 app = FastAPI()
 
@@ -14,17 +26,54 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Request latency and query-count metrics, exposed on /metrics
+if METRICS_ENABLED:
+    app.add_middleware(MetricsMiddleware)
+    register_gauges("user_cache", "Authenticated-user cache statistics", user_cache.stats)
+    register_gauges("verification_cache", "Reference verification cache statistics", verification_cache.stats)
+    register_gauges("token_cache", "Verified-token cache statistics", token_cache_stats)
+    register_gauges("revoked_refresh", "Refresh token families revoked in memory", revocation_stats)
+    register_gauges("password_hash", "Argon2 hashing pool statistics", hash_stats)
+    register_gauges("webhook", "Payment webhook pipeline counters", webhook_stats)
+
 # Include routers
 app.include_router(auth.router, prefix="/api/auth", tags=["auth"])
 app.include_router(users.router, prefix="/api/users", tags=["users"])
 app.include_router(payments.router, prefix="/api/payments", tags=["payments"])
 app.include_router(documents.router, prefix="/api/documents", tags=["documents"])
+app.include_router(webhooks.router, prefix="/api/webhooks", tags=["webhooks"])
 
 @app.on_event("startup")
 def on_startup():
     init_db()
     seed_data()
+    init_assets()
+    preload_templates()
+    start_engine()
+
+@app.on_event("startup")
+async def start_background_workers():
+    await init_refresh_store()
+    await start_workers()
+    await start_pipeline()
+
+@app.on_event("shutdown")
+async def stop_background_workers():
+    await stop_pipeline()
+    await stop_workers()
+
+@app.on_event("shutdown")
+def on_shutdown():
+    stop_engine()
+    assets.stop_watching()
 
 @app.get("/")
 async def read_root():
     return {"msg": "Hello, World!"}
+
+@app.get("/metrics", response_class=PlainTextResponse, include_in_schema=False)
+async def metrics():
+    """Prometheus scrape endpoint"""
+    if not METRICS_ENABLED:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Metrics are disabled")
+    return PlainTextResponse(render_metrics(), media_type="text/plain; version=0.0.4")
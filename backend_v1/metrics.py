@@ -0,0 +1,219 @@
+"""
+In-process metrics in the Prometheus text exposition format.
+
+Histograms and counters are plain Python objects guarded by a lock; /metrics
+renders them on demand. With METRICS_ENABLED=false every timer is a shared
+no-op context manager and the middleware and query hooks are not installed,
+so instrumented code costs one attribute lookup.
+"""
+import bisect
+import os
+import threading
+import time
+from contextlib import contextmanager, nullcontext
+from contextvars import ContextVar
+from typing import Callable, Iterator, Optional
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+# Metrics configuration - override through environment variables
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "true").lower() == "true"
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+SIZE_BUCKETS = (1024, 4096, 16384, 65536, 262144, 1048576, 4194304)
+COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+
+_registry: list["_Metric"] = []
+_gauges: list[tuple[str, str, Callable[[], dict]]] = []
+
+
+def _format_labels(names: tuple[str, ...], values: tuple[str, ...], extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, documentation: str, labels: tuple[str, ...] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labels = labels
+        self._lock = threading.Lock()
+        _registry.append(self)
+
+    def render(self) -> list[str]:
+        return [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+
+
+class Counter(_Metric):
+    """Monotonically increasing count, optionally per label set"""
+
+    kind = "counter"
+
+    def __init__(self, name: str, documentation: str, labels: tuple[str, ...] = ()):
+        super().__init__(name, documentation, labels)
+        self._values: dict[tuple[str, ...], float] = {}
+
+    def inc(self, *label_values: str, amount: float = 1):
+        with self._lock:
+            self._values[label_values] = self._values.get(label_values, 0) + amount
+
+    def render(self) -> list[str]:
+        with self._lock:
+            values = dict(self._values)
+        lines = super().render()
+        for label_values, value in sorted(values.items()):
+            lines.append(f"{self.name}{_format_labels(self.labels, label_values)} {value}")
+        return lines
+
+
+class Histogram(_Metric):
+    """Distribution of observed values in cumulative buckets, optionally per label set"""
+
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labels: tuple[str, ...] = (), buckets=LATENCY_BUCKETS):
+        super().__init__(name, documentation, labels)
+        self.buckets = tuple(buckets)
+        # label values -> [per-bucket counts..., +Inf count, sum]
+        self._series: dict[tuple[str, ...], list[float]] = {}
+
+    def observe(self, value: float, *label_values: str):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(label_values)
+            if series is None:
+                series = self._series[label_values] = [0] * (len(self.buckets) + 2)
+            series[index] += 1
+            series[-1] += value
+
+    @contextmanager
+    def _time(self, label_values: tuple[str, ...]) -> Iterator[None]:
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, *label_values)
+
+    def time(self, *label_values: str):
+        """Context manager observing the duration of its block"""
+        if not METRICS_ENABLED:
+            return _NOOP
+        return self._time(label_values)
+
+    def render(self) -> list[str]:
+        with self._lock:
+            series = {labels: list(values) for labels, values in self._series.items()}
+        lines = super().render()
+        for label_values, values in sorted(series.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets + ("+Inf",), values[:-1]):
+                cumulative += count
+                le = f'le="{bound}"'
+                lines.append(f"{self.name}_bucket{_format_labels(self.labels, label_values, le)} {cumulative}")
+            labels = _format_labels(self.labels, label_values)
+            lines.append(f"{self.name}_sum{labels} {values[-1]}")
+            lines.append(f"{self.name}_count{labels} {cumulative}")
+        return lines
+
+
+_NOOP = nullcontext()
+
+
+def register_gauges(prefix: str, documentation: str, collect: Callable[[], dict]):
+    """Expose numeric values of a stats() dict as gauges named <prefix>_<key>, read at scrape time"""
+    _gauges.append((prefix, documentation, collect))
+
+
+def render_metrics() -> str:
+    """Every metric in the Prometheus text format"""
+    lines = []
+    for metric in _registry:
+        lines.extend(metric.render())
+    for prefix, documentation, collect in _gauges:
+        for key, value in sorted(collect().items()):
+            if isinstance(value, (int, float)):
+                name = f"{prefix}_{key}"
+                lines += [f"# HELP {name} {documentation}", f"# TYPE {name} gauge", f"{name} {float(value)}"]
+    return "\n".join(lines) + "\n"
+
+
+REQUEST_SECONDS = Histogram(
+    "http_request_duration_seconds", "HTTP request latency by route", ("method", "route", "status")
+)
+REQUEST_QUERIES = Histogram(
+    "http_request_db_queries", "Database queries issued per HTTP request", ("route",), COUNT_BUCKETS
+)
+DOCUMENT_STAGE_SECONDS = Histogram(
+    "document_stage_duration_seconds", "Time spent in each document generation stage", ("template", "stage")
+)
+DOCUMENT_BYTES = Histogram(
+    "document_size_bytes", "Size of generated documents", ("template",), SIZE_BUCKETS
+)
+RENDER_SECONDS = Histogram(
+    "render_duration_seconds", "PDF render time: write_pdf inside the worker, queue+transfer around it", ("phase",)
+)
+PASSWORD_HASH_SECONDS = Histogram(
+    "password_hash_duration_seconds", "Argon2 hashing time by phase (queue wait or hash)", ("phase",)
+)
+
+
+def stage(template_name: str, name: str):
+    """Time a document generation stage"""
+    return DOCUMENT_STAGE_SECONDS.time(template_name, name)
+
+
+# Query counter of the request being handled, set by the middleware
+_request_queries: ContextVar[Optional[list[int]]] = ContextVar("request_queries", default=None)
+
+
+def _count_query(*_args):
+    counter = _request_queries.get()
+    if counter is not None:
+        counter[0] += 1
+
+
+def instrument_engine(engine: Engine):
+    """Count every statement run on an engine against the current request"""
+    if METRICS_ENABLED:
+        event.listen(engine, "before_cursor_execute", _count_query)
+
+
+class MetricsMiddleware:
+    """ASGI middleware recording latency and query count per route"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        status_code = 500
+
+        async def send_wrapper(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        counter = [0]
+        token = _request_queries.set(counter)
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            _request_queries.reset(token)
+            # Label by route template, not raw path, to keep cardinality bounded
+            route = scope.get("route")
+            route_path = getattr(route, "path", "unmatched")
+            REQUEST_SECONDS.observe(time.perf_counter() - started, scope["method"], route_path, str(status_code))
+            REQUEST_QUERIES.observe(counter[0], route_path)
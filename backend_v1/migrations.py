@@ -0,0 +1,313 @@
+"""
+Minimal schema migration runner.
+
+Each migration is a (revision, description, upgrade) entry in MIGRATIONS and
+runs exactly once, in order, inside its own transaction. Applied revisions are
+recorded in the schema_version table. To change the schema, append a new
+migration - never edit one that has already shipped. Migrations define their
+tables as Core Tables frozen at the time they shipped, never through the live
+models, so a fresh database ends up exactly like a migrated one.
+"""
+from datetime import datetime
+from typing import Callable
+from sqlalchemy import JSON, BigInteger, Boolean, Column, DateTime, Float, ForeignKey, Index, Integer, MetaData, String, Table, UniqueConstraint, func, insert, inspect, select, text
+from sqlalchemy.engine import Connection, Engine
+
+_version_metadata = MetaData()
+schema_version = Table(
+    "schema_version",
+    _version_metadata,
+    Column("revision", Integer, primary_key=True),
+    Column("description", String, nullable=False),
+    Column("applied_at", DateTime, nullable=False),
+)
+
+
+# Tables as they were when migrations were introduced, frozen so later model
+# changes don't alter what revisions 1 and 2 create
+_base_metadata = MetaData()
+_user = Table(
+    "user", _base_metadata,
+    Column("id", Integer, primary_key=True),
+    Column("name", String, nullable=False),
+    Column("email", String, nullable=False),
+    Column("password", String, nullable=False),
+    Column("created_at", DateTime, nullable=False),
+    Column("updated_at", DateTime, nullable=False),
+)
+_academic_record = Table(
+    "academicrecord", _base_metadata,
+    Column("id", Integer, primary_key=True),
+    Column("student_id", String, nullable=False),
+    Column("reg_no", String, nullable=False),
+    Column("session", String, nullable=False),
+    Column("department", String, nullable=False),
+    Column("father_name", String, nullable=False),
+    Column("mother_name", String, nullable=False),
+    Column("degree_years", Integer, nullable=False),
+    Column("degree_months", Integer, nullable=False),
+    Column("degree_type", String, nullable=False),
+    Column("graduation_year", Integer, nullable=False),
+    Column("cgpa", Float, nullable=False),
+    Column("courses", JSON),
+    Column("created_at", DateTime, nullable=False),
+    Column("updated_at", DateTime, nullable=False),
+    Column("user_id", Integer, ForeignKey("user.id"), nullable=False, unique=True),
+)
+_document = Table(
+    "document", _base_metadata,
+    Column("id", Integer, primary_key=True),
+    Column("title", String, nullable=False),
+    Column("qr_code", String, nullable=False),
+    Column("created_at", DateTime, nullable=False),
+    Column("updated_at", DateTime, nullable=False),
+    Column("user_id", Integer, ForeignKey("user.id"), nullable=False),
+)
+_transaction = Table(
+    "transaction", _base_metadata,
+    Column("id", Integer, primary_key=True),
+    Column("transaction_id", String, nullable=False),
+    Column("status", String, nullable=False),
+    Column("amount", Float, nullable=False),
+    Column("created_at", DateTime, nullable=False),
+    Column("updated_at", DateTime, nullable=False),
+    Column("document_id", Integer, ForeignKey("document.id"), nullable=False),
+    Column("user_id", Integer, ForeignKey("user.id"), nullable=False),
+)
+_render_job = Table(
+    "renderjob", _base_metadata,
+    Column("id", String, primary_key=True),
+    Column("kind", String, nullable=False),
+    Column("status", String, nullable=False),
+    Column("payload", JSON),
+    Column("base_url", String, nullable=False),
+    Column("result_path", String),
+    Column("error", String),
+    Column("created_at", DateTime, nullable=False),
+    Column("updated_at", DateTime, nullable=False),
+    Column("user_id", Integer, ForeignKey("user.id"), nullable=False),
+)
+
+
+def _lookup_indexes() -> list[Index]:
+    """Revision 2's indexes, named the way the models declare them
+
+    Built on copies of the frozen tables so that revision 1 never creates them.
+    """
+    metadata = MetaData()
+    user, document, transaction, render_job = (
+        table.to_metadata(metadata) for table in [_user, _document, _transaction, _render_job]
+    )
+    return [
+        Index("ix_user_email", user.c.email, unique=True),
+        Index("ix_transaction_transaction_id", transaction.c.transaction_id, unique=True),
+        Index("ix_transaction_user_id", transaction.c.user_id),
+        Index("ix_document_user_id", document.c.user_id),
+        Index("ix_renderjob_user_id", render_job.c.user_id),
+    ]
+
+
+# Duplicates listed in the error when a unique index can't be created
+DUPLICATES_SHOWN = 20
+
+
+def _create_base_tables(conn: Connection):
+    """Tables that existed before migrations were introduced"""
+    _base_metadata.create_all(conn)
+
+
+def _duplicates(conn: Connection, index: Index) -> str:
+    """Describe the values that would stop a unique index from being built, empty if none"""
+    column = index.expressions[0]
+    duplicates = conn.execute(
+        select(column, func.count()).group_by(column).having(func.count() > 1)
+        .order_by(func.count().desc()).limit(DUPLICATES_SHOWN + 1)
+    ).all()
+    if not duplicates:
+        return ""
+    listed = ", ".join(f"{value!r} x{count}" for value, count in duplicates[:DUPLICATES_SHOWN])
+    more = " and more" if len(duplicates) > DUPLICATES_SHOWN else ""
+    return f"Cannot create unique index {index.name}: duplicate {column.table.name}.{column.name} values {listed}{more}"
+
+
+def _add_lookup_indexes(conn: Connection):
+    """Indexes on the columns every authenticated/payment/document request filters by"""
+    # Report every unique column's conflicts up front rather than failing on the first index
+    indexes = _lookup_indexes()
+    problems = [problem for index in indexes if index.unique and (problem := _duplicates(conn, index))]
+    if problems:
+        raise RuntimeError("\n".join(problems) + "\nMerge or rename those rows, then restart to apply the migration.")
+    for index in indexes:
+        index.create(conn, checkfirst=True)
+
+
+# Tables added by later revisions, frozen as they shipped; each revision creates only its own
+_revision_metadata = MetaData()
+_idempotency_key = Table(
+    "idempotencykey", _revision_metadata,
+    Column("key", String, primary_key=True),
+    Column("user_id", Integer, primary_key=True),
+    Column("endpoint", String, primary_key=True),
+    Column("request_hash", String, nullable=False),
+    Column("status_code", Integer),
+    Column("response", JSON),
+    Column("created_at", DateTime, nullable=False, index=True),
+)
+
+
+def _create_idempotency_keys(conn: Connection):
+    """Stored responses of requests sent with an Idempotency-Key header"""
+    _idempotency_key.create(conn, checkfirst=True)
+
+
+_refresh_token = Table(
+    "refreshtoken", _revision_metadata,
+    Column("id", String, primary_key=True),
+    Column("family", String, nullable=False, index=True),
+    Column("used_at", DateTime),
+    Column("revoked", Boolean, nullable=False),
+    Column("expires_at", DateTime, nullable=False, index=True),
+    Column("created_at", DateTime, nullable=False),
+    Column("user_id", Integer, nullable=False, index=True),
+)
+
+
+def _create_refresh_tokens(conn: Connection):
+    """Server-side refresh token store for rotation and revocation"""
+    _refresh_token.create(conn, checkfirst=True)
+
+
+_course = Table(
+    "course", _revision_metadata,
+    Column("id", Integer, primary_key=True),
+    Column("code", String, nullable=False, index=True, unique=True),
+    Column("title", String, nullable=False),
+    Column("credit", Float, nullable=False),
+    Column("type", String, nullable=False),
+    Column("department", String, nullable=False),
+)
+_enrollment = Table(
+    "enrollment", _revision_metadata,
+    Column("id", Integer, primary_key=True),
+    Column("position", Integer, nullable=False),
+    Column("academic_record_id", Integer, ForeignKey(_academic_record.c.id), nullable=False, index=True),
+    Column("course_id", Integer, ForeignKey("course.id"), nullable=False, index=True),
+    UniqueConstraint("academic_record_id", "course_id"),
+)
+
+
+def _create_course_catalog(conn: Connection):
+    """Course catalog and per-student enrollments, backfilled from AcademicRecord.courses"""
+    _course.create(conn, checkfirst=True)
+    _enrollment.create(conn, checkfirst=True)
+
+    # academicrecord is still as revision 1 created it
+    records = _academic_record
+    course_ids: dict[str, int] = {}
+    enrollments = []
+    for record_id, department, courses in conn.execute(select(records.c.id, records.c.department, records.c.courses)):
+        # Only entries shaped like the certificate table (code/title/credit/type) can be catalogued
+        codes = {}
+        for course in courses or []:
+            if isinstance(course, dict) and course.get("code"):
+                codes.setdefault(str(course["code"]), course)
+        for position, (code, course) in enumerate(codes.items()):
+            if code not in course_ids:
+                try:
+                    credit = float(course.get("credit") or 0)
+                except (TypeError, ValueError):
+                    credit = 0.0
+                course_ids[code] = conn.execute(insert(_course).values(
+                    code=code,
+                    title=str(course.get("title", "")),
+                    credit=credit,
+                    type=str(course.get("type") or "Theory"),
+                    department=department,
+                )).inserted_primary_key[0]
+            enrollments.append({"academic_record_id": record_id, "course_id": course_ids[code], "position": position})
+    if enrollments:
+        conn.execute(insert(_enrollment), enrollments)
+
+
+_webhook_dead_letter = Table(
+    "webhookdeadletter", _revision_metadata,
+    Column("event_id", String, primary_key=True),
+    Column("transaction_id", String, nullable=False),
+    Column("status", String, nullable=False),
+    Column("error", String, nullable=False),
+    Column("attempts", Integer, nullable=False),
+    Column("created_at", DateTime, nullable=False),
+    Column("last_attempt_at", DateTime, nullable=False, index=True),
+)
+
+
+def _create_webhook_dead_letters(conn: Connection):
+    """Webhook events that failed to apply, kept for retry"""
+    _webhook_dead_letter.create(conn, checkfirst=True)
+
+
+def _add_render_job_lease(conn: Connection):
+    """Owner and heartbeat columns so several app processes can share the render job table"""
+    existing = {column["name"] for column in inspect(conn).get_columns("renderjob")}
+    for name, column_type in [("owner", String()), ("heartbeat_at", DateTime())]:
+        if name not in existing:
+            conn.execute(text(f"ALTER TABLE renderjob ADD COLUMN {name} {column_type.compile(dialect=conn.dialect)}"))
+
+
+_token_revocation = Table(
+    "tokenrevocation", _revision_metadata,
+    Column("subject", String, primary_key=True),
+    Column("revoked_at_ms", BigInteger, nullable=False),
+    Column("expires_at", DateTime, nullable=False, index=True),
+)
+
+
+def _create_token_revocations(conn: Connection):
+    """Per-subject "log out everywhere" times, shared by every app process"""
+    _token_revocation.create(conn, checkfirst=True)
+
+
+def _add_render_job_attempts(conn: Connection):
+    """Count of transient render failures, bounding how often a job is retried"""
+    existing = {column["name"] for column in inspect(conn).get_columns("renderjob")}
+    if "attempts" not in existing:
+        conn.execute(text("ALTER TABLE renderjob ADD COLUMN attempts INTEGER NOT NULL DEFAULT 0"))
+
+
+Migration = tuple[int, str, Callable[[Connection], None]]
+
+MIGRATIONS: list[Migration] = [
+    (1, "create base tables", _create_base_tables),
+    (2, "add lookup indexes on user.email, transaction.transaction_id and user_id columns", _add_lookup_indexes),
+    (3, "create idempotencykey table", _create_idempotency_keys),
+    (4, "create refreshtoken table", _create_refresh_tokens),
+    (5, "create course and enrollment tables", _create_course_catalog),
+    (6, "create webhookdeadletter table", _create_webhook_dead_letters),
+    (7, "add owner and heartbeat_at to renderjob", _add_render_job_lease),
+    (8, "create tokenrevocation table", _create_token_revocations),
+    (9, "add attempts to renderjob", _add_render_job_attempts),
+]
+
+
+def current_revision(engine: Engine) -> int:
+    """Highest applied revision, 0 for a fresh database"""
+    _version_metadata.create_all(engine)
+    with engine.connect() as conn:
+        applied = conn.execute(select(schema_version.c.revision)).scalars().all()
+    return max(applied, default=0)
+
+
+def run_migrations(engine: Engine):
+    """Apply every pending migration in order"""
+    revision = current_revision(engine)
+    for migration_revision, description, upgrade in MIGRATIONS:
+        if migration_revision <= revision:
+            continue
+        print(f"Applying migration {migration_revision}: {description}")
+        with engine.begin() as conn:
+            upgrade(conn)
+            conn.execute(schema_version.insert().values(
+                revision=migration_revision,
+                description=description,
+                applied_at=datetime.now(),
+            ))
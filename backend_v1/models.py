@@ -1,11 +1,13 @@
-from sqlmodel import SQLModel, Field, Relationship, JSON, Column
+from sqlalchemy import BigInteger
+from sqlmodel import SQLModel, Field, Relationship, JSON, Column, UniqueConstraint
 from datetime import datetime
 from typing import Optional
+from uuid import uuid4
 
 class User(SQLModel, table=True):
     id: int = Field(default=None, primary_key=True)
     name: str
-    email: str
+    email: str = Field(index=True, unique=True)
     password: str
     created_at: datetime = Field(default_factory=datetime.now)
     updated_at: datetime = Field(default_factory=datetime.now)
@@ -27,6 +29,7 @@ class AcademicRecord(SQLModel, table=True):
     degree_type: str = "Bachelor(Engg.)"
     graduation_year: int = 2025
     cgpa: float
+    # Legacy free-form course list; the Course/Enrollment tables take precedence when populated
     courses: list = Field(default=[], sa_column=Column(JSON))
     created_at: datetime = Field(default_factory=datetime.now)
     updated_at: datetime = Field(default_factory=datetime.now)
@@ -34,6 +37,24 @@ class AcademicRecord(SQLModel, table=True):
     user_id: int = Field(foreign_key="user.id", unique=True)
     user: User = Relationship(back_populates="academic_record")
 
+class Course(SQLModel, table=True):
+    id: int = Field(default=None, primary_key=True)
+    code: str = Field(index=True, unique=True)
+    title: str
+    credit: float
+    type: str = "Theory"
+    department: str = "Computer Science and Engineering"
+
+class Enrollment(SQLModel, table=True):
+    __table_args__ = (UniqueConstraint("academic_record_id", "course_id"),)
+
+    id: int = Field(default=None, primary_key=True)
+    # Row order of the course on the certificate
+    position: int = 0
+
+    academic_record_id: int = Field(foreign_key="academicrecord.id", index=True)
+    course_id: int = Field(foreign_key="course.id", index=True)
+
 class Document(SQLModel, table=True):
     id: int = Field(default=None, primary_key=True)
     title: str
@@ -41,14 +62,14 @@ class Document(SQLModel, table=True):
     created_at: datetime = Field(default_factory=datetime.now)
     updated_at: datetime = Field(default_factory=datetime.now)
 
-    user_id: int = Field(foreign_key="user.id")
+    user_id: int = Field(foreign_key="user.id", index=True)
     user: User = Relationship(back_populates="documents")
 
     transaction: "Transaction" = Relationship(back_populates="document")
 
 class Transaction(SQLModel, table=True):
     id: int = Field(default=None, primary_key=True)
-    transaction_id: str
+    transaction_id: str = Field(index=True, unique=True)
     status: str
     amount: float
     created_at: datetime = Field(default_factory=datetime.now)
@@ -57,5 +78,60 @@ class Transaction(SQLModel, table=True):
     document_id: int = Field(foreign_key="document.id")
     document: Document = Relationship(back_populates="transaction")
 
-    user_id: int = Field(foreign_key="user.id")
+    user_id: int = Field(foreign_key="user.id", index=True)
     user: User = Relationship(back_populates="transactions")
+
+class RenderJob(SQLModel, table=True):
+    id: str = Field(default_factory=lambda: uuid4().hex, primary_key=True)
+    kind: str
+    status: str = "queued"
+    payload: dict = Field(default={}, sa_column=Column(JSON))
+    base_url: str = ""
+    result_path: Optional[str] = None
+    error: Optional[str] = None
+    # Process running the job and when it last reported in; stale running jobs are requeued
+    owner: Optional[str] = None
+    heartbeat_at: Optional[datetime] = None
+    # Transient render failures so far; the job fails for good after JOB_MAX_ATTEMPTS
+    attempts: int = Field(default=0, sa_column_kwargs={"server_default": "0"})
+    created_at: datetime = Field(default_factory=datetime.now)
+    updated_at: datetime = Field(default_factory=datetime.now)
+
+    user_id: int = Field(foreign_key="user.id", index=True)
+
+class IdempotencyKey(SQLModel, table=True):
+    key: str = Field(primary_key=True)
+    user_id: int = Field(primary_key=True)
+    endpoint: str = Field(primary_key=True)
+    request_hash: str
+    status_code: Optional[int] = None
+    response: Optional[dict] = Field(default=None, sa_column=Column(JSON))
+    created_at: datetime = Field(default_factory=datetime.now, index=True)
+
+class RefreshToken(SQLModel, table=True):
+    # SHA-256 of the token's jti; the raw ID only ever lives inside the signed token
+    id: str = Field(primary_key=True)
+    family: str = Field(index=True)
+    used_at: Optional[datetime] = None
+    revoked: bool = False
+    expires_at: datetime = Field(index=True)
+    created_at: datetime = Field(default_factory=datetime.now)
+
+    user_id: int = Field(index=True)
+
+class TokenRevocation(SQLModel, table=True):
+    # "Log out everywhere" per token subject (email): tokens issued up to revoked_at_ms are rejected
+    subject: str = Field(primary_key=True)
+    revoked_at_ms: int = Field(sa_column=Column(BigInteger, nullable=False))
+    # When the last access token issued before the revocation expires; the row can go after that
+    expires_at: datetime = Field(index=True)
+
+class WebhookDeadLetter(SQLModel, table=True):
+    # Gateway events whose batch couldn't be written; retried until applied
+    event_id: str = Field(primary_key=True)
+    transaction_id: str
+    status: str
+    error: str = ""
+    attempts: int = 0
+    created_at: datetime = Field(default_factory=datetime.now)
+    last_attempt_at: datetime = Field(default_factory=datetime.now, index=True)
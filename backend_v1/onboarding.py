@@ -0,0 +1,184 @@
+"""
+Bulk student onboarding: creates many users, with optional academic records
+and courses, in one call.
+
+Each student is {name, email, password, academic_record?}, where
+academic_record takes the same fields as a catalog import record
+(student_id, reg_no, session, cgpa, ..., courses). Email conflicts with
+existing users and within the intake are found with a single IN query,
+passwords are hashed in parallel on every core, and rows are inserted in
+chunked transactions. Invalid or conflicting rows are reported per row and
+skipped; the rest are created.
+
+Run from backend_v1:  uv run python -m onboarding students.csv [--department "..."]
+"""
+import argparse
+import asyncio
+import os
+from dataclasses import dataclass, field
+from datetime import datetime
+from pathlib import Path
+from typing import Optional
+from sqlalchemy import insert, select
+from sqlalchemy.engine import Connection
+from sqlalchemy.exc import IntegrityError, SQLAlchemyError
+from catalog import RECORD_FIELDS, ImportReport, parse_record, read_csv, read_json, write_records
+from db import async_engine, init_db
+from hashing import hash_passwords
+from models import User
+
+# Bulk onboarding configuration - override through environment variables
+ONBOARD_MAX_ROWS = int(os.getenv("ONBOARD_MAX_ROWS", "10000"))
+ONBOARD_CHUNK_SIZE = int(os.getenv("ONBOARD_CHUNK_SIZE", "500"))
+
+
+@dataclass
+class OnboardReport:
+    created: int = 0
+    records: int = 0
+    enrollments: int = 0
+    # {"row": index in the input, "email": ..., "error": ...}
+    errors: list[dict] = field(default_factory=list)
+
+    def fail(self, row: int, email: str, error: str):
+        self.errors.append({"row": row, "email": email, "error": error})
+
+
+def _validate(students: list[dict], department: Optional[str], report: OnboardReport) -> list[tuple[int, dict]]:
+    """Parse every row, reporting bad fields and duplicates within the intake"""
+    valid: list[tuple[int, dict]] = []
+    seen: set[str] = set()
+    for row, student in enumerate(students):
+        email = str(student.get("email") or "").strip()
+        name = str(student.get("name") or "").strip()
+        password = student.get("password") or ""
+        if not email or not name or not password:
+            report.fail(row, email, "name, email and password are required")
+            continue
+        if email in seen:
+            report.fail(row, email, "Duplicate email in this request")
+            continue
+        seen.add(email)
+
+        record = None
+        if student.get("academic_record"):
+            try:
+                record = parse_record({**student["academic_record"], "email": email}, department)
+            except ValueError as exc:
+                report.fail(row, email, f"Invalid academic record: {exc}")
+                continue
+        valid.append((row, {"name": name, "email": email, "password": password, "record": record}))
+    return valid
+
+
+async def _existing_emails(emails: list[str]) -> set[str]:
+    async with async_engine.connect() as conn:
+        result = await conn.execute(select(User.__table__.c.email).where(User.__table__.c.email.in_(emails)))
+        return set(result.scalars())
+
+
+def _write_chunk(conn: Connection, chunk: list[tuple[int, dict]], records: ImportReport):
+    """Insert one chunk of users and their academic records"""
+    now = datetime.now()
+    conn.execute(insert(User.__table__), [
+        {"name": student["name"], "email": student["email"], "password": student["hash"], "created_at": now, "updated_at": now}
+        for _, student in chunk
+    ])
+    parsed = {student["email"]: student["record"] for _, student in chunk if student["record"]}
+    if parsed:
+        write_records(conn, parsed, records)
+
+
+async def onboard_students(students: list[dict], department: Optional[str] = None) -> OnboardReport:
+    """Create users (and academic records) in bulk, reporting per-row errors"""
+    report = OnboardReport()
+    valid = _validate(students, department, report)
+    if not valid:
+        return report
+
+    # One IN query for every email in the intake
+    taken = await _existing_emails([student["email"] for _, student in valid])
+    for row, student in valid:
+        if student["email"] in taken:
+            report.fail(row, student["email"], "Email already registered")
+    valid = [(row, student) for row, student in valid if student["email"] not in taken]
+
+    hashes = await hash_passwords([student.pop("password") for _, student in valid])
+    for (_, student), hashed in zip(valid, hashes):
+        student["hash"] = hashed
+
+    for start in range(0, len(valid), ONBOARD_CHUNK_SIZE):
+        chunk = valid[start:start + ONBOARD_CHUNK_SIZE]
+        try:
+            await _insert_chunk(chunk, report)
+        except IntegrityError:
+            # Someone registered one of these emails meanwhile; drop those rows and retry the chunk once
+            taken = await _existing_emails([student["email"] for _, student in chunk])
+            for row, student in chunk:
+                if student["email"] in taken:
+                    report.fail(row, student["email"], "Email already registered")
+            chunk = [(row, student) for row, student in chunk if student["email"] not in taken]
+            if chunk:
+                try:
+                    await _insert_chunk(chunk, report)
+                except SQLAlchemyError as exc:
+                    _fail_chunk(chunk, report, exc)
+        except SQLAlchemyError as exc:
+            _fail_chunk(chunk, report, exc)
+
+    report.errors.sort(key=lambda error: error["row"])
+    return report
+
+
+async def _insert_chunk(chunk: list[tuple[int, dict]], report: OnboardReport):
+    """Write one chunk in its own transaction, counting it only once committed"""
+    records = ImportReport()
+    async with async_engine.begin() as conn:
+        await conn.run_sync(_write_chunk, chunk, records)
+    report.created += len(chunk)
+    report.records += records.records
+    report.enrollments += records.enrollments
+
+
+def _fail_chunk(chunk: list[tuple[int, dict]], report: OnboardReport, exc: Exception):
+    """Report every row of a chunk whose transaction was rolled back"""
+    reason = "Email already registered or changed during the import" if isinstance(exc, IntegrityError) else "Database error"
+    for row, student in chunk:
+        report.fail(row, student["email"], f"Not created ({reason}); retry this row")
+
+
+def _from_flat(row: dict) -> dict:
+    """CLI rows carry record fields inline; nest them the way the API does"""
+    record = {name: row[name] for name in [*RECORD_FIELDS, "courses"] if row.get(name)}
+    return {
+        "name": row.get("name"),
+        "email": row.get("email"),
+        "password": row.get("password"),
+        "academic_record": record if record.keys() - {"courses", "department"} else None,
+    }
+
+
+async def _onboard_and_close(students: list[dict], department: Optional[str]) -> OnboardReport:
+    try:
+        return await onboard_students(students, department)
+    finally:
+        await async_engine.dispose()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Bulk register students from a CSV or JSON file")
+    parser.add_argument("path", type=Path, help="CSV (one row per enrollment) or JSON list of students")
+    parser.add_argument("--department", help="department for records that don't name one")
+    args = parser.parse_args()
+
+    init_db()
+    rows = read_json(args.path) if args.path.suffix.lower() == ".json" else read_csv(args.path)
+    students = [row if "academic_record" in row else _from_flat(row) for row in rows]
+    report = asyncio.run(_onboard_and_close(students, args.department))
+    print(f"Registered {report.created} students ({report.records} academic records, {report.enrollments} enrollments)")
+    for error in report.errors:
+        print(f"  row {error['row']} {error['email']}: {error['error']}")
+
+
+if __name__ == "__main__":
+    main()
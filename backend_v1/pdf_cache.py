@@ -0,0 +1,200 @@
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime
+from pathlib import Path
+from typing import Optional
+from sqlmodel import SQLModel
+from assets import assets
+from qr import QR_FORMAT, VERIFY_BASE_URL
+from templating import TEMPLATES_DIR
+
+# PDF cache configuration - override through environment variables
+PDF_CACHE_MEMORY_BYTES = int(os.getenv("PDF_CACHE_MEMORY_BYTES", 64 * 1024 * 1024))
+PDF_CACHE_DIR = Path(os.getenv("PDF_CACHE_DIR", ".cache/pdf"))
+PDF_CACHE_MAX_BYTES = int(os.getenv("PDF_CACHE_MAX_BYTES", 1024 * 1024 * 1024))
+
+# Files touched this recently are never evicted; they may be mid-download
+EVICT_GRACE_SECONDS = 60
+
+
+class PDFCache:
+    """Two-tier (memory LRU + disk) cache of rendered PDFs keyed by content hash
+
+    The disk tier is an LRU by file mtime: hits touch the file, and writes that
+    push the directory past max_disk_bytes delete the least recently used PDFs.
+    """
+
+    def __init__(self, max_bytes: int, directory: Path, max_disk_bytes: int = PDF_CACHE_MAX_BYTES):
+        self.max_bytes = max_bytes
+        self.directory = directory
+        self.max_disk_bytes = max_disk_bytes
+        # Bytes on disk as of the last scan plus this process's writes since; None until scanned
+        self._disk_bytes: Optional[int] = None
+        self._entries: OrderedDict[str, bytes] = OrderedDict()
+        self._size = 0
+        self._template_mtimes: dict[str, float] = {}
+        self._lock = threading.Lock()
+
+    def make_key(self, template_name: str, payload: SQLModel) -> str:
+        """Build the cache key from everything that ends up in the PDF"""
+        template_mtime = self._check_template(template_name)
+        key_data = {
+            "template": template_name,
+            "template_mtime": template_mtime,
+            "payload": payload.model_dump(mode="json"),
+            "assets": assets.version,
+            "qr_format": QR_FORMAT,
+            # The QR code points at this verification page
+            "verify_base_url": VERIFY_BASE_URL,
+            # The issue date is printed on every document
+            "date": datetime.now().strftime("%d/%m/%Y"),
+        }
+        encoded = json.dumps(key_data, sort_keys=True, separators=(",", ":")).encode()
+        digest = hashlib.sha256(encoded).hexdigest()
+        return f"{Path(template_name).stem}-{digest}"
+
+    def get(self, key: str) -> Optional[bytes]:
+        """Return a cached PDF from memory, falling back to disk"""
+        with self._lock:
+            pdf_bytes = self._entries.get(key)
+            if pdf_bytes is not None:
+                self._entries.move_to_end(key)
+                return pdf_bytes
+
+        path = self._path(key)
+        try:
+            pdf_bytes = path.read_bytes()
+        except FileNotFoundError:
+            return None
+        self._touch(path)
+        self._remember(key, pdf_bytes)
+        return pdf_bytes
+
+    def put(self, key: str, pdf_bytes: bytes):
+        """Store a rendered PDF in both tiers"""
+        self._remember(key, pdf_bytes)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        # Write to a temp file first so readers never see a partial PDF
+        tmp_path = self._path(key).with_suffix(f".{os.getpid()}.tmp")
+        tmp_path.write_bytes(pdf_bytes)
+        os.replace(tmp_path, self._path(key))
+        self.added(len(pdf_bytes))
+
+    def path(self, key: str) -> Optional[Path]:
+        """Disk path of a cached PDF, or None when it isn't on disk"""
+        path = self._path(key)
+        return path if self._touch(path) else None
+
+    def target(self, key: str) -> Path:
+        """Disk path a PDF rendered for this key should be written to"""
+        self.directory.mkdir(parents=True, exist_ok=True)
+        return self._path(key)
+
+    def added(self, size: int):
+        """Account for a PDF written to disk, evicting old ones past the size limit"""
+        with self._lock:
+            if self._disk_bytes is not None:
+                self._disk_bytes += size
+            over = self._disk_bytes is None or self._disk_bytes > self.max_disk_bytes
+        if over:
+            self.evict()
+
+    def evict(self):
+        """Delete least recently used PDFs until the disk tier is within its limit"""
+        files = []
+        for path in self.directory.glob("*.pdf"):
+            try:
+                stat = path.stat()
+            except FileNotFoundError:
+                continue
+            files.append((stat.st_mtime, stat.st_size, path))
+        total = sum(size for _, size, _ in files)
+        # Evict down to 90% so a full cache doesn't rescan on every write
+        target = self.max_disk_bytes * 0.9 if total > self.max_disk_bytes else total
+        cutoff = time.time() - EVICT_GRACE_SECONDS
+        for mtime, size, path in sorted(files):
+            if total <= target or mtime > cutoff:
+                break
+            path.unlink(missing_ok=True)
+            total -= size
+        with self._lock:
+            self._disk_bytes = total
+
+    def invalidate(self, template_name: str):
+        """Drop every cached PDF rendered from a template"""
+        prefix = f"{Path(template_name).stem}-"
+        with self._lock:
+            for key in [k for k in self._entries if k.startswith(prefix)]:
+                self._size -= len(self._entries.pop(key))
+        if self.directory.exists():
+            for path in self.directory.glob(f"{prefix}*.pdf"):
+                path.unlink(missing_ok=True)
+
+    def clear(self):
+        """Drop every cached PDF"""
+        with self._lock:
+            self._entries.clear()
+            self._size = 0
+        if self.directory.exists():
+            for path in self.directory.glob("*.pdf"):
+                path.unlink(missing_ok=True)
+
+    def _check_template(self, template_name: str) -> float:
+        """Return the template mtime, invalidating old entries when it changed"""
+        # A template's stylesheet (certificate.html -> certificate.css) counts as part of it
+        stylesheet = TEMPLATES_DIR / f"{Path(template_name).stem}.css"
+        mtime = max(
+            (TEMPLATES_DIR / template_name).stat().st_mtime,
+            stylesheet.stat().st_mtime if stylesheet.exists() else 0
+        )
+        previous = self._template_mtimes.get(template_name)
+        if previous is not None and previous != mtime:
+            self.invalidate(template_name)
+        self._template_mtimes[template_name] = mtime
+        return mtime
+
+    def _remember(self, key: str, pdf_bytes: bytes):
+        """Insert into the memory tier and evict least recently used entries"""
+        if len(pdf_bytes) > self.max_bytes:
+            return
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                return
+            self._entries[key] = pdf_bytes
+            self._size += len(pdf_bytes)
+            while self._size > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self._size -= len(evicted)
+
+    @staticmethod
+    def _touch(path: Path) -> bool:
+        """Mark a disk entry as recently used; False if it doesn't exist"""
+        try:
+            os.utime(path)
+        except FileNotFoundError:
+            return False
+        return True
+
+    def _path(self, key: str) -> Path:
+        return self.directory / f"{key}.pdf"
+
+
+pdf_cache = PDFCache(PDF_CACHE_MEMORY_BYTES, PDF_CACHE_DIR)
+
+
+def etag_for(key: str) -> str:
+    """Strong ETag for a cached PDF"""
+    return f'"{key.rsplit("-", 1)[-1]}"'
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """Check an If-None-Match header against an ETag"""
+    if not if_none_match:
+        return False
+    candidates = [value.strip() for value in if_none_match.split(",")]
+    return "*" in candidates or etag in candidates or f"W/{etag}" in candidates
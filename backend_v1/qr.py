@@ -0,0 +1,72 @@
+import base64
+import os
+from functools import lru_cache
+from io import BytesIO
+import qrcode
+
+# QR configuration - override through environment variables
+VERIFY_BASE_URL = os.getenv("VERIFY_BASE_URL", "http://localhost:5173/verify")
+QR_FORMAT = os.getenv("QR_FORMAT", "svg")
+QR_CACHE_SIZE = int(os.getenv("QR_CACHE_SIZE", "4096"))
+
+
+def verification_url(transaction_id: str) -> str:
+    """Public URL that the QR code on a document points to"""
+    return f"{VERIFY_BASE_URL}?ref={transaction_id}"
+
+
+def _build(data: str) -> qrcode.QRCode:
+    qr = qrcode.QRCode(version=None, box_size=10, border=2)
+    qr.add_data(data)
+    qr.make(fit=True)
+    return qr
+
+
+def qr_png(data: str) -> str:
+    """Encode data as a PNG QR code data URI"""
+    qr_img = _build(data).make_image(fill_color="black", back_color="white")
+    buffer = BytesIO()
+    qr_img.save(buffer, format="PNG")
+    return f"data:image/png;base64,{base64.b64encode(buffer.getvalue()).decode()}"
+
+
+def qr_svg(data: str) -> str:
+    """Encode data as an SVG QR code data URI (vector, no rasterization)"""
+    matrix = _build(data).get_matrix()
+    size = len(matrix)
+    # One path for all dark modules, with horizontal runs merged into single rectangles
+    path = []
+    for y, row in enumerate(matrix):
+        x = 0
+        while x < size:
+            if row[x]:
+                start = x
+                while x < size and row[x]:
+                    x += 1
+                path.append(f"M{start} {y}h{x - start}v1h{start - x}z")
+            else:
+                x += 1
+    svg = (
+        f'<svg xmlns="http://www.w3.org/2000/svg" viewBox="0 0 {size} {size}" shape-rendering="crispEdges">'
+        f'<rect width="{size}" height="{size}" fill="#fff"/>'
+        f'<path d="{"".join(path)}" fill="#000"/></svg>'
+    )
+    return f"data:image/svg+xml;base64,{base64.b64encode(svg.encode()).decode()}"
+
+
+@lru_cache(maxsize=QR_CACHE_SIZE)
+def qr_data_uri(data: str, fmt: str = QR_FORMAT) -> str:
+    """Cached QR code data URI in the configured format ('svg' or 'png')"""
+    if fmt == "png":
+        return qr_png(data)
+    return qr_svg(data)
+
+
+def qr_for_transaction(transaction_id: str, fmt: str = QR_FORMAT) -> str:
+    """QR code data URI pointing at the verification page for a transaction"""
+    return qr_data_uri(verification_url(transaction_id), fmt)
+
+
+def qr_for_transactions(transaction_ids: list[str], fmt: str = QR_FORMAT) -> dict[str, str]:
+    """QR code data URIs for many transactions at once, e.g. for batch issuance"""
+    return {transaction_id: qr_for_transaction(transaction_id, fmt) for transaction_id in dict.fromkeys(transaction_ids)}
@@ -0,0 +1,65 @@
+import math
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable
+from fastapi import HTTPException, Request, status
+
+
+class TokenBucketLimiter:
+    """Thread-safe per-key token buckets: `rate` requests/second sustained, bursts up to `burst`
+
+    At most max_keys buckets are tracked; the least recently seen clients are
+    forgotten first, which only ever hands them a fresh (full) bucket.
+    """
+
+    def __init__(self, rate: float, burst: int, max_keys: int = 100_000):
+        self.rate = rate
+        self.burst = burst
+        self.max_keys = max_keys
+        self.rejected = 0
+        self._buckets: OrderedDict[str, tuple[float, float]] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def acquire(self, key: str) -> float:
+        """Take a token for key; returns 0 on success, else seconds until one is available"""
+        now = time.monotonic()
+        with self._lock:
+            tokens, updated_at = self._buckets.get(key, (self.burst, now))
+            tokens = min(self.burst, tokens + (now - updated_at) * self.rate)
+            if tokens >= 1:
+                tokens -= 1
+                wait = 0.0
+            else:
+                self.rejected += 1
+                wait = (1 - tokens) / self.rate
+            self._buckets[key] = (tokens, now)
+            self._buckets.move_to_end(key)
+            while len(self._buckets) > self.max_keys:
+                self._buckets.popitem(last=False)
+        return wait
+
+    def clear(self):
+        """Forget every bucket"""
+        with self._lock:
+            self._buckets.clear()
+
+
+def client_ip(request: Request) -> str:
+    """Client address as seen by the server (run uvicorn with --proxy-headers behind a proxy)"""
+    return request.client.host if request.client else "unknown"
+
+
+def rate_limit(limiter: TokenBucketLimiter) -> Callable:
+    """Route dependency rejecting clients over their limit with 429"""
+
+    async def dependency(request: Request):
+        wait = limiter.acquire(client_ip(request))
+        if wait:
+            raise HTTPException(
+                status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+                detail="Too many requests. Please slow down.",
+                headers={"Retry-After": str(math.ceil(wait))},
+            )
+
+    return dependency
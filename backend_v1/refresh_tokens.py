@@ -0,0 +1,135 @@
+"""
+Server-side refresh token store.
+
+Every refresh token carries a random jti and a family ID shared by all tokens
+rotated from the same login. The table stores only SHA-256(jti), so a leaked
+database can't be turned into tokens. Refreshing consumes the presented token
+with a conditional UPDATE and issues the next one in the same family;
+presenting an already consumed token means it was stolen (or replayed), and
+the whole family is revoked.
+
+Revoked families are also kept in memory so revocation checks cost a set
+lookup; the table stays the source of truth for other processes, since a
+revoked row can never be consumed. "Log out everywhere" is recorded in the
+tokenrevocation table for the same reason, so other processes reject the
+subject's access tokens too.
+"""
+import hashlib
+from datetime import datetime, timedelta
+from enum import Enum
+from uuid import uuid4
+from sqlmodel import delete, select, update
+from sqlmodel.ext.asyncio.session import AsyncSession
+from auth import (
+    ACCESS_TOKEN_EXPIRE_MINUTES, REFRESH_TOKEN_EXPIRE_DAYS, REVOCATION_CACHE_SIZE,
+    access_tokens_revoked, remember_revocation, revoke_access_tokens,
+)
+from cache import TTLCache
+from db import async_engine
+from models import RefreshToken, TokenRevocation
+
+REFRESH_TOKEN_LIFETIME = timedelta(days=REFRESH_TOKEN_EXPIRE_DAYS)
+
+# Family ID -> True, for families revoked by logout or reuse detection
+_revoked_families = TTLCache(REVOCATION_CACHE_SIZE, REFRESH_TOKEN_LIFETIME.total_seconds())
+
+
+class Consumed(Enum):
+    OK = "ok"
+    REUSED = "reused"
+    INVALID = "invalid"
+
+
+def _hash(jti: str) -> str:
+    return hashlib.sha256(jti.encode()).hexdigest()
+
+
+def new_token_id() -> str:
+    """Random ID for a token (jti) or token family"""
+    return uuid4().hex
+
+
+def record_token(session: AsyncSession, jti: str, family: str, user_id: int):
+    """Stage a newly issued refresh token; the caller commits"""
+    session.add(RefreshToken(
+        id=_hash(jti),
+        family=family,
+        user_id=user_id,
+        expires_at=datetime.now() + REFRESH_TOKEN_LIFETIME,
+    ))
+
+
+def is_revoked(claims: dict) -> bool:
+    """In-memory check of a token's family and subject against revocations"""
+    family = claims.get("fam")
+    if family is not None and _revoked_families.get(family) is not None:
+        return True
+    return access_tokens_revoked(claims.get("sub"), claims.get("iat"), claims.get("iat_ms"))
+
+
+async def consume_token(session: AsyncSession, jti: str) -> Consumed:
+    """Mark a refresh token as used; only one concurrent caller can succeed"""
+    token_hash = _hash(jti)
+    result = await session.exec(
+        update(RefreshToken)
+        .where(
+            RefreshToken.id == token_hash,
+            RefreshToken.used_at.is_(None),
+            RefreshToken.revoked.is_(False),
+            RefreshToken.expires_at > datetime.now(),
+        )
+        .values(used_at=datetime.now())
+    )
+    if result.rowcount == 1:
+        return Consumed.OK
+
+    token = await session.get(RefreshToken, token_hash)
+    if token is not None and token.used_at is not None and not token.revoked:
+        return Consumed.REUSED
+    return Consumed.INVALID
+
+
+async def revoke_family(session: AsyncSession, family: str):
+    """Revoke every token of a family (logout, or reuse detected); the caller commits"""
+    await session.exec(update(RefreshToken).where(RefreshToken.family == family).values(revoked=True))
+    _revoked_families.set(family, True)
+
+
+async def revoke_subject(session: AsyncSession, user_id: int, subject: str):
+    """Log a user out everywhere: revoke all their refresh tokens and outstanding access tokens"""
+    families = (await session.exec(
+        select(RefreshToken.family).where(RefreshToken.user_id == user_id, RefreshToken.revoked.is_(False)).distinct()
+    )).all()
+    await session.exec(update(RefreshToken).where(RefreshToken.user_id == user_id).values(revoked=True))
+    for family in families:
+        _revoked_families.set(family, True)
+    revoked_at = revoke_access_tokens(subject)
+    await session.merge(TokenRevocation(
+        subject=subject,
+        revoked_at_ms=revoked_at,
+        expires_at=datetime.now() + timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES),
+    ))
+
+
+async def init_refresh_store():
+    """Purge expired tokens and revocations and load the live ones into memory"""
+    now = datetime.now()
+    async with AsyncSession(async_engine) as session:
+        await session.exec(delete(RefreshToken).where(RefreshToken.expires_at <= now))
+        await session.exec(delete(TokenRevocation).where(TokenRevocation.expires_at <= now))
+        families = (await session.exec(
+            select(RefreshToken.family).where(RefreshToken.revoked.is_(True)).distinct().limit(REVOCATION_CACHE_SIZE)
+        )).all()
+        subjects = (await session.exec(
+            select(TokenRevocation.subject, TokenRevocation.revoked_at_ms).limit(REVOCATION_CACHE_SIZE)
+        )).all()
+        await session.commit()
+    for family in families:
+        _revoked_families.set(family, True)
+    for subject, revoked_at in subjects:
+        remember_revocation(subject, revoked_at)
+
+
+def revocation_stats() -> dict:
+    """Size of the in-memory revoked-family set"""
+    return {"families": _revoked_families.stats()["size"]}
@@ -0,0 +1,373 @@
+import asyncio
+import base64
+import hashlib
+import logging
+import os
+import re
+import threading
+import time
+from collections.abc import MutableMapping
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from pathlib import Path
+from typing import Optional
+from fastapi import HTTPException, status
+from templating import TEMPLATES_DIR
+from assets import assets
+from metrics import METRICS_ENABLED, RENDER_SECONDS
+
+# Render engine configuration - override through environment variables
+RENDER_WORKERS = int(os.getenv("RENDER_WORKERS", os.cpu_count() or 1))
+RENDER_MAX_QUEUE = int(os.getenv("RENDER_MAX_QUEUE", RENDER_WORKERS * 4))
+RENDER_TIMEOUT = float(os.getenv("RENDER_TIMEOUT", "30"))
+RENDER_STATIC_CACHE = os.getenv("RENDER_STATIC_CACHE", "true").lower() == "true"
+RENDER_INTERACTIVE_RESERVE = int(os.getenv("RENDER_INTERACTIVE_RESERVE", RENDER_WORKERS))
+
+# Queue slots background and batch renders (wait=True) may fill; the rest stay free for interactive requests
+BACKGROUND_MAX_QUEUE = max(1, RENDER_MAX_QUEUE - RENDER_INTERACTIVE_RESERVE)
+
+_executor: Optional[ProcessPoolExecutor] = None
+_executor_lock = threading.Lock()
+logger = logging.getLogger(__name__)
+# Jobs submitted to the pool and not yet finished, including ones whose caller timed out
+_pending = 0
+_pending_lock = threading.Lock()
+# Set (and replaced) on the event loop whenever a job finishes, waking wait=True callers: (loop, event)
+_slot_freed: Optional[tuple[asyncio.AbstractEventLoop, asyncio.Event]] = None
+
+# Per-worker cache of parsed stylesheets: path -> (mtime, CSS)
+_stylesheets: dict = {}
+
+# Per-worker WeasyPrint state reused across documents
+_font_config = None
+# Whether this WeasyPrint version keys its image cache the way _LayerCache expects
+_static_cache_supported = False
+_static_images: dict = {}
+_static_version = ""
+
+
+class _LayerCache(MutableMapping):
+    """WeasyPrint image cache that keeps the static layer between renders
+
+    Entries for branding images (keyed by data URI or by their md5 image id) go
+    into the worker-wide store, so logos, watermark and signature are fetched,
+    decoded and sized once per asset version instead of once per document.
+    Everything else, such as the per-document QR code, lives only for a single
+    render.
+
+    The key format is a WeasyPrint internal; at worker start _probe_image_cache
+    checks it and _layer_cache_matches compares a sample certificate rendered
+    with and without the layer, and rendering falls back to the plain
+    per-document cache when either fails.
+    """
+
+    def __init__(self, shared: dict, static_ids: frozenset):
+        self.shared = shared
+        self.static_ids = static_ids
+        self.local = {}
+
+    def _is_static(self, key: str) -> bool:
+        if key.startswith("data:"):
+            return hashlib.md5(key.encode(), usedforsecurity=False).hexdigest() in self.static_ids
+        # Derived entries are keyed "<image id>-<slot>-<dpi>"
+        return key.split("-", 1)[0] in self.static_ids
+
+    def __getitem__(self, key):
+        if key in self.local:
+            return self.local[key]
+        return self.shared[key]
+
+    def __setitem__(self, key, value):
+        if self._is_static(key):
+            self.shared[key] = value
+        else:
+            self.local[key] = value
+
+    def __delitem__(self, key):
+        self.local.pop(key, None)
+        self.shared.pop(key, None)
+
+    def __contains__(self, key):
+        return key in self.local or key in self.shared
+
+    def __iter__(self):
+        yield from self.shared
+        yield from self.local
+
+    def __len__(self):
+        return len(self.shared) + len(self.local)
+
+
+def _init_worker():
+    """Pre-warm a render worker so the first job doesn't pay import and font setup"""
+    global HTML, CSS, _font_config
+    from weasyprint import HTML, CSS
+    from weasyprint.text.fonts import FontConfiguration
+
+    _font_config = FontConfiguration()
+
+    # Parse the document stylesheets once per worker
+    for path in sorted(TEMPLATES_DIR.glob("*.css")):
+        _stylesheet(str(path))
+
+    # Lay out a tiny document once to load fontconfig and the default fonts
+    HTML(string="<p>warm-up</p>").write_pdf(font_config=_font_config)
+
+    global _static_cache_supported
+    _static_cache_supported = _probe_image_cache()
+    if RENDER_STATIC_CACHE and not _static_cache_supported:
+        import weasyprint
+        logger.warning(
+            "WeasyPrint %s keys its image cache differently than expected; rendering without the static image cache",
+            getattr(weasyprint, "__version__", "?"),
+        )
+    elif RENDER_STATIC_CACHE:
+        _static_cache_supported = _layer_cache_matches()
+        if not _static_cache_supported:
+            import weasyprint
+            logger.warning(
+                "WeasyPrint %s renders a sample certificate differently with the static image cache; rendering without it",
+                getattr(weasyprint, "__version__", "?"),
+            )
+
+
+def _probe_image_cache() -> bool:
+    """Check that WeasyPrint keys images by URL and derived entries by "<md5 of URL>-<slot>-<dpi>" """
+    from io import BytesIO
+    from PIL import Image
+
+    buffer = BytesIO()
+    Image.new("RGB", (2, 2), "white").save(buffer, "PNG")
+    uri = "data:image/png;base64," + base64.b64encode(buffer.getvalue()).decode()
+    image_id = hashlib.md5(uri.encode(), usedforsecurity=False).hexdigest()
+    cache = {}
+    try:
+        HTML(string=f'<img src="{uri}">').write_pdf(font_config=_font_config, cache=cache)
+    except Exception:
+        return False
+    return uri in cache and all(
+        key == uri or (isinstance(key, str) and key.split("-", 1)[0] == image_id) for key in cache
+    )
+
+
+# Per-file metadata that differs between two renders of the same document
+_VOLATILE = re.compile(rb"/(ID \[[^\]]*\]|CreationDate \([^)]*\)|ModDate \([^)]*\))")
+
+
+def _normalized(pdf_bytes: bytes) -> bytes:
+    """PDF bytes without the metadata that changes on every render"""
+    return _VOLATILE.sub(b"", pdf_bytes)
+
+
+def _layer_cache_matches() -> bool:
+    """Check that a sample certificate renders byte-identically with and without the static layer
+
+    Renders once with the plain per-document cache, then twice through
+    _LayerCache: cold, and again served from the warm static layer.
+    """
+    from router.documents import CertificateRequest, _certificate_context
+    from templating import render_html, stylesheet_for
+
+    sample = CertificateRequest(
+        transaction_id="TXN000000000000000",
+        student_name="Sample Student",
+        student_id="000000",
+        reg_no="000000",
+        session="2000-2001",
+    )
+    html = render_html("certificate.html", _certificate_context(sample))
+    stylesheet = stylesheet_for("certificate.html")
+    static_assets = (assets.version, assets.image_ids)
+    try:
+        plain = _normalized(_render(html, ".", stylesheet, None))
+        return all(
+            _normalized(_render(html, ".", stylesheet, static_assets)) == plain for _ in range(2)
+        )
+    except Exception:
+        logger.exception("Static image cache check failed")
+        return False
+
+
+def _stylesheet(path: str):
+    """Parsed WeasyPrint stylesheet, re-parsed only when the file changes"""
+    mtime = os.stat(path).st_mtime_ns
+    cached = _stylesheets.get(path)
+    if cached is None or cached[0] != mtime:
+        cached = (mtime, CSS(filename=path))
+        _stylesheets[path] = cached
+    return cached[1]
+
+
+def _image_cache(static_assets: Optional[tuple[str, frozenset]]):
+    """Image cache for one render, sharing the static layer of the current asset version"""
+    global _static_images, _static_version
+    if static_assets is None or not _static_cache_supported:
+        return None
+    version, image_ids = static_assets
+    if version != _static_version:
+        # Branding assets changed: drop the old static layer
+        _static_images = {}
+        _static_version = version
+    return _LayerCache(_static_images, image_ids)
+
+
+def _render(
+    html_content: str,
+    base_url: str,
+    stylesheet: Optional[str] = None,
+    static_assets: Optional[tuple[str, frozenset]] = None,
+    target: Optional[str] = None
+) -> Optional[bytes]:
+    """Render HTML to PDF inside a worker process
+
+    Returns the PDF bytes, or writes them to target and returns None.
+    """
+    stylesheets = [_stylesheet(stylesheet)] if stylesheet else None
+    image_cache = _image_cache(static_assets)
+    document = HTML(string=html_content, base_url=base_url)
+    try:
+        if target is None:
+            return document.write_pdf(stylesheets=stylesheets, font_config=_font_config, cache=image_cache)
+        # Write next to the target and swap it in so readers never see a partial PDF
+        tmp_path = f"{target}.{os.getpid()}.tmp"
+        document.write_pdf(tmp_path, stylesheets=stylesheets, font_config=_font_config, cache=image_cache)
+        os.replace(tmp_path, target)
+        return None
+    finally:
+        if image_cache is not None:
+            # Cached static images keep a reference to this cache; don't let it pin the QR code
+            image_cache.local.clear()
+
+
+def _timed_render(*args) -> tuple[Optional[bytes], float]:
+    """_render, also returning how long write_pdf took inside the worker"""
+    started = time.perf_counter()
+    result = _render(*args)
+    return result, time.perf_counter() - started
+
+
+def _warm_up():
+    """No-op job used to force every worker process to start"""
+    return os.getpid()
+
+
+def start_engine():
+    """Start the render process pool and wait until every worker is warm"""
+    global _executor
+    with _executor_lock:
+        if _executor is not None:
+            return
+        executor = ProcessPoolExecutor(max_workers=RENDER_WORKERS, initializer=_init_worker)
+        futures = [executor.submit(_warm_up) for _ in range(RENDER_WORKERS)]
+        for future in futures:
+            future.result()
+        _executor = executor
+
+
+def stop_engine():
+    """Shut down the render process pool"""
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            return
+        _executor.shutdown(wait=True, cancel_futures=True)
+        _executor = None
+
+
+async def render_pdf(
+    html_content: str,
+    base_url: str,
+    stylesheet: Optional[str] = None,
+    wait: bool = False,
+    target: Optional[Path] = None
+) -> Optional[bytes]:
+    """Render HTML to PDF in the process pool without blocking the event loop
+
+    stylesheet is the path of a CSS file applied on top of the document; each
+    worker parses it once and reuses the result.
+
+    With target the worker writes the PDF straight to that file and returns
+    None, so the document never passes through this process's memory.
+
+    When the queue is full the call fails with 503, or with wait=True it waits
+    for a free slot instead (used by background and batch rendering). Waiting
+    callers only fill BACKGROUND_MAX_QUEUE slots, keeping the rest for
+    interactive requests.
+    """
+    global _pending
+    if _executor is None:
+        await asyncio.to_thread(start_engine)
+    executor = _executor
+
+    loop = asyncio.get_running_loop()
+    while wait and _pending >= BACKGROUND_MAX_QUEUE:
+        await _slot_event(loop).wait()
+
+    # Back-pressure: refuse new work once the queue is full
+    if _pending >= RENDER_MAX_QUEUE:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Document renderer is busy. Please try again shortly.",
+            headers={"Retry-After": "5"},
+        )
+
+    static_assets = (assets.version, assets.image_ids) if RENDER_STATIC_CACHE else None
+    submitted_at = time.perf_counter()
+    with _pending_lock:
+        _pending += 1
+    try:
+        future = executor.submit(
+            _timed_render, html_content, base_url, stylesheet, static_assets, str(target) if target else None
+        )
+    except BaseException:
+        _release_slot(loop)
+        raise
+    # A timed-out render keeps its worker busy, so the slot is freed when the job ends, not the request
+    future.add_done_callback(lambda _: _release_slot(loop))
+
+    try:
+        result, render_seconds = await asyncio.wait_for(asyncio.wrap_future(future), timeout=RENDER_TIMEOUT)
+        if METRICS_ENABLED:
+            RENDER_SECONDS.observe(render_seconds, "write_pdf")
+            RENDER_SECONDS.observe(time.perf_counter() - submitted_at - render_seconds, "queue")
+        return result
+    except asyncio.TimeoutError:
+        future.cancel()
+        raise HTTPException(
+            status_code=status.HTTP_504_GATEWAY_TIMEOUT,
+            detail="Document rendering timed out"
+        )
+    except BrokenProcessPool:
+        # A worker died mid-render; drop the pool so the next job gets a fresh one
+        await asyncio.to_thread(stop_engine)
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Document renderer restarted. Please try again.",
+            headers={"Retry-After": "1"},
+        )
+
+
+def _release_slot(loop: asyncio.AbstractEventLoop):
+    """Free a render queue slot; runs on the pool's thread once the job finishes or is cancelled"""
+    global _pending
+    with _pending_lock:
+        _pending -= 1
+    try:
+        loop.call_soon_threadsafe(_wake_waiters, loop)
+    except RuntimeError:
+        pass  # Event loop already closed; nobody is waiting
+
+
+def _slot_event(loop: asyncio.AbstractEventLoop) -> asyncio.Event:
+    global _slot_freed
+    if _slot_freed is None or _slot_freed[0] is not loop:
+        _slot_freed = (loop, asyncio.Event())
+    return _slot_freed[1]
+
+
+def _wake_waiters(loop: asyncio.AbstractEventLoop):
+    """Wake every caller waiting for a free slot so they recheck the queue"""
+    global _slot_freed
+    if _slot_freed is not None and _slot_freed[0] is loop:
+        _slot_freed[1].set()
+        _slot_freed = (loop, asyncio.Event())
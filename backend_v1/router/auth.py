@@ -1,18 +1,32 @@
 from datetime import timedelta
+from typing import Optional
 from fastapi import APIRouter, Depends, HTTPException, status
-from sqlmodel import SQLModel, Session, select
+from sqlmodel import SQLModel, select
+from sqlmodel.ext.asyncio.session import AsyncSession
 from models import User
-from db import get_session
+from db import get_async_session
 from auth import (
-    verify_password,
-    get_password_hash,
+    hash_password,
+    verify_and_update_password,
+    invalidate_user,
     create_access_token,
     create_refresh_token,
-    verify_refresh_token,
+    decode_refresh_token,
     get_current_active_user,
+    get_current_admin,
     ACCESS_TOKEN_EXPIRE_MINUTES,
     REFRESH_TOKEN_EXPIRE_DAYS
 )
+from onboarding import ONBOARD_MAX_ROWS, onboard_students
+from refresh_tokens import (
+    Consumed,
+    consume_token,
+    is_revoked,
+    new_token_id,
+    record_token,
+    revoke_family,
+    revoke_subject
+)
 
 router = APIRouter()
 
@@ -23,6 +37,16 @@ class UserRegister(SQLModel):
     password: str
 
 
+class StudentRegister(UserRegister):
+    # student_id, reg_no, session, cgpa, ... and courses, as in a catalog import
+    academic_record: Optional[dict] = None
+
+
+class BulkRegister(SQLModel):
+    students: list[StudentRegister]
+    department: Optional[str] = None
+
+
 class UserLogin(SQLModel):
     email: str
     password: str
@@ -42,15 +66,37 @@ class UserResponse(SQLModel):
     email: str
 
 
+def _issue_tokens(session: AsyncSession, email: str, user_id: int, family: str | None = None) -> dict:
+    """Create an access/refresh token pair and stage the refresh token in the store
+
+    A login starts a new token family; refreshes continue the presented token's.
+    """
+    jti = new_token_id()
+    family = family or new_token_id()
+    access_token = create_access_token(
+        data={"sub": email}, expires_delta=timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
+    )
+    refresh_token = create_refresh_token(
+        data={"sub": email, "uid": user_id, "jti": jti, "fam": family},
+        expires_delta=timedelta(days=REFRESH_TOKEN_EXPIRE_DAYS)
+    )
+    record_token(session, jti, family, user_id)
+    return {
+        "access_token": access_token,
+        "refresh_token": refresh_token,
+        "token_type": "bearer"
+    }
+
+
 @router.post("/register", response_model=UserResponse)
 async def register(
     user_data: UserRegister,
-    session: Session = Depends(get_session)
+    session: AsyncSession = Depends(get_async_session)
 ):
     """Register a new user"""
     # Check if user already exists
     statement = select(User).where(User.email == user_data.email)
-    existing_user = session.exec(statement).first()
+    existing_user = (await session.exec(statement)).first()
     
     if existing_user:
         raise HTTPException(
@@ -59,7 +105,7 @@ async def register(
         )
     
     # Create new user with hashed password
-    hashed_password = get_password_hash(user_data.password)
+    hashed_password = await hash_password(user_data.password)
     new_user = User(
         name=user_data.name,
         email=user_data.email,
@@ -67,44 +113,66 @@ async def register(
     )
     
     session.add(new_user)
-    session.commit()
-    session.refresh(new_user)
+    await session.commit()
+    await session.refresh(new_user)
     
     return new_user
 
+@router.post("/register/bulk")
+async def register_bulk(
+    data: BulkRegister,
+    admin: User = Depends(get_current_admin)
+):
+    """Register many students at once, with optional academic records; errors are reported per row
+
+    Restricted to ADMIN_EMAILS; without any configured it is refused for everyone.
+    """
+    if len(data.students) > ONBOARD_MAX_ROWS:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Bulk registration is limited to {ONBOARD_MAX_ROWS} students"
+        )
+    
+    report = await onboard_students([student.model_dump() for student in data.students], data.department)
+    return {
+        "created": report.created,
+        "academic_records": report.records,
+        "enrollments": report.enrollments,
+        "errors": report.errors
+    }
+
 @router.post("/login", response_model=Token)
 async def login(
     login_data: UserLogin,
-    session: Session = Depends(get_session)
+    session: AsyncSession = Depends(get_async_session)
 ):
     """Login and get access token"""
     # Find user by email
     statement = select(User).where(User.email == login_data.email)
-    user = session.exec(statement).first()
+    user = (await session.exec(statement)).first()
+    
+    if user:
+        password_ok, new_hash = await verify_and_update_password(login_data.password, user.password)
+    else:
+        password_ok, new_hash = False, None
     
-    if not user or not verify_password(login_data.password, user.password):
+    if not password_ok:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Incorrect email or password",
             headers={"WWW-Authenticate": "Bearer"},
         )
     
-    # Create access token and refresh token
-    access_token_expires = timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
-    access_token = create_access_token(
-        data={"sub": user.email}, expires_delta=access_token_expires
-    )
-    
-    refresh_token_expires = timedelta(days=REFRESH_TOKEN_EXPIRE_DAYS)
-    refresh_token = create_refresh_token(
-        data={"sub": user.email}, expires_delta=refresh_token_expires
-    )
+    # Transparently upgrade hashes made with outdated Argon2 parameters
+    if new_hash:
+        user.password = new_hash
+        session.add(user)
+        await session.commit()
+        invalidate_user(user.email)
     
-    return {
-        "access_token": access_token,
-        "refresh_token": refresh_token,
-        "token_type": "bearer"
-    }
+    tokens = _issue_tokens(session, user.email, user.id)
+    await session.commit()
+    return tokens
 
 
 @router.get("/me", response_model=UserResponse)
@@ -118,42 +186,65 @@ async def read_users_me(
 @router.post("/refresh", response_model=Token)
 async def refresh_token(
     token_data: RefreshTokenRequest,
-    session: Session = Depends(get_session)
+    session: AsyncSession = Depends(get_async_session)
 ):
-    """Get new access token using refresh token"""
-    email = verify_refresh_token(token_data.refresh_token)
+    """
+    Exchange a refresh token for a new access token and refresh token
+
+    Each refresh token works once. Presenting one that was already exchanged
+    revokes every token descended from the same login.
+    """
+    invalid_token = HTTPException(
+        status_code=status.HTTP_401_UNAUTHORIZED,
+        detail="Invalid refresh token",
+        headers={"WWW-Authenticate": "Bearer"},
+    )
     
-    if not email:
-        raise HTTPException(
-            status_code=status.HTTP_401_UNAUTHORIZED,
-            detail="Invalid refresh token",
-            headers={"WWW-Authenticate": "Bearer"},
-        )
+    claims = decode_refresh_token(token_data.refresh_token)
+    if not claims or "jti" not in claims or "fam" not in claims or "uid" not in claims:
+        raise invalid_token
     
-    # Find user
-    statement = select(User).where(User.email == email)
-    user = session.exec(statement).first()
+    # Revoked families are rejected from memory, without touching the database
+    if is_revoked(claims):
+        raise invalid_token
     
-    if not user:
+    outcome = await consume_token(session, claims["jti"])
+    if outcome is Consumed.REUSED:
+        # Replay of a rotated token: assume it was stolen and end the whole session family
+        await revoke_family(session, claims["fam"])
+        await session.commit()
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
-            detail="User not found",
+            detail="Refresh token reuse detected. Please log in again.",
             headers={"WWW-Authenticate": "Bearer"},
         )
+    if outcome is Consumed.INVALID:
+        raise invalid_token
     
-    # Create new access token and refresh token
-    access_token_expires = timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
-    access_token = create_access_token(
-        data={"sub": user.email}, expires_delta=access_token_expires
-    )
-    
-    refresh_token_expires = timedelta(days=REFRESH_TOKEN_EXPIRE_DAYS)
-    new_refresh_token = create_refresh_token(
-        data={"sub": user.email}, expires_delta=refresh_token_expires
-    )
-    
-    return {
-        "access_token": access_token,
-        "refresh_token": new_refresh_token,
-        "token_type": "bearer"
-    }
+    tokens = _issue_tokens(session, claims["sub"], claims["uid"], family=claims["fam"])
+    await session.commit()
+    return tokens
+
+
+@router.post("/logout", status_code=status.HTTP_204_NO_CONTENT)
+async def logout(
+    token_data: RefreshTokenRequest,
+    session: AsyncSession = Depends(get_async_session)
+):
+    """Revoke a refresh token and every token rotated from the same login"""
+    claims = decode_refresh_token(token_data.refresh_token)
+    if claims and "fam" in claims:
+        await revoke_family(session, claims["fam"])
+        await session.commit()
+    return None
+
+
+@router.post("/logout-all", status_code=status.HTTP_204_NO_CONTENT)
+async def logout_all(
+    current_user: User = Depends(get_current_active_user),
+    session: AsyncSession = Depends(get_async_session)
+):
+    """Log out everywhere: revoke all of the user's refresh and access tokens"""
+    await revoke_subject(session, current_user.id, current_user.email)
+    await session.commit()
+    return None
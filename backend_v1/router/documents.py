@@ -1,22 +1,36 @@
-from db import get_session
-from fastapi import APIRouter, Depends, HTTPException, status, Request
-from fastapi.responses import Response
-from fastapi.templating import Jinja2Templates
-from sqlmodel import SQLModel, Session, select
-from models import Transaction, Document, User
+from db import get_async_session
+from fastapi import APIRouter, Depends, HTTPException, status, Request, Query
+from fastapi.responses import Response, StreamingResponse, JSONResponse, FileResponse, HTMLResponse
+from sqlmodel import SQLModel, select
+from sqlmodel.ext.asyncio.session import AsyncSession
+from models import Transaction, User, AcademicRecord, RenderJob
 from datetime import datetime
-import qrcode
-from io import BytesIO
-import base64
-from weasyprint import HTML
+from collections import deque
+from zipfile import ZipFile, ZIP_STORED
+import asyncio
+import logging
+import os
 from pathlib import Path
+from typing import Literal, Optional
+from io import RawIOBase
 from auth import get_current_active_user
+from render import render_pdf, RENDER_WORKERS
+from pdf_cache import pdf_cache, etag_for, etag_matches
+from assets import assets
+from jobs import create_job, register_handler
+from qr import qr_for_transactions, qr_for_transaction
+from templating import render_html, stylesheet_for
+from ratelimit import rate_limit
+from verification import verify_reference_number, verify_limiter, VERIFY_CACHE_TTL
+from metrics import METRICS_ENABLED, DOCUMENT_BYTES, stage
+from catalog import load_courses
 
 router = APIRouter()
-templates = Jinja2Templates(directory="public/templates")
+logger = logging.getLogger(__name__)
 
-# Get the base directory for static files
-BASE_DIR = Path(__file__).parent.parent / "public"
+# Batch generation limits - override through environment variables
+BATCH_MAX_ITEMS = int(os.getenv("BATCH_MAX_ITEMS", "5000"))
+BATCH_WINDOW = int(os.getenv("BATCH_WINDOW", RENDER_WORKERS * 2))
 
 
 class CertificateRequest(SQLModel):
@@ -52,19 +66,299 @@ class VerifyRefRequest(SQLModel):
     ref_no: str
 
 
+class BatchRequest(SQLModel):
+    certificates: list[CertificateRequest] = []
+    testimonials: list[TestimonialRequest] = []
+    # Transaction IDs resolved server-side against the student's AcademicRecord
+    transaction_ids: list[str] = []
+    document_type: str = "certificate"
+
+
+class _ZipStream(RawIOBase):
+    """Write-only sink for ZipFile that hands back written bytes chunk by chunk"""
+
+    def __init__(self):
+        self._chunks: list[bytes] = []
+        self._offset = 0
+
+    def writable(self):
+        return True
+
+    def write(self, data) -> int:
+        self._chunks.append(bytes(data))
+        self._offset += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        return self._offset
+
+    def drain(self) -> bytes:
+        data = b"".join(self._chunks)
+        self._chunks.clear()
+        return data
+
+
+def _branding() -> dict:
+    """Signature and logo data URIs shared by every document"""
+    return {
+        "signature_path": assets.data_uri("signature/kamrul_signature.png"),
+        "logo_path": assets.data_uri("logo/just_logo.png")
+    }
+
+
+def _certificate_context(cert_data: CertificateRequest, qr_code: Optional[str] = None) -> dict:
+    """Template context for a certificate; qr_code skips generating the QR when the caller already has it"""
+    if qr_code is None:
+        with stage("certificate.html", "qr"):
+            qr_code = qr_for_transaction(cert_data.transaction_id)
+    with stage("certificate.html", "assets"):
+        branding = _branding()
+    return {
+        "date": datetime.now().strftime("%d/%m/%Y"),
+        "ref_no": cert_data.transaction_id,
+        "student_name": cert_data.student_name,
+        "student_id": cert_data.student_id,
+        "reg_no": cert_data.reg_no,
+        "session": cert_data.session,
+        "department": cert_data.department,
+        "works": cert_data.works,
+        "courses": cert_data.courses if cert_data.courses else [],
+        "qr_code": qr_code,
+        **branding
+    }
+
+
+def _testimonial_context(test_data: TestimonialRequest, qr_code: Optional[str] = None) -> dict:
+    """Template context for a testimonial; qr_code skips generating the QR when the caller already has it"""
+    if qr_code is None:
+        with stage("testimonial.html", "qr"):
+            qr_code = qr_for_transaction(test_data.transaction_id)
+    with stage("testimonial.html", "assets"):
+        branding = _branding()
+    return {
+        "date": datetime.now().strftime("%d/%m/%Y"),
+        "serial_no": test_data.transaction_id,
+        "student_name": test_data.student_name,
+        "father_name": test_data.father_name,
+        "mother_name": test_data.mother_name,
+        "roll_no": test_data.roll_no,
+        "reg_no": test_data.reg_no,
+        "session": test_data.session,
+        "pronoun": test_data.pronoun,
+        "degree_years": test_data.degree_years,
+        "degree_months": test_data.degree_months,
+        "degree_type": test_data.degree_type,
+        "graduation_year": test_data.graduation_year,
+        "cgpa": test_data.cgpa,
+        "prepared_by": test_data.prepared_by,
+        "checked_by": test_data.checked_by,
+        "qr_code": qr_code,
+        **branding
+    }
+
+
+CONTEXT_BUILDERS = {
+    "certificate.html": _certificate_context,
+    "testimonial.html": _testimonial_context,
+}
+
+
+async def _render_document(
+    template_name: str,
+    data: CertificateRequest | TestimonialRequest,
+    base_url: str,
+    wait: bool = False,
+    target: Optional[Path] = None,
+    qr_code: Optional[str] = None
+) -> Optional[bytes]:
+    """Render a certificate/testimonial PDF from request data, optionally straight to a file"""
+    context = CONTEXT_BUILDERS[template_name](data, qr_code)
+    with stage(template_name, "template"):
+        html_content = render_html(template_name, context)
+    
+    # Convert HTML to PDF in the render worker pool, styled with the pre-parsed stylesheet
+    with stage(template_name, "pdf"):
+        return await render_pdf(
+            html_content, base_url, stylesheet=stylesheet_for(template_name), wait=wait, target=target
+        )
+
+
+async def _get_or_render(
+    base_url: str,
+    template_name: str,
+    data: CertificateRequest | TestimonialRequest,
+    cache_key: str,
+    wait: bool = False,
+    qr_code: Optional[str] = None
+) -> bytes:
+    """Return a PDF from the cache, rendering and caching it on a miss"""
+    pdf_bytes = pdf_cache.get(cache_key)
+    if pdf_bytes is None:
+        pdf_bytes = await _render_document(template_name, data, base_url, wait=wait, qr_code=qr_code)
+        pdf_cache.put(cache_key, pdf_bytes)
+    if METRICS_ENABLED:
+        DOCUMENT_BYTES.observe(len(pdf_bytes), template_name)
+    return pdf_bytes
+
+
+async def _get_or_render_file(
+    base_url: str,
+    template_name: str,
+    data: CertificateRequest | TestimonialRequest,
+    cache_key: str
+) -> Path:
+    """Return the on-disk PDF for a cache key, rendering it straight to disk on a miss"""
+    path = pdf_cache.path(cache_key)
+    if path is None:
+        path = pdf_cache.target(cache_key)
+        await _render_document(template_name, data, base_url, target=path)
+        pdf_cache.added(path.stat().st_size)
+    if METRICS_ENABLED:
+        DOCUMENT_BYTES.observe(path.stat().st_size, template_name)
+    return path
+
+
+def _pdf_response(path: Path, filename: str, etag: str) -> FileResponse:
+    """Stream a PDF from disk; servers supporting pathsend hand it to sendfile"""
+    return FileResponse(
+        path,
+        media_type="application/pdf",
+        headers={
+            "Content-Disposition": f"attachment; filename={filename}",
+            "ETag": etag,
+            "Cache-Control": "private, no-cache"
+        }
+    )
+
+
+async def _document_response(
+    request: Request,
+    template_name: str,
+    data: CertificateRequest | TestimonialRequest,
+    output_format: str
+) -> Response:
+    """HTML preview, 304 for a matching ETag, or the PDF streamed from the cache"""
+    # Browser preview: return the rendered HTML without paying for the PDF
+    if output_format == "html":
+        return HTMLResponse(render_html(template_name, CONTEXT_BUILDERS[template_name](data), inline_css=True))
+    
+    # Serve repeated downloads from the PDF cache
+    cache_key = pdf_cache.make_key(template_name, data)
+    etag = etag_for(cache_key)
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers={"ETag": etag})
+    
+    pdf_path = await _get_or_render_file(str(request.base_url), template_name, data, cache_key)
+    
+    # Stream the PDF from disk instead of holding it in memory
+    return _pdf_response(pdf_path, f"{template_name.removesuffix('.html')}_{data.transaction_id}.pdf", etag)
+
+
+async def _load_records(
+    session: AsyncSession,
+    transaction_ids: set[str],
+    user_id: int
+) -> dict[str, tuple[Transaction, User, Optional[AcademicRecord]]]:
+    """A user's transactions with their academic record, in one joined query
+
+    Transactions belonging to anyone else are left out, exactly like missing ones.
+    """
+    statement = (
+        select(Transaction, User, AcademicRecord)
+        .join(User, User.id == Transaction.user_id)
+        .join(AcademicRecord, AcademicRecord.user_id == User.id, isouter=True)
+        .where(Transaction.transaction_id.in_(transaction_ids), Transaction.user_id == user_id)
+    )
+    return {transaction.transaction_id: (transaction, user, record) for transaction, user, record in await session.exec(statement)}
+
+
+async def _load_own_record(
+    session: AsyncSession,
+    transaction_id: str,
+    current_user: User,
+    template_name: str
+) -> tuple[User, AcademicRecord]:
+    """Load the current user's paid transaction and academic record for a stored-data document"""
+    with stage(template_name, "transaction_lookup"):
+        row = (await _load_records(session, {transaction_id}, current_user.id)).get(transaction_id)
+    
+    # Documents only go to the student the transaction belongs to
+    if row is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Transaction not found"
+        )
+    transaction, user, record = row
+    if transaction.status != "completed":
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Payment not verified. Please complete payment first."
+        )
+    if record is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Academic record not found"
+        )
+    return user, record
+
+
+async def _queue_job(
+    session: AsyncSession,
+    kind: str,
+    data: CertificateRequest | TestimonialRequest,
+    request: Request,
+    current_user: User
+) -> JSONResponse:
+    """Create a render job and return 202 with where to poll for it"""
+    job = await create_job(session, kind, data.model_dump(mode="json"), str(request.base_url), current_user.id)
+    return JSONResponse(
+        status_code=status.HTTP_202_ACCEPTED,
+        content={
+            "job_id": job.id,
+            "status": job.status,
+            "status_url": f"/api/documents/jobs/{job.id}"
+        },
+        headers={"Location": f"/api/documents/jobs/{job.id}"}
+    )
+
+
+async def _certificate_job(job: RenderJob) -> bytes:
+    """Job handler rendering a queued certificate"""
+    cert_data = CertificateRequest.model_validate(job.payload)
+    cache_key = pdf_cache.make_key("certificate.html", cert_data)
+    return await _get_or_render(job.base_url, "certificate.html", cert_data, cache_key, wait=True)
+
+
+async def _testimonial_job(job: RenderJob) -> bytes:
+    """Job handler rendering a queued testimonial"""
+    test_data = TestimonialRequest.model_validate(job.payload)
+    cache_key = pdf_cache.make_key("testimonial.html", test_data)
+    return await _get_or_render(job.base_url, "testimonial.html", test_data, cache_key, wait=True)
+
+
+register_handler("certificate", _certificate_job)
+register_handler("testimonial", _testimonial_job)
+
+
 @router.post("/generate-certificate")
 async def generate_certificate(
     request: Request,
     cert_data: CertificateRequest,
-    session: Session = Depends(get_session),
+    mode: Literal["sync", "async"] = "sync",
+    output_format: Literal["pdf", "html"] = Query("pdf", alias="format"),
+    session: AsyncSession = Depends(get_async_session),
     current_user: User = Depends(get_current_active_user)
 ):
     """
     Generate certificate PDF with provided data and return it
+
+    With ?mode=async a render job is queued instead; poll /jobs/{job_id} for the result.
+    With ?format=html the rendered HTML is returned for a quick browser preview.
     """
     # Verify transaction exists and is completed
     statement = select(Transaction).where(Transaction.transaction_id == cert_data.transaction_id)
-    transaction = session.exec(statement).first()
+    with stage("certificate.html", "transaction_lookup"):
+        transaction = (await session.exec(statement)).first()
     
     if not transaction:
         raise HTTPException(
@@ -78,75 +372,32 @@ async def generate_certificate(
             detail="Payment not verified. Please complete payment first."
         )
     
-    # Generate QR code
-    qr = qrcode.QRCode(version=1, box_size=10, border=2)
-    qr_data = f"http://localhost:5173/verify?ref={cert_data.transaction_id}"
-    qr.add_data(qr_data)
-    qr.make(fit=True)
-    
-    qr_img = qr.make_image(fill_color="black", back_color="white")
-    buffer = BytesIO()
-    qr_img.save(buffer, format='PNG')
-    qr_base64 = base64.b64encode(buffer.getvalue()).decode()
-    
-    # Load PNG logo directly
-    logo_path = BASE_DIR / "logo" / "just_logo.png"
-    with open(logo_path, "rb") as f:
-        logo_base64 = base64.b64encode(f.read()).decode()
-    
-    # Load and encode signature image
-    signature_path = BASE_DIR / "signature" / "kamrul_signature.png"
-    with open(signature_path, "rb") as f:
-        signature_base64 = base64.b64encode(f.read()).decode()
-    
-    # Prepare template context
-    context = {
-        "request": request,
-        "date": datetime.now().strftime("%d/%m/%Y"),
-        "ref_no": cert_data.transaction_id,
-        "student_name": cert_data.student_name,
-        "student_id": cert_data.student_id,
-        "reg_no": cert_data.reg_no,
-        "session": cert_data.session,
-        "department": cert_data.department,
-        "works": cert_data.works,
-        "courses": cert_data.courses if cert_data.courses else [],
-        "qr_code": f"data:image/png;base64,{qr_base64}",
-        "signature_path": f"data:image/png;base64,{signature_base64}",
-        "logo_path": f"data:image/png;base64,{logo_base64}"
-    }
-    
-    # Render HTML template
-    html_content = templates.get_template("certificate.html").render(context)
-    
-    # Convert HTML to PDF
-    pdf_buffer = BytesIO()
-    HTML(string=html_content, base_url=str(request.base_url)).write_pdf(pdf_buffer)
-    pdf_buffer.seek(0)
+    # Async mode: queue the render and return a job ID immediately
+    if mode == "async" and output_format == "pdf":
+        return await _queue_job(session, "certificate", cert_data, request, current_user)
     
-    # Return PDF as response
-    return Response(
-        content=pdf_buffer.getvalue(),
-        media_type="application/pdf",
-        headers={
-            "Content-Disposition": f"attachment; filename=certificate_{cert_data.transaction_id}.pdf"
-        }
-    )
+    return await _document_response(request, "certificate.html", cert_data, output_format)
 
 
 @router.post("/generate-testimonial")
 async def generate_testimonial(
     request: Request,
     test_data: TestimonialRequest,
-    session: Session = Depends(get_session),
+    mode: Literal["sync", "async"] = "sync",
+    output_format: Literal["pdf", "html"] = Query("pdf", alias="format"),
+    session: AsyncSession = Depends(get_async_session),
     current_user: User = Depends(get_current_active_user)
 ):
     """
     Generate testimonial PDF with provided data and return it
+
+    With ?mode=async a render job is queued instead; poll /jobs/{job_id} for the result.
+    With ?format=html the rendered HTML is returned for a quick browser preview.
     """
     # Verify transaction exists and is completed
     statement = select(Transaction).where(Transaction.transaction_id == test_data.transaction_id)
-    transaction = session.exec(statement).first()
+    with stage("testimonial.html", "transaction_lookup"):
+        transaction = (await session.exec(statement)).first()
     
     if not transaction:
         raise HTTPException(
@@ -160,102 +411,314 @@ async def generate_testimonial(
             detail="Payment not verified. Please complete payment first."
         )
     
-    # Generate QR code
-    qr = qrcode.QRCode(version=1, box_size=10, border=2)
-    qr_data = f"http://localhost:5173/verify?ref={test_data.transaction_id}"
-    qr.add_data(qr_data)
-    qr.make(fit=True)
+    # Async mode: queue the render and return a job ID immediately
+    if mode == "async" and output_format == "pdf":
+        return await _queue_job(session, "testimonial", test_data, request, current_user)
     
-    qr_img = qr.make_image(fill_color="black", back_color="white")
-    buffer = BytesIO()
-    qr_img.save(buffer, format='PNG')
-    qr_base64 = base64.b64encode(buffer.getvalue()).decode()
+    return await _document_response(request, "testimonial.html", test_data, output_format)
+
+
+def _certificate_from_record(
+    transaction_id: str,
+    user: User,
+    record: AcademicRecord,
+    courses: Optional[list[dict]] = None
+) -> CertificateRequest:
+    """Build certificate data from a student's stored academic record and catalog courses"""
+    return CertificateRequest(
+        transaction_id=transaction_id,
+        student_name=user.name,
+        student_id=record.student_id,
+        reg_no=record.reg_no,
+        session=record.session,
+        department=record.department,
+        courses=courses or record.courses or []
+    )
+
+
+def _testimonial_from_record(transaction_id: str, user: User, record: AcademicRecord) -> TestimonialRequest:
+    """Build testimonial data from a student's stored academic record"""
+    return TestimonialRequest(
+        transaction_id=transaction_id,
+        student_name=user.name,
+        father_name=record.father_name,
+        mother_name=record.mother_name,
+        roll_no=record.student_id,
+        reg_no=record.reg_no,
+        session=record.session,
+        degree_years=record.degree_years,
+        degree_months=record.degree_months,
+        degree_type=record.degree_type,
+        graduation_year=record.graduation_year,
+        cgpa=record.cgpa
+    )
+
+
+@router.get("/certificate/{transaction_id}")
+async def get_certificate(
+    request: Request,
+    transaction_id: str,
+    output_format: Literal["pdf", "html"] = Query("pdf", alias="format"),
+    session: AsyncSession = Depends(get_async_session),
+    current_user: User = Depends(get_current_active_user)
+):
+    """
+    Generate the current user's certificate from their stored academic record
+
+    Only the transaction ID is needed; the same record always yields the same PDF,
+    so repeated downloads are served from the cache and revalidated by ETag.
+    """
+    user, record = await _load_own_record(session, transaction_id, current_user, "certificate.html")
+    with stage("certificate.html", "course_lookup"):
+        courses = (await load_courses(session, [record.id])).get(record.id)
+    cert_data = _certificate_from_record(transaction_id, user, record, courses)
+    return await _document_response(request, "certificate.html", cert_data, output_format)
+
+
+@router.get("/testimonial/{transaction_id}")
+async def get_testimonial(
+    request: Request,
+    transaction_id: str,
+    output_format: Literal["pdf", "html"] = Query("pdf", alias="format"),
+    session: AsyncSession = Depends(get_async_session),
+    current_user: User = Depends(get_current_active_user)
+):
+    """
+    Generate the current user's testimonial from their stored academic record
+
+    Only the transaction ID is needed; the same record always yields the same PDF,
+    so repeated downloads are served from the cache and revalidated by ETag.
+    """
+    user, record = await _load_own_record(session, transaction_id, current_user, "testimonial.html")
+    return await _document_response(request, "testimonial.html", _testimonial_from_record(transaction_id, user, record), output_format)
+
+
+@router.post("/batch")
+async def generate_batch(
+    request: Request,
+    batch: BatchRequest,
+    session: AsyncSession = Depends(get_async_session),
+    current_user: User = Depends(get_current_active_user)
+):
+    """
+    Generate many certificates/testimonials and stream them back as a ZIP archive
+    """
+    if batch.document_type not in ("certificate", "testimonial"):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="document_type must be 'certificate' or 'testimonial'"
+        )
     
-    # Load PNG logo directly
-    logo_path = BASE_DIR / "logo" / "just_logo.png"
-    with open(logo_path, "rb") as f:
-        logo_base64 = base64.b64encode(f.read()).decode()
+    transaction_ids = (
+        [item.transaction_id for item in batch.certificates]
+        + [item.transaction_id for item in batch.testimonials]
+        + batch.transaction_ids
+    )
+    if not transaction_ids:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Batch is empty"
+        )
+    if len(transaction_ids) > BATCH_MAX_ITEMS:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Batch is limited to {BATCH_MAX_ITEMS} documents"
+        )
     
-    # Load and encode signature image
-    signature_path = BASE_DIR / "signature" / "kamrul_signature.png"
-    with open(signature_path, "rb") as f:
-        signature_base64 = base64.b64encode(f.read()).decode()
+    # Validate every transaction (and load student records) in one query; other users' count as missing
+    rows = await _load_records(session, set(transaction_ids), current_user.id)
     
-    # Prepare template context
-    context = {
-        "request": request,
-        "date": datetime.now().strftime("%d/%m/%Y"),
-        "serial_no": test_data.transaction_id,
-        "student_name": test_data.student_name,
-        "father_name": test_data.father_name,
-        "mother_name": test_data.mother_name,
-        "roll_no": test_data.roll_no,
-        "reg_no": test_data.reg_no,
-        "session": test_data.session,
-        "pronoun": test_data.pronoun,
-        "degree_years": test_data.degree_years,
-        "degree_months": test_data.degree_months,
-        "degree_type": test_data.degree_type,
-        "graduation_year": test_data.graduation_year,
-        "cgpa": test_data.cgpa,
-        "prepared_by": test_data.prepared_by,
-        "checked_by": test_data.checked_by,
-        "qr_code": f"data:image/png;base64,{qr_base64}",
-        "signature_path": f"data:image/png;base64,{signature_base64}",
-        "logo_path": f"data:image/png;base64,{logo_base64}"
-    }
+    missing = sorted(set(transaction_ids) - rows.keys())
+    if missing:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail={"message": "Transaction not found", "transaction_ids": missing}
+        )
+    unpaid = sorted({tid for tid in transaction_ids if rows[tid][0].status != "completed"})
+    if unpaid:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail={"message": "Payment not verified. Please complete payment first.", "transaction_ids": unpaid}
+        )
+    no_record = sorted({tid for tid in batch.transaction_ids if rows[tid][2] is None})
+    if no_record:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail={"message": "Academic record not found", "transaction_ids": no_record}
+        )
     
-    # Render HTML template
-    html_content = templates.get_template("testimonial.html").render(context)
+    # Catalog courses of every stored record the batch turns into a certificate, in one query
+    courses = {}
+    if batch.document_type == "certificate" and batch.transaction_ids:
+        courses = await load_courses(session, {rows[tid][2].id for tid in batch.transaction_ids})
     
-    # Convert HTML to PDF (landscape)
-    pdf_buffer = BytesIO()
-    HTML(string=html_content, base_url=str(request.base_url)).write_pdf(pdf_buffer)
-    pdf_buffer.seek(0)
+    # Build the (template, data) work list, skipping duplicates
+    items: dict[tuple[str, str], CertificateRequest | TestimonialRequest] = {}
+    for cert_data in batch.certificates:
+        items.setdefault(("certificate.html", cert_data.transaction_id), cert_data)
+    for test_data in batch.testimonials:
+        items.setdefault(("testimonial.html", test_data.transaction_id), test_data)
+    for transaction_id in batch.transaction_ids:
+        _, user, record = rows[transaction_id]
+        if batch.document_type == "certificate":
+            items.setdefault(("certificate.html", transaction_id), _certificate_from_record(transaction_id, user, record, courses.get(record.id)))
+        else:
+            items.setdefault(("testimonial.html", transaction_id), _testimonial_from_record(transaction_id, user, record))
     
-    # Return PDF as response
-    return Response(
-        content=pdf_buffer.getvalue(),
-        media_type="application/pdf",
+    # Pre-generate every QR code for the batch off the event loop and hand them to the renders
+    # directly, so a batch larger than the QR cache doesn't regenerate evicted codes
+    qr_codes = await asyncio.to_thread(qr_for_transactions, [transaction_id for _, transaction_id in items])
+    
+    async def render_item(template_name: str, data: CertificateRequest | TestimonialRequest) -> bytes:
+        cache_key = pdf_cache.make_key(template_name, data)
+        return await _get_or_render(
+            str(request.base_url), template_name, data, cache_key, wait=True, qr_code=qr_codes[data.transaction_id]
+        )
+    
+    async def stream_zip():
+        sink = _ZipStream()
+        errors = []
+        pending = deque()
+        work = iter(items.items())
+        try:
+            with ZipFile(sink, mode="w", compression=ZIP_STORED) as archive:
+                while True:
+                    # Keep a bounded window of renders in flight so memory stays flat
+                    while len(pending) < BATCH_WINDOW:
+                        entry = next(work, None)
+                        if entry is None:
+                            break
+                        (template_name, transaction_id), data = entry
+                        task = asyncio.create_task(render_item(template_name, data))
+                        pending.append((template_name, transaction_id, task))
+                    if not pending:
+                        break
+                
+                    template_name, transaction_id, task = pending.popleft()
+                    filename = f"{template_name.removesuffix('.html')}_{transaction_id}.pdf"
+                    try:
+                        archive.writestr(filename, await task)
+                    except HTTPException as exc:
+                        errors.append(f"{filename}: {exc.detail}")
+                    except asyncio.CancelledError:
+                        # Only a render cancelled underneath us (e.g. pool restart) is an item error
+                        if not task.cancelled() or asyncio.current_task().cancelling():
+                            raise
+                        errors.append(f"{filename}: rendering was cancelled")
+                    except Exception as exc:
+                        # Headers are already sent; failing here would truncate the archive
+                        logger.exception("Batch render of %s failed", filename)
+                        errors.append(f"{filename}: {type(exc).__name__}")
+                    yield sink.drain()
+            
+                if errors:
+                    archive.writestr("errors.txt", "\n".join(errors) + "\n")
+            yield sink.drain()
+        finally:
+            # Client went away: stop any renders still in flight
+            for _, _, task in pending:
+                task.cancel()
+    
+    return StreamingResponse(
+        stream_zip(),
+        media_type="application/zip",
         headers={
-            "Content-Disposition": f"attachment; filename=testimonial_{test_data.transaction_id}.pdf"
+            "Content-Disposition": f"attachment; filename=documents_{datetime.now().strftime('%Y%m%d%H%M%S')}.zip"
         }
     )
 
 
-@router.post("/verify-ref")
+async def _get_own_job(session: AsyncSession, job_id: str, current_user: User) -> RenderJob:
+    """Load a render job belonging to the current user"""
+    job = await session.get(RenderJob, job_id)
+    if not job or job.user_id != current_user.id:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Job not found"
+        )
+    return job
+
+
+@router.get("/jobs/{job_id}")
+async def get_job_status(
+    job_id: str,
+    session: AsyncSession = Depends(get_async_session),
+    current_user: User = Depends(get_current_active_user)
+):
+    """
+    Report the status of a queued render job
+    """
+    job = await _get_own_job(session, job_id, current_user)
+    return {
+        "job_id": job.id,
+        "kind": job.kind,
+        "status": job.status,
+        "error": job.error,
+        "created_at": job.created_at,
+        "updated_at": job.updated_at,
+        "result_url": f"/api/documents/jobs/{job.id}/result" if job.status == "completed" else None
+    }
+
+
+@router.get("/jobs/{job_id}/result")
+async def get_job_result(
+    job_id: str,
+    session: AsyncSession = Depends(get_async_session),
+    current_user: User = Depends(get_current_active_user)
+):
+    """
+    Download the PDF produced by a completed render job
+    """
+    job = await _get_own_job(session, job_id, current_user)
+    if job.status != "completed" or not job.result_path or not Path(job.result_path).exists():
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail=f"Job is {job.status}" if job.status != "completed" else "Job result has expired"
+        )
+    
+    transaction_id = job.payload.get("transaction_id")
+    return FileResponse(
+        job.result_path,
+        media_type="application/pdf",
+        filename=f"{job.kind}_{transaction_id}.pdf"
+    )
+
+
+@router.post("/verify-ref", dependencies=[Depends(rate_limit(verify_limiter))])
 async def verify_reference(
     verify_ref: VerifyRefRequest,
-    session: Session = Depends(get_session)
+    session: AsyncSession = Depends(get_async_session)
 ):
     """
     Verify if a reference number (transaction ID) exists and is valid
     """
-    # Find the transaction
-    statement = select(Transaction).where(Transaction.transaction_id == verify_ref.ref_no)
-    transaction = session.exec(statement).first()
+    result = await verify_reference_number(session, verify_ref.ref_no)
     
-    if not transaction:
+    if result is None:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Reference number not found"
         )
     
-    # Get user and document information
-    user_statement = select(User).where(User.id == transaction.user_id)
-    user = session.exec(user_statement).first()
+    return result
+
+
+@router.get("/verify-ref/{ref_no}", dependencies=[Depends(rate_limit(verify_limiter))])
+async def verify_reference_get(
+    ref_no: str,
+    response: Response,
+    session: AsyncSession = Depends(get_async_session)
+):
+    """
+    Verify a reference number; cacheable by browsers and CDNs for the QR code verify page
+    """
+    result = await verify_reference_number(session, ref_no)
     
-    document_statement = select(Document).where(Document.id == transaction.document_id)
-    document = session.exec(document_statement).first()
+    if result is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Reference number not found"
+        )
     
-    return {
-        "valid": True,
-        "ref_no": transaction.transaction_id,
-        "status": transaction.status,
-        "amount": transaction.amount,
-        "issue_date": transaction.created_at.strftime("%d/%m/%Y"),
-        "student_name": user.name if user else None,
-        "student_email": user.email if user else None,
-        "document_title": document.title if document else None,
-        "message": "Certificate/Testimonial is valid and authentic"
-    }
+    response.headers["Cache-Control"] = f"public, max-age={int(VERIFY_CACHE_TTL)}"
+    return result
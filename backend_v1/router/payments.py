@@ -1,12 +1,21 @@
-from db import get_session
-from fastapi import APIRouter, Depends, HTTPException, status
-from sqlmodel import SQLModel, Session, select
+from db import get_async_session
+from typing import Optional
+from fastapi import APIRouter, Depends, HTTPException, status, Header
+from sqlalchemy.exc import IntegrityError
+from sqlmodel import SQLModel, select, update
+from sqlmodel.ext.asyncio.session import AsyncSession
 from models import Transaction, User
 from datetime import datetime
 from auth import get_current_active_user
+from verification import invalidate_reference
+from ids import new_transaction_id
+from idempotency import run_idempotent
 
 router = APIRouter()
 
+# Fresh IDs tried when a minted transaction ID is already taken by another worker
+MINT_ATTEMPTS = 3
+
 
 class PaymentRequest(SQLModel):
     user_id: int
@@ -21,62 +30,103 @@ class PaymentVerifyRequest(SQLModel):
 @router.post("/payment", status_code=status.HTTP_201_CREATED)
 async def create_payment(
     payment: PaymentRequest,
-    session: Session = Depends(get_session),
-    current_user: User = Depends(get_current_active_user)
+    session: AsyncSession = Depends(get_async_session),
+    current_user: User = Depends(get_current_active_user),
+    idempotency_key: Optional[str] = Header(None, alias="Idempotency-Key")
 ):
     """
     Create a new payment transaction
+
+    Retries sent with the same Idempotency-Key return the original response
+    instead of creating another transaction.
     """
-    # Generate a unique transaction ID
-    transaction_id = f"TXN{datetime.now().strftime('%Y%m%d%H%M%S')}{payment.user_id}"
+    async def create() -> dict:
+        # Time-ordered ID minted in-process; unique without a database round trip unless two
+        # workers share a node ID, which the unique index catches
+        for attempt in range(MINT_ATTEMPTS):
+            transaction_id = new_transaction_id()
+            session.add(Transaction(
+                transaction_id=transaction_id,
+                status="pending",
+                amount=payment.amount,
+                user_id=payment.user_id,
+                document_id=payment.document_id
+            ))
+            try:
+                await session.flush()
+                break
+            except IntegrityError as exc:
+                # This runs first in its transaction (run_idempotent commits the key claim
+                # beforehand), so rolling back only discards the colliding insert
+                await session.rollback()
+                if "transaction_id" not in str(exc.orig) or attempt == MINT_ATTEMPTS - 1:
+                    raise
+        
+        return {
+            "message": "Payment initiated successfully",
+            "transaction_id": transaction_id,
+            "status": "pending",
+            "amount": payment.amount
+        }
     
-    # Create new transaction
-    new_transaction = Transaction(
-        transaction_id=transaction_id,
-        status="pending",
-        amount=payment.amount,
-        user_id=payment.user_id,
-        document_id=payment.document_id
+    return await run_idempotent(
+        session, idempotency_key, current_user.id, "payment", payment, create,
+        status_code=status.HTTP_201_CREATED
     )
-    
-    session.add(new_transaction)
-    session.commit()
-    session.refresh(new_transaction)
-    
-    return {
-        "message": "Payment initiated successfully",
-        "transaction_id": transaction_id,
-        "status": "pending",
-        "amount": payment.amount
-    }
 
 @router.post("/verify-payment")
 async def verify_payment(
     verify_request: PaymentVerifyRequest,
-    session: Session = Depends(get_session),
-    current_user: User = Depends(get_current_active_user)
+    session: AsyncSession = Depends(get_async_session),
+    current_user: User = Depends(get_current_active_user),
+    idempotency_key: Optional[str] = Header(None, alias="Idempotency-Key")
 ):
-    # Find the transaction
-    statement = select(Transaction).where(Transaction.transaction_id == verify_request.transaction_id)
-    transaction = session.exec(statement).first()
+    """
+    Mark a pending payment as completed
+
+    The status only ever moves pending -> completed once, however many
+    verifications race for it; repeats report that it was already verified.
+    """
+    transitioned = False
     
-    if not transaction:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail="Transaction not found"
+    async def verify() -> dict:
+        nonlocal transitioned
+        # Conditional update: only one concurrent request can win the transition
+        result = await session.exec(
+            update(Transaction)
+            .where(
+                Transaction.transaction_id == verify_request.transaction_id,
+                Transaction.status == "pending"
+            )
+            .values(status="completed", updated_at=datetime.now())
         )
+        transitioned = result.rowcount == 1
+        
+        statement = select(Transaction.transaction_id, Transaction.amount, Transaction.status).where(
+            Transaction.transaction_id == verify_request.transaction_id
+        )
+        transaction = (await session.exec(statement)).first()
+        
+        if not transaction:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="Transaction not found"
+            )
+        
+        if transaction.status != "completed":
+            raise HTTPException(
+                status_code=status.HTTP_409_CONFLICT,
+                detail=f"Payment cannot be verified in status '{transaction.status}'"
+            )
+        
+        return {
+            "message": "Payment verified successfully" if transitioned else "Payment already verified",
+            "transaction_id": transaction.transaction_id,
+            "amount": transaction.amount,
+            "status": transaction.status,
+        }
     
-    # Update transaction status to completed
-    transaction.status = "completed"
-    transaction.updated_at = datetime.now()
-    
-    session.add(transaction)
-    session.commit()
-    session.refresh(transaction)
-    
-    return {
-        "message": "Payment verified successfully",
-        "transaction_id": transaction.transaction_id,
-        "amount": transaction.amount,
-        "status": transaction.status,
-    }
+    body = await run_idempotent(session, idempotency_key, current_user.id, "verify-payment", verify_request, verify)
+    if transitioned:
+        invalidate_reference(verify_request.transaction_id)
+    return body
@@ -1,8 +1,22 @@
-from fastapi import APIRouter, Depends, HTTPException, status
-from sqlmodel import SQLModel, Session, select
+import json
+import os
+from typing import AsyncIterator, Literal, Optional
+from fastapi import APIRouter, Depends, HTTPException, status, Query, Response
+from fastapi.responses import StreamingResponse
+from sqlmodel import SQLModel, select
+from sqlmodel.ext.asyncio.session import AsyncSession
 from models import User
-from db import get_session
-from auth import get_current_active_user, get_password_hash
+from db import get_async_session, async_engine
+from auth import get_current_active_user, hash_password, invalidate_user
+from refresh_tokens import revoke_subject
+
+# User listing configuration - override through environment variables
+USERS_PAGE_SIZE = int(os.getenv("USERS_PAGE_SIZE", "100"))
+USERS_PAGE_MAX = int(os.getenv("USERS_PAGE_MAX", "1000"))
+USERS_EXPORT_BATCH = int(os.getenv("USERS_EXPORT_BATCH", "1000"))
+
+# Upper bound for prefix ranges: every string starting with p sorts below p + _MAX_CHAR
+_MAX_CHAR = "\U0010ffff"
 
 router = APIRouter()
 
@@ -31,13 +45,15 @@ async def read_users_me(
 async def update_user_me(
     user_update: UserUpdate,
     current_user: User = Depends(get_current_active_user),
-    session: Session = Depends(get_session)
+    session: AsyncSession = Depends(get_async_session)
 ):
     """Update current user information"""
+    old_email = current_user.email
+    
     # Check if email is being changed to an existing email
     if user_update.email and user_update.email != current_user.email:
         statement = select(User).where(User.email == user_update.email)
-        existing_user = session.exec(statement).first()
+        existing_user = (await session.exec(statement)).first()
         if existing_user:
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST,
@@ -51,23 +67,74 @@ async def update_user_me(
     
     # Update password if provided
     if user_update.password:
-        current_user.password = get_password_hash(user_update.password)
+        current_user.password = await hash_password(user_update.password)
+    
+    # Tokens name the user by email; end every session issued for the old one
+    if current_user.email != old_email:
+        await revoke_subject(session, current_user.id, old_email)
     
     session.add(current_user)
-    session.commit()
-    session.refresh(current_user)
+    await session.commit()
+    await session.refresh(current_user)
+    
+    # Drop the cached snapshot so the next request sees the new name/email/password
+    invalidate_user(old_email)
     
     return current_user
 
 
+def _user_listing(after: Optional[int], email_prefix: Optional[str], name_prefix: Optional[str]):
+    """Projected, id-ordered user query; the password hash is never selected"""
+    statement = select(User.id, User.name, User.email).order_by(User.id)
+    if after is not None:
+        statement = statement.where(User.id > after)
+    # Prefix filters as ranges so they can use indexes, unlike LIKE on SQLite
+    if email_prefix:
+        statement = statement.where(User.email >= email_prefix, User.email < email_prefix + _MAX_CHAR)
+    if name_prefix:
+        statement = statement.where(User.name >= name_prefix, User.name < name_prefix + _MAX_CHAR)
+    return statement
+
+
+async def _export_users(statement) -> AsyncIterator[str]:
+    """Stream users as NDJSON, fetching USERS_EXPORT_BATCH rows at a time"""
+    # Own session: the export outlives the request handler
+    async with AsyncSession(async_engine) as session:
+        result = await session.stream(statement.execution_options(yield_per=USERS_EXPORT_BATCH))
+        async for rows in result.partitions():
+            yield "".join(
+                json.dumps({"id": user_id, "name": name, "email": email}) + "\n"
+                for user_id, name, email in rows
+            )
+
+
 @router.get("/all", response_model=list[UserResponse])
 async def get_all_users(
+    response: Response,
+    after: Optional[int] = Query(None, description="Cursor: return users with an id greater than this"),
+    limit: int = Query(USERS_PAGE_SIZE, ge=1, le=USERS_PAGE_MAX),
+    email_prefix: Optional[str] = None,
+    name_prefix: Optional[str] = None,
+    output_format: Literal["json", "ndjson"] = Query("json", alias="format"),
     current_user: User = Depends(get_current_active_user),
-    session: Session = Depends(get_session)
+    session: AsyncSession = Depends(get_async_session)
 ):
-    """Get all users (admin feature)"""
-    statement = select(User)
-    users = session.exec(statement).all()
+    """
+    Get users, one page at a time (admin feature)
+
+    Pass the X-Next-Cursor header of a page as ?after= to get the next one; the
+    header is absent on the last page. With ?format=ndjson every matching user
+    is streamed as newline-delimited JSON instead, ignoring limit.
+    """
+    statement = _user_listing(after, email_prefix, name_prefix)
+    
+    if output_format == "ndjson":
+        return StreamingResponse(_export_users(statement), media_type="application/x-ndjson")
+    
+    rows = (await session.exec(statement.limit(limit))).all()
+    users = [UserResponse(id=user_id, name=name, email=email) for user_id, name, email in rows]
+    if len(users) == limit:
+        response.headers["X-Next-Cursor"] = str(users[-1].id)
     return users
 
 
@@ -75,11 +142,11 @@ async def get_all_users(
 async def get_user_by_id(
     user_id: int,
     current_user: User = Depends(get_current_active_user),
-    session: Session = Depends(get_session)
+    session: AsyncSession = Depends(get_async_session)
 ):
     """Get user by ID"""
     statement = select(User).where(User.id == user_id)
-    user = session.exec(statement).first()
+    user = (await session.exec(statement)).first()
     
     if not user:
         raise HTTPException(
@@ -93,10 +160,12 @@ async def get_user_by_id(
 @router.delete("/me", status_code=status.HTTP_204_NO_CONTENT)
 async def delete_user_me(
     current_user: User = Depends(get_current_active_user),
-    session: Session = Depends(get_session)
+    session: AsyncSession = Depends(get_async_session)
 ):
     """Delete current user account"""
-    session.delete(current_user)
-    session.commit()
+    await revoke_subject(session, current_user.id, current_user.email)
+    await session.delete(current_user)
+    await session.commit()
+    invalidate_user(current_user.email)
     return None
 
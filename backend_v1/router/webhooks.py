@@ -0,0 +1,51 @@
+import asyncio
+from typing import Literal
+from fastapi import APIRouter, HTTPException, Request, status
+from pydantic import ValidationError
+from sqlmodel import SQLModel
+from webhooks import PaymentEvent, enqueue, verify_signature
+
+router = APIRouter()
+
+
+class GatewayCallback(SQLModel):
+    event_id: str
+    transaction_id: str
+    status: Literal["succeeded", "failed"]
+
+
+@router.post("/payment-gateway", status_code=status.HTTP_202_ACCEPTED)
+async def payment_gateway_callback(request: Request):
+    """
+    Receive a payment status callback from the gateway
+
+    The body must be signed in the X-Signature header. Events are buffered
+    and written in batches, so 202 means accepted, not yet applied.
+    Redelivered events are acknowledged without being queued again.
+    """
+    body = await request.body()
+    if not verify_signature(body, request.headers.get("x-signature")):
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Invalid webhook signature"
+        )
+    
+    try:
+        callback = GatewayCallback.model_validate_json(body)
+    except ValidationError as exc:
+        raise HTTPException(
+            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+            detail=exc.errors(include_url=False, include_context=False)
+        )
+    
+    try:
+        queued = enqueue(PaymentEvent(callback.event_id, callback.transaction_id, callback.status))
+    except (asyncio.QueueFull, RuntimeError):
+        # Gateways retry on 5xx, so shedding load here loses nothing
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Webhook buffer is full. Please retry.",
+            headers={"Retry-After": "1"},
+        )
+    
+    return {"event_id": callback.event_id, "duplicate": not queued}
@@ -0,0 +1,44 @@
+import os
+from pathlib import Path
+from fastapi.templating import Jinja2Templates
+from jinja2 import Environment, FileSystemBytecodeCache, FileSystemLoader, select_autoescape
+
+# Template configuration - override through environment variables
+JINJA_CACHE_DIR = Path(os.getenv("JINJA_CACHE_DIR", ".cache/jinja"))
+
+TEMPLATES_DIR = Path(__file__).parent / "public" / "templates"
+
+
+def _create_env() -> Environment:
+    JINJA_CACHE_DIR.mkdir(parents=True, exist_ok=True)
+    return Environment(
+        loader=FileSystemLoader(TEMPLATES_DIR),
+        autoescape=select_autoescape(["html"]),
+        # Compiled templates persist across restarts and worker processes
+        bytecode_cache=FileSystemBytecodeCache(str(JINJA_CACHE_DIR)),
+        auto_reload=True,
+    )
+
+
+templates = Jinja2Templates(env=_create_env())
+
+
+def stylesheet_for(template_name: str) -> str:
+    """Path of the stylesheet that belongs to a document template"""
+    return str(TEMPLATES_DIR / f"{Path(template_name).stem}.css")
+
+
+def render_html(template_name: str, context: dict, inline_css: bool = False) -> str:
+    """Render a document template
+
+    The PDF path leaves the stylesheet out and hands WeasyPrint a pre-parsed copy
+    instead; browser previews inline it.
+    """
+    return templates.get_template(template_name).render({**context, "inline_css": inline_css})
+
+
+def preload_templates():
+    """Compile every template up front so the first request doesn't pay for it"""
+    for path in sorted(TEMPLATES_DIR.iterdir()):
+        if path.suffix in (".html", ".css"):
+            templates.get_template(path.name)
@@ -0,0 +1,164 @@
+"""
+JWT encoding/decoding behind a pluggable codec.
+
+Both codecs produce and accept standard compact JWS tokens, so switching
+TOKEN_CODEC doesn't log anyone out:
+
+- "hmac": stdlib hmac/hashlib/json implementation of HS256/384/512 (default)
+- "jose": python-jose
+
+decode_token also keeps a bounded cache of verified tokens -> claims, each
+entry living until the token's own exp, so a client reusing its access token
+pays for signature verification once.
+"""
+import base64
+import calendar
+import hashlib
+import hmac
+import json
+import os
+import time
+from abc import ABC, abstractmethod
+from datetime import datetime
+from typing import Any
+from cache import TTLCache
+
+# Token codec configuration - override through environment variables
+TOKEN_CODEC = os.getenv("TOKEN_CODEC", "hmac")
+TOKEN_CACHE_SIZE = int(os.getenv("TOKEN_CACHE_SIZE", "10000"))
+
+
+class TokenError(Exception):
+    """Token is malformed, has a bad signature or has expired"""
+
+
+class TokenCodec(ABC):
+    """Encodes claims into a signed token and back"""
+
+    def __init__(self, algorithm: str):
+        self.algorithm = algorithm
+
+    @abstractmethod
+    def encode(self, claims: dict, key: str) -> str:
+        """Sign claims into a compact JWS token"""
+
+    @abstractmethod
+    def decode(self, token: str, key: str) -> dict:
+        """Verify a token and return its claims, raising TokenError if it isn't valid"""
+
+
+class JoseCodec(TokenCodec):
+    """python-jose backend"""
+
+    def encode(self, claims: dict, key: str) -> str:
+        from jose import jwt
+        return jwt.encode(claims, key, algorithm=self.algorithm)
+
+    def decode(self, token: str, key: str) -> dict:
+        from jose import JWTError, jwt
+        try:
+            return jwt.decode(token, key, algorithms=[self.algorithm])
+        except JWTError as exc:
+            raise TokenError(str(exc)) from exc
+
+
+def _b64encode(data: bytes) -> bytes:
+    return base64.urlsafe_b64encode(data).rstrip(b"=")
+
+
+def _b64decode(data: bytes) -> bytes:
+    return base64.urlsafe_b64decode(data + b"=" * (-len(data) % 4))
+
+
+def _json_default(value: Any):
+    if isinstance(value, datetime):
+        # Naive datetimes are UTC, as everywhere else in auth
+        return calendar.timegm(value.utctimetuple())
+    raise TypeError(f"{type(value).__name__} is not JSON serializable")
+
+
+class HmacCodec(TokenCodec):
+    """Standard-library HMAC backend"""
+
+    DIGESTS = {"HS256": hashlib.sha256, "HS384": hashlib.sha384, "HS512": hashlib.sha512}
+
+    def __init__(self, algorithm: str):
+        super().__init__(algorithm)
+        if algorithm not in self.DIGESTS:
+            raise ValueError(f"Unsupported algorithm {algorithm}")
+        self._digest = self.DIGESTS[algorithm]
+        self._header = _b64encode(json.dumps({"alg": algorithm, "typ": "JWT"}, separators=(",", ":")).encode())
+
+    def _sign(self, signing_input: bytes, key: str) -> bytes:
+        return hmac.new(key.encode(), signing_input, self._digest).digest()
+
+    def encode(self, claims: dict, key: str) -> str:
+        payload = _b64encode(json.dumps(claims, separators=(",", ":"), default=_json_default).encode())
+        signing_input = self._header + b"." + payload
+        return (signing_input + b"." + _b64encode(self._sign(signing_input, key))).decode()
+
+    def decode(self, token: str, key: str) -> dict:
+        try:
+            signing_input, signature = token.encode().rsplit(b".", 1)
+            header, payload = signing_input.split(b".")
+            if header != self._header and json.loads(_b64decode(header)).get("alg") != self.algorithm:
+                raise TokenError("Unexpected token algorithm")
+            if not hmac.compare_digest(self._sign(signing_input, key), _b64decode(signature)):
+                raise TokenError("Signature verification failed")
+            claims = json.loads(_b64decode(payload))
+        except (ValueError, TypeError, AttributeError) as exc:
+            raise TokenError("Malformed token") from exc
+        if not isinstance(claims, dict):
+            raise TokenError("Malformed token")
+
+        now = time.time()
+        if "exp" in claims:
+            if not isinstance(claims["exp"], (int, float)):
+                raise TokenError("Invalid exp claim")
+            if claims["exp"] <= now:
+                raise TokenError("Signature has expired")
+        if "nbf" in claims and isinstance(claims["nbf"], (int, float)) and claims["nbf"] > now:
+            raise TokenError("The token is not yet valid")
+        return claims
+
+
+CODECS: dict[str, type[TokenCodec]] = {"hmac": HmacCodec, "jose": JoseCodec}
+
+# Signing key + token -> verified claims
+_verified = TTLCache(max(TOKEN_CACHE_SIZE, 1), 0)
+_codecs: dict[str, TokenCodec] = {}
+
+
+def get_codec(algorithm: str) -> TokenCodec:
+    """The configured codec for an algorithm"""
+    codec = _codecs.get(algorithm)
+    if codec is None:
+        codec = _codecs[algorithm] = CODECS[TOKEN_CODEC](algorithm)
+    return codec
+
+
+def encode_token(claims: dict, key: str, algorithm: str) -> str:
+    """Sign claims into a JWT"""
+    return get_codec(algorithm).encode(claims, key)
+
+
+def decode_token(token: str, key: str, algorithm: str) -> dict:
+    """Verify a JWT and return its claims (shared, don't mutate); raises TokenError"""
+    cache_key = (key, token)
+    claims = _verified.get(cache_key) if TOKEN_CACHE_SIZE else None
+    if claims is not None:
+        # Cached entries never outlive exp, but the TTL clock is monotonic; re-check the wall clock
+        if claims.get("exp", float("inf")) > time.time():
+            return claims
+        _verified.invalidate(cache_key)
+
+    claims = get_codec(algorithm).decode(token, key)
+    exp = claims.get("exp")
+    if TOKEN_CACHE_SIZE and isinstance(exp, (int, float)):
+        _verified.set(cache_key, claims, ttl=exp - time.time())
+    return claims
+
+
+def token_cache_stats() -> dict:
+    """Hit/miss counters of the verified-token cache"""
+    return _verified.stats()
@@ -0,0 +1,68 @@
+import os
+from typing import Optional
+from sqlmodel import select
+from sqlmodel.ext.asyncio.session import AsyncSession
+from models import Document, Transaction, User
+from cache import TTLCache
+from ratelimit import TokenBucketLimiter
+
+# Public verification configuration - override through environment variables
+VERIFY_CACHE_TTL = float(os.getenv("VERIFY_CACHE_TTL", "30"))
+VERIFY_CACHE_SIZE = int(os.getenv("VERIFY_CACHE_SIZE", "50000"))
+VERIFY_RATE_LIMIT = float(os.getenv("VERIFY_RATE_LIMIT", "5"))
+VERIFY_RATE_BURST = int(os.getenv("VERIFY_RATE_BURST", "20"))
+
+# Reference number -> verification result
+verification_cache = TTLCache(VERIFY_CACHE_SIZE, VERIFY_CACHE_TTL)
+
+# Per client IP; the endpoint is public, so this is what keeps scrapers off the database
+verify_limiter = TokenBucketLimiter(VERIFY_RATE_LIMIT, VERIFY_RATE_BURST)
+
+
+async def _load_reference(session: AsyncSession, ref_no: str) -> Optional[dict]:
+    """Fetch a transaction with its student and document in one query"""
+    statement = (
+        select(
+            Transaction.transaction_id,
+            Transaction.status,
+            Transaction.amount,
+            Transaction.created_at,
+            User.name,
+            User.email,
+            Document.title,
+        )
+        .outerjoin(User, User.id == Transaction.user_id)
+        .outerjoin(Document, Document.id == Transaction.document_id)
+        .where(Transaction.transaction_id == ref_no)
+    )
+    row = (await session.exec(statement)).first()
+    if row is None:
+        return None
+
+    transaction_id, status, amount, created_at, student_name, student_email, document_title = row
+    return {
+        "valid": True,
+        "ref_no": transaction_id,
+        "status": status,
+        "amount": amount,
+        "issue_date": created_at.strftime("%d/%m/%Y"),
+        "student_name": student_name,
+        "student_email": student_email,
+        "document_title": document_title,
+        "message": "Certificate/Testimonial is valid and authentic"
+    }
+
+
+async def verify_reference_number(session: AsyncSession, ref_no: str) -> Optional[dict]:
+    """Verification result for a reference number, or None if it doesn't exist"""
+    result = verification_cache.get(ref_no)
+    if result is None:
+        result = await _load_reference(session, ref_no)
+        if result is not None:
+            verification_cache.set(ref_no, result)
+    return result
+
+
+def invalidate_reference(ref_no: str):
+    """Drop a cached verification result, e.g. after its payment status changed"""
+    verification_cache.invalidate(ref_no)
@@ -0,0 +1,277 @@
+import asyncio
+import contextlib
+import hashlib
+import hmac
+import logging
+import os
+import time
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Optional
+from sqlmodel import delete, select, update
+from sqlmodel.ext.asyncio.session import AsyncSession
+from cache import TTLCache
+from db import async_engine
+from models import Transaction, WebhookDeadLetter
+from verification import invalidate_reference
+
+# Payment gateway webhook configuration - override through environment variables
+WEBHOOK_SECRET = os.getenv("WEBHOOK_SECRET", "your-webhook-secret-change-this-in-production")
+WEBHOOK_TOLERANCE_SECONDS = int(os.getenv("WEBHOOK_TOLERANCE_SECONDS", "300"))
+WEBHOOK_FLUSH_MS = int(os.getenv("WEBHOOK_FLUSH_MS", "100"))
+WEBHOOK_BATCH_SIZE = int(os.getenv("WEBHOOK_BATCH_SIZE", "500"))
+WEBHOOK_BUFFER_SIZE = int(os.getenv("WEBHOOK_BUFFER_SIZE", "10000"))
+WEBHOOK_DEDUP_TTL = float(os.getenv("WEBHOOK_DEDUP_TTL", "3600"))
+WEBHOOK_RETRY_SECONDS = float(os.getenv("WEBHOOK_RETRY_SECONDS", "60"))
+
+# Gateway status -> Transaction.status; only pending transactions are moved
+STATUS_MAP = {"succeeded": "completed", "failed": "failed"}
+
+FLUSH_ATTEMPTS = 3
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass(frozen=True)
+class PaymentEvent:
+    event_id: str
+    transaction_id: str
+    status: str
+
+
+_buffer: Optional[asyncio.Queue] = None
+_flusher: Optional[asyncio.Task] = None
+_retrier: Optional[asyncio.Task] = None
+
+# Failed events that couldn't even be dead-lettered (database down); retried from memory
+_parked: list[PaymentEvent] = []
+
+# Event IDs seen recently; gateways redeliver on timeouts
+_seen_events = TTLCache(WEBHOOK_BUFFER_SIZE * 10, WEBHOOK_DEDUP_TTL)
+
+_stats = {"received": 0, "duplicates": 0, "rejected": 0, "batches": 0, "applied": 0, "failed": 0, "dead_lettered": 0, "retried": 0}
+
+
+def sign_payload(body: bytes, timestamp: int, secret: str = WEBHOOK_SECRET) -> str:
+    """Signature header value for a webhook body: "t=<unix time>,v1=<hex HMAC-SHA256>" """
+    digest = hmac.new(secret.encode(), f"{timestamp}.".encode() + body, hashlib.sha256).hexdigest()
+    return f"t={timestamp},v1={digest}"
+
+
+def verify_signature(body: bytes, header: Optional[str], secret: str = WEBHOOK_SECRET) -> bool:
+    """Check a signature header, rejecting stale timestamps so captured requests can't be replayed"""
+    if not header:
+        return False
+    try:
+        fields = dict(part.split("=", 1) for part in header.split(","))
+        timestamp = int(fields["t"])
+    except (KeyError, ValueError):
+        return False
+    if abs(time.time() - timestamp) > WEBHOOK_TOLERANCE_SECONDS:
+        return False
+    expected = sign_payload(body, timestamp, secret).split("v1=", 1)[1]
+    return hmac.compare_digest(expected, fields.get("v1", ""))
+
+
+def enqueue(event: PaymentEvent) -> bool:
+    """Buffer an event for the next batch; returns False if it's a duplicate
+
+    Raises asyncio.QueueFull when the buffer is full.
+    """
+    if _buffer is None:
+        raise RuntimeError("Webhook pipeline is not running")
+    _stats["received"] += 1
+    if _seen_events.get(event.event_id) is not None:
+        _stats["duplicates"] += 1
+        return False
+    try:
+        _buffer.put_nowait(event)
+    except asyncio.QueueFull:
+        _stats["rejected"] += 1
+        raise
+    _seen_events.set(event.event_id, True)
+    return True
+
+
+async def _apply(events: list[PaymentEvent]) -> int:
+    """Apply a batch of status updates in a single transaction"""
+    by_status: dict[str, set[str]] = {}
+    for event in events:
+        by_status.setdefault(STATUS_MAP[event.status], set()).add(event.transaction_id)
+
+    applied = 0
+    now = datetime.now()
+    async with AsyncSession(async_engine) as session:
+        for new_status, transaction_ids in by_status.items():
+            # One UPDATE per target status; the status guard makes redelivered events no-ops
+            result = await session.exec(
+                update(Transaction)
+                .where(Transaction.transaction_id.in_(transaction_ids), Transaction.status == "pending")
+                .values(status=new_status, updated_at=now)
+            )
+            applied += result.rowcount
+        await session.commit()
+
+    for transaction_ids in by_status.values():
+        for transaction_id in transaction_ids:
+            invalidate_reference(transaction_id)
+    return applied
+
+
+def _event_ids(events: list[PaymentEvent]) -> str:
+    return ", ".join(event.event_id for event in events)
+
+
+async def _dead_letter(events: list[PaymentEvent], error: str):
+    """Store events for the retry loop, or keep them in memory if the database is unreachable"""
+    try:
+        now = datetime.now()
+        async with AsyncSession(async_engine) as session:
+            for event in events:
+                await session.merge(WebhookDeadLetter(
+                    event_id=event.event_id,
+                    transaction_id=event.transaction_id,
+                    status=event.status,
+                    error=error,
+                    attempts=FLUSH_ATTEMPTS,
+                    created_at=now,
+                    last_attempt_at=now,
+                ))
+            await session.commit()
+        _stats["dead_lettered"] += len(events)
+    except Exception:
+        logger.exception("Could not dead-letter %d webhook events, keeping them in memory: %s", len(events), _event_ids(events))
+        _parked.extend(events)
+
+
+async def _flush(events: list[PaymentEvent]):
+    for attempt in range(1, FLUSH_ATTEMPTS + 1):
+        try:
+            _stats["applied"] += await _apply(events)
+            _stats["batches"] += 1
+            return
+        except Exception as exc:
+            error = f"{type(exc).__name__}: {exc}"
+            logger.warning("Webhook batch of %d failed (attempt %d/%d): %s", len(events), attempt, FLUSH_ATTEMPTS, error)
+            await asyncio.sleep(0.1 * attempt)
+    # The gateway already got 202 and won't redeliver; keep the events until they apply
+    _stats["failed"] += len(events)
+    logger.error("Dead-lettering %d webhook events after %d attempts: %s", len(events), FLUSH_ATTEMPTS, _event_ids(events))
+    await _dead_letter(events, error)
+
+
+async def retry_dead_letters() -> int:
+    """Re-apply parked and dead-lettered events; returns how many were cleared"""
+    cleared = 0
+    if _parked:
+        events = _parked[:]
+        _parked.clear()
+        try:
+            _stats["applied"] += await _apply(events)
+            cleared += len(events)
+        except Exception:
+            await _dead_letter(events, "database unavailable")
+
+    async with AsyncSession(async_engine) as session:
+        rows = (await session.exec(
+            select(WebhookDeadLetter).order_by(WebhookDeadLetter.last_attempt_at).limit(WEBHOOK_BATCH_SIZE)
+        )).all()
+        if not rows:
+            return cleared
+        events = [PaymentEvent(row.event_id, row.transaction_id, row.status) for row in rows]
+        try:
+            _stats["applied"] += await _apply(events)
+        except Exception as exc:
+            logger.error("Retrying %d dead-lettered webhook events failed: %s: %s", len(events), type(exc).__name__, exc)
+            now = datetime.now()
+            for row in rows:
+                row.attempts += 1
+                row.error = f"{type(exc).__name__}: {exc}"
+                row.last_attempt_at = now
+                session.add(row)
+            await session.commit()
+            return cleared
+        # Applying twice is a no-op thanks to the pending guard, so deleting afterwards is safe
+        await session.exec(delete(WebhookDeadLetter).where(WebhookDeadLetter.event_id.in_([event.event_id for event in events])))
+        await session.commit()
+    _stats["retried"] += len(events)
+    logger.info("Applied %d dead-lettered webhook events: %s", len(events), _event_ids(events))
+    return cleared + len(events)
+
+
+async def _run_retrier():
+    while True:
+        try:
+            await retry_dead_letters()
+        except Exception:
+            logger.exception("Webhook dead-letter retry failed")
+        await asyncio.sleep(WEBHOOK_RETRY_SECONDS)
+
+
+async def _drain(buffer: asyncio.Queue, first: PaymentEvent) -> tuple[list[PaymentEvent], bool]:
+    """Collect events until the batch is full or WEBHOOK_FLUSH_MS has passed since the first
+
+    Also reports whether the shutdown marker (None) was reached.
+    """
+    events = [first]
+    deadline = asyncio.get_running_loop().time() + WEBHOOK_FLUSH_MS / 1000
+    while len(events) < WEBHOOK_BATCH_SIZE:
+        timeout = deadline - asyncio.get_running_loop().time()
+        if timeout <= 0:
+            break
+        try:
+            event = await asyncio.wait_for(buffer.get(), timeout)
+        except asyncio.TimeoutError:
+            break
+        if event is None:
+            return events, True
+        events.append(event)
+    return events, False
+
+
+async def _run_flusher(buffer: asyncio.Queue):
+    while True:
+        first = await buffer.get()
+        if first is None:
+            return
+        events, stopping = await _drain(buffer, first)
+        await _flush(events)
+        if stopping:
+            return
+
+
+async def start_pipeline():
+    """Start the background tasks that write buffered webhook events and retry failed ones"""
+    global _buffer, _flusher, _retrier
+    if _flusher is not None:
+        return
+    _buffer = asyncio.Queue(maxsize=WEBHOOK_BUFFER_SIZE)
+    _flusher = asyncio.create_task(_run_flusher(_buffer))
+    _retrier = asyncio.create_task(_run_retrier())
+
+
+async def stop_pipeline():
+    """Stop accepting events and wait until everything buffered has been written"""
+    global _buffer, _flusher, _retrier
+    if _flusher is None:
+        return
+    buffer, _buffer = _buffer, None
+    # The flusher writes out everything queued ahead of the marker, then exits
+    await buffer.put(None)
+    await _flusher
+    _flusher = None
+    _retrier.cancel()
+    with contextlib.suppress(asyncio.CancelledError):
+        await _retrier
+    _retrier = None
+    if _parked:
+        events = _parked[:]
+        _parked.clear()
+        await _dead_letter(events, "database unavailable")
+        if _parked:
+            logger.error("Shutting down with %d unapplied webhook events: %s", len(_parked), _event_ids(_parked))
+
+
+def webhook_stats() -> dict:
+    """Counters for the webhook pipeline"""
+    return {**_stats, "buffered": _buffer.qsize() if _buffer is not None else 0, "parked": len(_parked)}